@@ -184,6 +184,21 @@
 # define USE_WRITEUNRAISABLEMSG
 #endif
 
+#if PY_VERSION_HEX >= 0x03080000
+/* PEP 590 vectorcall: calls to function pointers don't need an args tuple */
+# define CFFI_USE_VECTORCALL
+# if PY_VERSION_HEX < 0x03090000
+#  define Py_TPFLAGS_HAVE_VECTORCALL _Py_TPFLAGS_HAVE_VECTORCALL
+#  define PyVectorcall_NARGS _PyVectorcall_NARGS
+#  define PyObject_Vectorcall _PyObject_Vectorcall
+# endif
+# define CDATA_VECTORCALL_OFFSET   offsetof(CDataObject, c_vectorcall)
+# define CDATA_TPFLAGS_VECTORCALL  Py_TPFLAGS_HAVE_VECTORCALL
+#else
+# define CDATA_VECTORCALL_OFFSET   0
+# define CDATA_TPFLAGS_VECTORCALL  0
+#endif
+
 /************************************************************/
 
 /* base type flag: exactly one of the following: */
@@ -211,7 +226,6 @@
 #define CT_IS_FILE             0x00100000
 #define CT_IS_VOID_PTR         0x00200000
 #define CT_WITH_VAR_ARRAY      0x00400000 /* with open-ended array, anywhere */
-/* unused                      0x00800000 */
 #define CT_LAZY_FIELD_LIST     0x01000000
 #define CT_WITH_PACKED_CHANGE  0x02000000
 #define CT_IS_SIGNED_WCHAR     0x04000000
@@ -239,6 +253,9 @@ typedef struct _ctypedescr {
     PyObject *ct_unique_key;    /* key in unique_cache (a string, but not
                                    human-readable) */
 
+    struct _cffi_field_cache_s *ct_field_cache;  /* structs: see
+                                                    cdata_getattro() */
+
     Py_ssize_t ct_size;     /* size of instances, or -1 if unknown */
     Py_ssize_t ct_length;   /* length of arrays, or -1 if unknown;
                                or alignment of primitive and struct types;
@@ -254,8 +271,20 @@ typedef struct {
     CTypeDescrObject *c_type;
     char *c_data;
     PyObject *c_weakreflist;
+#ifdef CFFI_USE_VECTORCALL
+    vectorcallfunc c_vectorcall;   /* always cdata_vectorcall() */
+#endif
 } CDataObject;
 
+#ifdef CFFI_USE_VECTORCALL
+static PyObject *cdata_vectorcall(PyObject *, PyObject *const *,
+                                  size_t, PyObject *);     /* forward */
+# define cdata_init_vectorcall(cd)                              \
+    (((CDataObject *)(cd))->c_vectorcall = cdata_vectorcall)
+#else
+# define cdata_init_vectorcall(cd)   /* nothing */
+#endif
+
 typedef struct cfieldobject_s {
     PyObject_HEAD
     CTypeDescrObject *cf_type;
@@ -269,6 +298,33 @@ typedef struct cfieldobject_s {
 #define BS_EMPTY_ARRAY        (-2) /* a field declared 'type[0]' or 'type[]' */
 #define BF_IGNORE_IN_CTOR     0x01 /* union field not in the first place */
 
+/* Per-struct-type cache used by cdata_getattro() and cdata_setattro():
+   a small direct-mapped table keyed by the identity of the attribute
+   name (normally an interned string), giving the field and a FK_xxx
+   code for how to read it. */
+typedef struct {
+    PyObject *fc_name;          /* a reference, or NULL if the slot is free */
+    CFieldObject *fc_field;     /* borrowed from the ct_stuff dict */
+    int fc_kind;
+} cffi_field_cache_entry_t;
+
+typedef struct _cffi_field_cache_s {
+    size_t fc_mask;
+    cffi_field_cache_entry_t fc_entries[1];
+} cffi_field_cache_t;
+
+static void field_cache_free(CTypeDescrObject *ct)
+{
+    cffi_field_cache_t *cache = ct->ct_field_cache;
+    size_t i;
+    if (cache == NULL)
+        return;
+    ct->ct_field_cache = NULL;
+    for (i = 0; i <= cache->fc_mask; i++)
+        Py_XDECREF(cache->fc_entries[i].fc_name);
+    PyMem_Free(cache);
+}
+
 static PyTypeObject CTypeDescr_Type;
 static PyTypeObject CField_Type;
 static PyTypeObject CData_Type;
@@ -276,13 +332,17 @@ static PyTypeObject CDataOwning_Type;
 static PyTypeObject CDataOwningGC_Type;
 static PyTypeObject CDataFromBuf_Type;
 static PyTypeObject CDataGCP_Type;
+static PyTypeObject CDataCFree_Type;
+static PyTypeObject CDataKeepGIL_Type;
 
 #define CTypeDescr_Check(ob)  (Py_TYPE(ob) == &CTypeDescr_Type)
 #define CData_Check(ob)       (Py_TYPE(ob) == &CData_Type ||            \
                                Py_TYPE(ob) == &CDataOwning_Type ||      \
                                Py_TYPE(ob) == &CDataOwningGC_Type ||    \
                                Py_TYPE(ob) == &CDataFromBuf_Type ||     \
-                               Py_TYPE(ob) == &CDataGCP_Type)
+                               Py_TYPE(ob) == &CDataGCP_Type ||         \
+                               Py_TYPE(ob) == &CDataCFree_Type ||       \
+                               Py_TYPE(ob) == &CDataKeepGIL_Type)
 #define CDataOwn_Check(ob)    (Py_TYPE(ob) == &CDataOwning_Type ||      \
                                Py_TYPE(ob) == &CDataOwningGC_Type)
 
@@ -331,20 +391,41 @@ typedef struct {
     PyObject *destructor;
 } CDataObject_gcp;
 
+typedef struct {
+    CDataObject head;
+    Py_ssize_t length;     /* same as CDataObject_own_length up to here */
+    void (*free_fn)(void *);
+} CDataObject_cfree;
+
 typedef struct {
     CDataObject head;
     ffi_closure *closure;
 } CDataObject_closure;
 
+typedef int (*cffi_argconv_fn)(char *, CTypeDescrObject *, PyObject *);
+typedef PyObject *(*cffi_argdecode_fn)(char *, CTypeDescrObject *);
+
 typedef struct {
     ffi_cif cif;
     /* the following information is used when doing the call:
-       - a buffer of size 'exchange_size' is malloced
-       - the arguments are converted from Python objects to raw data
+       - a buffer of size 'exchange_size' is malloced, or the cached
+         'exchange_cache' is reused if it is not already in use
+       - the arguments are converted from Python objects to raw data,
+         using the converter 'call_plan[i]' (NULL for pointer arguments,
+         which need special handling)
        - the i'th raw data is stored at 'buffer + exchange_offset_arg[1+i]'
        - the call is done
        - the result is read back from 'buffer + exchange_offset_arg[0]' */
     Py_ssize_t exchange_size;
+    char *exchange_cache;
+    cffi_argconv_fn *call_plan;
+    /* for callbacks: 'callback_plan[i]' is the decoder that turns the
+       i'th raw argument into a Python object */
+    cffi_argdecode_fn *callback_plan;
+    /* for callbacks: the zero-filled 'error' value, built the first time
+       a callback of this type is made with no explicit 'error' and then
+       shared by all such callbacks */
+    PyObject *callback_rawerr;
     Py_ssize_t exchange_offset_arg[1];
 } cif_description_t;
 
@@ -375,13 +456,28 @@ typedef struct {
 typedef struct _cffi_allocator_s {
     PyObject *ca_alloc, *ca_free;
     int ca_dont_clear;
+    /* if 'ca_alloc' is a C function 'void *(size_t)' and 'ca_free' is
+       None or a C function 'void(void *)', they are called directly: */
+    void *(*ca_c_alloc)(size_t);
+    void (*ca_c_free)(void *);
 } cffi_allocator_t;
-static const cffi_allocator_t default_allocator = { NULL, NULL, 0 };
+static const cffi_allocator_t default_allocator = { NULL, NULL, 0,
+                                                    NULL, NULL };
 static PyObject *FFIError;
 static PyObject *unique_cache;
 
 /************************************************************/
 
+static void cif_description_free(cif_description_t *cif_descr)
+{
+    if (cif_descr != NULL) {
+        if (cif_descr->exchange_cache != NULL)
+            PyObject_Free(cif_descr->exchange_cache);
+        Py_XDECREF(cif_descr->callback_rawerr);
+        PyObject_Free(cif_descr);
+    }
+}
+
 static CTypeDescrObject *
 ctypedescr_new(int name_size)
 {
@@ -395,6 +491,7 @@ ctypedescr_new(int name_size)
     ct->ct_stuff = NULL;
     ct->ct_weakreflist = NULL;
     ct->ct_unique_key = NULL;
+    ct->ct_field_cache = NULL;
     PyObject_GC_Track(ct);
     return ct;
 }
@@ -446,10 +543,11 @@ ctypedescr_dealloc(CTypeDescrObject *ct)
         Py_SET_REFCNT(ct, 0);
         Py_DECREF(ct->ct_unique_key);
     }
+    field_cache_free(ct);
     Py_XDECREF(ct->ct_itemdescr);
     Py_XDECREF(ct->ct_stuff);
     if (ct->ct_flags & CT_FUNCTIONPTR)
-        PyObject_Free(ct->ct_extra);
+        cif_description_free((cif_description_t *)ct->ct_extra);
     Py_TYPE(ct)->tp_free((PyObject *)ct);
 }
 
@@ -464,6 +562,7 @@ ctypedescr_traverse(CTypeDescrObject *ct, visitproc visit, void *arg)
 static int
 ctypedescr_clear(CTypeDescrObject *ct)
 {
+    field_cache_free(ct);
     Py_CLEAR(ct->ct_itemdescr);
     Py_CLEAR(ct->ct_stuff);
     return 0;
@@ -1042,6 +1141,7 @@ new_simple_cdata(char *data, CTypeDescrObject *ct)
     cd->c_data = data;
     cd->c_type = ct;
     cd->c_weakreflist = NULL;
+    cdata_init_vectorcall(cd);
     return (PyObject *)cd;
 }
 
@@ -1058,6 +1158,7 @@ new_sized_cdata(char *data, CTypeDescrObject *ct, Py_ssize_t length)
     scd->head.c_type = ct;
     scd->head.c_data = data;
     scd->head.c_weakreflist = NULL;
+    cdata_init_vectorcall(scd);
     scd->length = length;
     return (PyObject *)scd;
 }
@@ -1875,6 +1976,139 @@ get_alignment(CTypeDescrObject *ct)
     return align;
 }
 
+/* A pool of freed memory blocks for small CDataOwning objects, as
+   created by ffi.new("int *") or ffi.new("struct foo *").  The blocks
+   are kept in one free list per size class (multiples of
+   NEW_POOL_GRANULARITY bytes).  Every block of at most NEW_POOL_MAX_SIZE
+   bytes is malloc()ed with the full size of its class, so that it can
+   be reused by any object of the same class, and any block can always
+   be released with free().  Protected by the GIL. */
+
+#define NEW_POOL_GRANULARITY   16
+#define NEW_POOL_MAX_SIZE      1024
+#define NEW_POOL_NUM_CLASSES   (NEW_POOL_MAX_SIZE / NEW_POOL_GRANULARITY)
+#define NEW_POOL_CLASS(size)   (((size) - 1) / NEW_POOL_GRANULARITY)
+#define NEW_POOL_BLOCK_SIZE(size)                                       \
+    ((NEW_POOL_CLASS(size) + 1) * NEW_POOL_GRANULARITY)
+
+static void *new_pool_freelist[NEW_POOL_NUM_CLASSES];
+static Py_ssize_t new_pool_maxsize = 0;     /* 0 = disabled */
+static Py_ssize_t new_pool_maxbytes = 1024 * 1024;
+static Py_ssize_t new_pool_resident = 0;    /* bytes in the free lists */
+static Py_ssize_t new_pool_hits = 0;
+static Py_ssize_t new_pool_misses = 0;
+
+static void *new_pool_malloc(Py_ssize_t size, int dont_clear)
+{
+    void *p;
+    if (size > NEW_POOL_MAX_SIZE || size <= 0)
+        return dont_clear ? malloc(size) : calloc(size, 1);
+
+    if (size <= new_pool_maxsize) {
+        Py_ssize_t cls = NEW_POOL_CLASS(size);
+        p = new_pool_freelist[cls];
+        if (p != NULL) {
+            new_pool_freelist[cls] = *(void **)p;
+            new_pool_resident -= NEW_POOL_BLOCK_SIZE(size);
+            new_pool_hits++;
+            if (!dont_clear)
+                memset(p, 0, size);
+            return p;
+        }
+        new_pool_misses++;
+    }
+    size = NEW_POOL_BLOCK_SIZE(size);
+    return dont_clear ? malloc(size) : calloc(size, 1);
+}
+
+static void new_pool_free(void *p, Py_ssize_t size)
+{
+    /* 'size' is the size originally passed to new_pool_malloc(), or -1
+       if unknown */
+    if (size > 0 && size <= new_pool_maxsize &&
+            new_pool_resident + NEW_POOL_BLOCK_SIZE(size) <= new_pool_maxbytes) {
+        Py_ssize_t cls = NEW_POOL_CLASS(size);
+        *(void **)p = new_pool_freelist[cls];
+        new_pool_freelist[cls] = p;
+        new_pool_resident += NEW_POOL_BLOCK_SIZE(size);
+    }
+    else
+        free(p);
+}
+
+static void new_pool_clear(void)
+{
+    int i;
+    for (i = 0; i < NEW_POOL_NUM_CLASSES; i++) {
+        while (new_pool_freelist[i] != NULL) {
+            void *p = new_pool_freelist[i];
+            new_pool_freelist[i] = *(void **)p;
+            free(p);
+        }
+    }
+    new_pool_resident = 0;
+}
+
+static Py_ssize_t _owning_object_fixed_size(CTypeDescrObject *ct)
+{
+    /* Return the size of the memory block of the CDataOwning objects of
+       type 'ct' (see allocate_owning_object()), if it only depends on
+       'ct'; or -1 for objects of variable size. */
+    Py_ssize_t base = offsetof(CDataObject_own_nolength, alignment);
+    Py_ssize_t size;
+
+    if (ct->ct_flags & CT_IS_PTR_TO_OWNED)
+        return sizeof(CDataObject_own_structptr);
+    if (ct->ct_flags & CT_POINTER) {
+        size = ct->ct_itemdescr->ct_size;
+        if (size < 0)
+            return -1;
+        if (ct->ct_itemdescr->ct_flags & CT_PRIMITIVE_CHAR)
+            size *= 2;
+        return base + size;
+    }
+    if (ct->ct_flags & (CT_STRUCT | CT_UNION)) {
+        if (ct->ct_flags & (CT_WITH_VAR_ARRAY | CT_LAZY_FIELD_LIST))
+            return -1;
+    }
+    else if (!(ct->ct_flags & CT_ARRAY))
+        return -1;
+    if (ct->ct_size < 0)
+        return -1;
+    return base + ct->ct_size;
+}
+
+static PyObject *b_get_new_pool_info(PyObject *self, PyObject *noarg)
+{
+    return Py_BuildValue("{s:n,s:n,s:n,s:n,s:n}",
+                         "hits", new_pool_hits,
+                         "misses", new_pool_misses,
+                         "resident_bytes", new_pool_resident,
+                         "maxsize", new_pool_maxsize,
+                         "maxbytes", new_pool_maxbytes);
+}
+
+static PyObject *b_set_new_pool_size(PyObject *self, PyObject *args)
+{
+    Py_ssize_t maxsize, maxbytes = new_pool_maxbytes;
+    if (!PyArg_ParseTuple(args, "n|n:set_new_pool_size", &maxsize, &maxbytes))
+        return NULL;
+    if (maxsize < 0 || maxsize > NEW_POOL_MAX_SIZE) {
+        PyErr_Format(PyExc_ValueError, "pool item size must be between 0 "
+                     "and %d", NEW_POOL_MAX_SIZE);
+        return NULL;
+    }
+    if (maxbytes < 0) {
+        PyErr_SetString(PyExc_ValueError, "pool size cannot be negative");
+        return NULL;
+    }
+    new_pool_clear();
+    new_pool_maxsize = maxsize;
+    new_pool_maxbytes = maxbytes;
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
 static void cdata_dealloc(CDataObject *cd)
 {
     if (cd->c_weakreflist != NULL)
@@ -1888,6 +2122,7 @@ static void cdata_dealloc(CDataObject *cd)
 
 static void cdataowning_dealloc(CDataObject *cd)
 {
+    Py_ssize_t size;
     assert(!(cd->c_type->ct_flags & (CT_IS_VOID_PTR | CT_FUNCTIONPTR)));
 
     if (cd->c_type->ct_flags & CT_IS_PTR_TO_OWNED) {
@@ -1907,7 +2142,15 @@ static void cdataowning_dealloc(CDataObject *cd)
         memset(cd->c_data, 0xDD, x);
     }
 #endif
-    cdata_dealloc(cd);
+    /* like cdata_dealloc(), but the memory may go back to the pool */
+    size = _owning_object_fixed_size(cd->c_type);
+    if (cd->c_weakreflist != NULL)
+        PyObject_ClearWeakRefs((PyObject *) cd);
+
+    Py_DECREF(cd->c_type);
+#ifndef CFFI_MEM_LEAK     /* never release anything, tests only */
+    new_pool_free(cd, size);
+#endif
 }
 
 static void cdataowninggc_dealloc(CDataObject *cd)
@@ -2039,6 +2282,24 @@ static void cdatagcp_finalize(CDataObject_gcp *cd)
     gcp_finalize(destructor, origobj);
 }
 
+static void cdatacfree_finalize(CDataObject_cfree *cd)
+{
+    void (*free_fn)(void *) = cd->free_fn;
+    cd->free_fn = NULL;
+    if (free_fn != NULL)
+        free_fn(cd->head.c_data);
+}
+
+static void cdatacfree_dealloc(CDataObject_cfree *cd)
+{
+    void (*free_fn)(void *) = cd->free_fn;
+    char *data = cd->head.c_data;
+    cdata_dealloc((CDataObject *)cd);
+
+    if (free_fn != NULL)
+        free_fn(data);
+}
+
 static void cdatagcp_dealloc(CDataObject_gcp *cd)
 {
     PyObject *destructor = cd->destructor;
@@ -2223,6 +2484,8 @@ static PyObject *cdataowninggc_repr(CDataObject *cd)
         PyObject *args = (PyObject *)closure->user_data;
         if (args == NULL)
             return cdata_repr(cd);
+        else if (!PyTuple_Check(args))     /* from ffi.callback_queue() */
+            return _cdata_repr2(cd, "queueing into", args);
         else
             return _cdata_repr2(cd, "calling", PyTuple_GET_ITEM(args, 1));
     }
@@ -2827,6 +3090,161 @@ _cdata_attr_errmsg(char *errmsg, CDataObject *cd, PyObject *attr)
     PyErr_Format(PyExc_AttributeError, errmsg, cd->c_type->ct_name, text);
 }
 
+/* how cdata_getattro() reads a field found in the ct_field_cache */
+#define FK_GENERIC     0    /* with cdata_read_field() */
+#define FK_SLONG_1     1    /* the following ones are all regular fields */
+#define FK_SLONG_2     2
+#define FK_SLONG_4     3
+#define FK_SLONG_8     4
+#define FK_ULONG_1     5
+#define FK_ULONG_2     6
+#define FK_ULONG_4     7
+#define FK_ULLONG_8    8
+#define FK_FLOAT       9
+#define FK_DOUBLE     10
+#define FK_POINTER    11
+
+static int field_cache_kind(CFieldObject *cf)
+{
+    CTypeDescrObject *ct = cf->cf_type;
+    int flags = ct->ct_flags;
+
+    if (cf->cf_bitshift != BS_REGULAR)
+        return FK_GENERIC;
+    if (flags & (CT_POINTER | CT_FUNCTIONPTR))
+        return FK_POINTER;
+    if ((flags & (CT_PRIMITIVE_SIGNED | CT_PRIMITIVE_FITS_LONG)) ==
+                 (CT_PRIMITIVE_SIGNED | CT_PRIMITIVE_FITS_LONG)) {
+        switch (ct->ct_size) {
+        case 1: return FK_SLONG_1;
+        case 2: return FK_SLONG_2;
+        case 4: return FK_SLONG_4;
+        case 8: return FK_SLONG_8;
+        }
+    }
+    else if ((flags & (CT_PRIMITIVE_UNSIGNED | CT_IS_BOOL)) ==
+             CT_PRIMITIVE_UNSIGNED) {
+        if (flags & CT_PRIMITIVE_FITS_LONG) {
+            switch (ct->ct_size) {
+            case 1: return FK_ULONG_1;
+            case 2: return FK_ULONG_2;
+            case 4: return FK_ULONG_4;
+            }
+        }
+        else if (ct->ct_size == 8)
+            return FK_ULLONG_8;
+    }
+    else if ((flags & (CT_PRIMITIVE_FLOAT | CT_IS_LONGDOUBLE)) ==
+             CT_PRIMITIVE_FLOAT) {
+        if (ct->ct_size == sizeof(double))
+            return FK_DOUBLE;
+        if (ct->ct_size == sizeof(float))
+            return FK_FLOAT;
+    }
+    return FK_GENERIC;
+}
+
+static cffi_field_cache_entry_t *
+field_cache_lookup(CTypeDescrObject *ct, PyObject *attr)
+{
+    /* 'ct' is a struct or union type; returns the entry for 'attr', or
+       NULL if it is not in the cache.  The cache only exists once the
+       struct is no longer lazy or opaque. */
+    cffi_field_cache_t *cache = ct->ct_field_cache;
+    cffi_field_cache_entry_t *entry;
+    if (cache == NULL)
+        return NULL;
+    entry = &cache->fc_entries[(((size_t)attr) >> 4) & cache->fc_mask];
+    return entry->fc_name == attr ? entry : NULL;
+}
+
+static cffi_field_cache_entry_t *
+field_cache_store(CTypeDescrObject *ct, PyObject *attr, CFieldObject *cf)
+{
+    /* 'ct' is a realized struct or union type.  Only returns NULL if
+       out of memory, without setting an exception. */
+    cffi_field_cache_t *cache = ct->ct_field_cache;
+    cffi_field_cache_entry_t *entry;
+
+    if (cache == NULL) {
+        size_t size = 8;
+        Py_ssize_t nfields = PyDict_Size(ct->ct_stuff);
+        while (size < 1024 && (Py_ssize_t)size < 2 * nfields)
+            size *= 2;
+        cache = PyMem_Malloc(offsetof(cffi_field_cache_t, fc_entries) +
+                             size * sizeof(cffi_field_cache_entry_t));
+        if (cache == NULL)
+            return NULL;
+        memset(cache->fc_entries, 0, size * sizeof(cffi_field_cache_entry_t));
+        cache->fc_mask = size - 1;
+        ct->ct_field_cache = cache;
+    }
+    entry = &cache->fc_entries[(((size_t)attr) >> 4) & cache->fc_mask];
+    Py_INCREF(attr);
+    Py_XDECREF(entry->fc_name);   /* only a string: cannot run code */
+    entry->fc_name = attr;
+    entry->fc_field = cf;
+    entry->fc_kind = field_cache_kind(cf);
+    return entry;
+}
+
+static PyObject *cdata_read_field(CDataObject *cd, CFieldObject *cf)
+{
+    /* read the field 'cf' */
+    char *data = cd->c_data + cf->cf_offset;
+    Py_ssize_t array_len, size;
+
+    if (cf->cf_bitshift == BS_REGULAR) {
+        return convert_to_object(data, cf->cf_type);
+    }
+    else if (cf->cf_bitshift != BS_EMPTY_ARRAY) {
+        return convert_to_object_bitfield(data, cf);
+    }
+
+    /* variable-length array: */
+    /* if reading variable length array from variable length
+       struct, calculate array type from allocated length */
+    size = _cdata_var_byte_size(cd) - cf->cf_offset;
+    if (size >= 0) {
+        array_len = size / cf->cf_type->ct_itemdescr->ct_size;
+        return new_sized_cdata(data, cf->cf_type, array_len);
+    }
+    return new_simple_cdata(data,
+        (CTypeDescrObject *)cf->cf_type->ct_stuff);
+}
+
+static PyObject *
+cdata_read_cached_field(CDataObject *cd, cffi_field_cache_entry_t *entry)
+{
+    CFieldObject *cf = entry->fc_field;
+    char *data = cd->c_data + cf->cf_offset;
+
+    /* the field may be misaligned, e.g. in packed structs: use memcpy(),
+       which compilers turn into a plain load anyway */
+#define READ_FIELD(type, make_result)  {        \
+        type value;                             \
+        memcpy(&value, data, sizeof(type));     \
+        return make_result;                     \
+    }
+    switch (entry->fc_kind) {
+    case FK_SLONG_1:  READ_FIELD(signed char, PyInt_FromLong(value))
+    case FK_SLONG_2:  READ_FIELD(int16_t, PyInt_FromLong(value))
+    case FK_SLONG_4:  READ_FIELD(int32_t, PyInt_FromLong(value))
+    case FK_SLONG_8:  READ_FIELD(int64_t, PyInt_FromLong((long)value))
+    case FK_ULONG_1:  READ_FIELD(unsigned char, PyInt_FromLong(value))
+    case FK_ULONG_2:  READ_FIELD(uint16_t, PyInt_FromLong(value))
+    case FK_ULONG_4:  READ_FIELD(uint32_t, PyInt_FromLong((long)value))
+    case FK_ULLONG_8: READ_FIELD(uint64_t, PyLong_FromUnsignedLongLong(value))
+    case FK_FLOAT:    READ_FIELD(float, PyFloat_FromDouble(value))
+    case FK_DOUBLE:   READ_FIELD(double, PyFloat_FromDouble(value))
+    case FK_POINTER:  READ_FIELD(char *, new_simple_cdata(value,
+                                                          cf->cf_type))
+    default:
+        return cdata_read_field(cd, cf);
+    }
+#undef READ_FIELD
+}
+
 static PyObject *
 cdata_getattro(CDataObject *cd, PyObject *attr)
 {
@@ -2839,31 +3257,18 @@ cdata_getattro(CDataObject *cd, PyObject *attr)
         ct = ct->ct_itemdescr;
 
     if (ct->ct_flags & (CT_STRUCT|CT_UNION)) {
+        cffi_field_cache_entry_t *entry = field_cache_lookup(ct, attr);
+        if (entry != NULL)
+            return cdata_read_cached_field(cd, entry);
+
         switch (force_lazy_struct(ct)) {
         case 1:
             cf = (CFieldObject *)PyDict_GetItem(ct->ct_stuff, attr);
             if (cf != NULL) {
-                /* read the field 'cf' */
-                char *data = cd->c_data + cf->cf_offset;
-                Py_ssize_t array_len, size;
-
-                if (cf->cf_bitshift == BS_REGULAR) {
-                    return convert_to_object(data, cf->cf_type);
-                }
-                else if (cf->cf_bitshift != BS_EMPTY_ARRAY) {
-                    return convert_to_object_bitfield(data, cf);
-                }
-
-                /* variable-length array: */
-                /* if reading variable length array from variable length
-                   struct, calculate array type from allocated length */
-                size = _cdata_var_byte_size(cd) - cf->cf_offset;
-                if (size >= 0) {
-                    array_len = size / cf->cf_type->ct_itemdescr->ct_size;
-                    return new_sized_cdata(data, cf->cf_type, array_len);
-                }
-                return new_simple_cdata(data,
-                    (CTypeDescrObject *)cf->cf_type->ct_stuff);
+                entry = field_cache_store(ct, attr, cf);
+                if (entry != NULL)
+                    return cdata_read_cached_field(cd, entry);
+                return cdata_read_field(cd, cf);
             }
             errmsg = "cdata '%s' has no field '%s'";
             break;
@@ -2892,11 +3297,17 @@ cdata_setattro(CDataObject *cd, PyObject *attr, PyObject *value)
         ct = ct->ct_itemdescr;
 
     if (ct->ct_flags & (CT_STRUCT|CT_UNION)) {
+        cffi_field_cache_entry_t *entry = field_cache_lookup(ct, attr);
+        if (entry != NULL && value != NULL)
+            return convert_field_from_object(cd->c_data, entry->fc_field,
+                                             value);
+
         switch (force_lazy_struct(ct)) {
         case 1:
             cf = (CFieldObject *)PyDict_GetItem(ct->ct_stuff, attr);
             if (cf != NULL) {
                 /* write the field 'cf' */
+                field_cache_store(ct, attr, cf);
                 if (value != NULL) {
                     return convert_field_from_object(cd->c_data, cf, value);
                 }
@@ -2930,6 +3341,128 @@ fb_prepare_cif(PyObject *fargs, CTypeDescrObject *, Py_ssize_t, ffi_abi);
 
 static PyObject *new_primitive_type(const char *name);             /*forward*/
 
+/* Calls to variadic functions need a cif_description_t that depends on
+   the types of the arguments actually passed.  Building one is costly,
+   so we keep the most recently used ones in a bounded LRU cache.  It is
+   a dict mapping (function ctype, tuple of all argument ctypes) to a
+   capsule owning the cif_description_t; the dict order is the LRU order.
+   The caller gets a new reference to the capsule, which keeps the
+   cif_description_t alive even if it is evicted while a call is in
+   progress in another thread.
+*/
+static PyObject *variadic_cache = NULL;
+static Py_ssize_t variadic_cache_maxsize = 128;
+static Py_ssize_t variadic_cache_hits = 0;
+static Py_ssize_t variadic_cache_misses = 0;
+
+#if PY_MAJOR_VERSION >= 3
+static void variadic_cache_free_cif(PyObject *capsule)
+{
+    cif_description_free((cif_description_t *)
+                         PyCapsule_GetPointer(capsule, NULL));
+}
+#else
+static void variadic_cache_free_cif(void *cif_descr)
+{
+    cif_description_free((cif_description_t *)cif_descr);
+}
+#endif
+
+static int variadic_cache_evict(Py_ssize_t maxsize)
+{
+    while (PyDict_Size(variadic_cache) > maxsize) {
+        Py_ssize_t pos = 0;
+        PyObject *key, *value;
+        int err;
+        if (!PyDict_Next(variadic_cache, &pos, &key, &value))
+            break;
+        Py_INCREF(key);
+        err = PyDict_DelItem(variadic_cache, key);
+        Py_DECREF(key);
+        if (err < 0)
+            return -1;
+    }
+    return 0;
+}
+
+static cif_description_t *
+variadic_cache_lookup(CTypeDescrObject *fct, PyObject *fargs,
+                      CTypeDescrObject *fresult, Py_ssize_t nargs_declared,
+                      ffi_abi fabi, PyObject **p_owner)
+{
+    PyObject *key, *capsule;
+    cif_description_t *cif_descr;
+
+    if (variadic_cache == NULL) {
+        variadic_cache = PyDict_New();
+        if (variadic_cache == NULL)
+            return NULL;
+    }
+    key = PyTuple_Pack(2, (PyObject *)fct, fargs);
+    if (key == NULL)
+        return NULL;
+
+    capsule = PyDict_GetItem(variadic_cache, key);
+    if (capsule != NULL) {
+        variadic_cache_hits++;
+        /* move it to the end, i.e. mark it as the most recently used */
+        Py_INCREF(capsule);
+        if (PyDict_DelItem(variadic_cache, key) < 0 ||
+            PyDict_SetItem(variadic_cache, key, capsule) < 0)
+            goto error;
+    }
+    else {
+        variadic_cache_misses++;
+        cif_descr = fb_prepare_cif(fargs, fresult, nargs_declared, fabi);
+        if (cif_descr == NULL)
+            goto error;
+        capsule = PyCapsule_New(cif_descr, NULL, variadic_cache_free_cif);
+        if (capsule == NULL) {
+            cif_description_free(cif_descr);
+            goto error;
+        }
+        if (variadic_cache_maxsize > 0) {
+            if (variadic_cache_evict(variadic_cache_maxsize - 1) < 0 ||
+                PyDict_SetItem(variadic_cache, key, capsule) < 0)
+                goto error;
+        }
+    }
+    Py_DECREF(key);
+    *p_owner = capsule;
+    return (cif_description_t *)PyCapsule_GetPointer(capsule, NULL);
+
+ error:
+    Py_XDECREF(capsule);
+    Py_DECREF(key);
+    return NULL;
+}
+
+static PyObject *b_get_variadic_cache_info(PyObject *self, PyObject *noarg)
+{
+    return Py_BuildValue("{s:n,s:n,s:n,s:n}",
+                         "hits", variadic_cache_hits,
+                         "misses", variadic_cache_misses,
+                         "size", variadic_cache ? PyDict_Size(variadic_cache)
+                                                : (Py_ssize_t)0,
+                         "maxsize", variadic_cache_maxsize);
+}
+
+static PyObject *b_set_variadic_cache_size(PyObject *self, PyObject *arg)
+{
+    Py_ssize_t maxsize = PyInt_AsSsize_t(arg);
+    if (maxsize == -1 && PyErr_Occurred())
+        return NULL;
+    if (maxsize < 0) {
+        PyErr_SetString(PyExc_ValueError, "cache size cannot be negative");
+        return NULL;
+    }
+    variadic_cache_maxsize = maxsize;
+    if (variadic_cache != NULL && variadic_cache_evict(maxsize) < 0)
+        return NULL;
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
 static CTypeDescrObject *_get_ct_int(void)
 {
     static CTypeDescrObject *ct_int = NULL;
@@ -3019,13 +3552,14 @@ _prepare_pointer_call_argument(CTypeDescrObject *ctptr, PyObject *init,
 }
 
 static PyObject*
-cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
+cdata_call_impl(CDataObject *cd, PyObject *const *args, Py_ssize_t nargs,
+                int with_keywords)
 {
     char *buffer;
     void** buffer_array;
     cif_description_t *cif_descr;
-    Py_ssize_t i, nargs, nargs_declared;
-    PyObject *signature, *res = NULL, *fvarargs;
+    Py_ssize_t i, nargs_declared;
+    PyObject *signature, *res = NULL, *fvarargs, *cif_owner;
     CTypeDescrObject *fresult;
     char *resultdata;
     char *errormsg;
@@ -3045,18 +3579,16 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
                      cd->c_type->ct_name);
         return NULL;
     }
-    if (kwds != NULL && PyDict_Size(kwds) != 0) {
+    if (with_keywords) {
         PyErr_SetString(PyExc_TypeError,
                 "a cdata function cannot be called with keyword arguments");
         return NULL;
     }
     signature = cd->c_type->ct_stuff;
-    nargs = PyTuple_Size(args);
-    if (nargs < 0)
-        return NULL;
     nargs_declared = PyTuple_GET_SIZE(signature) - 2;
     fresult = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 1);
     fvarargs = NULL;
+    cif_owner = NULL;
     buffer = NULL;
 
     cif_descr = (cif_description_t *)cd->c_type->ct_extra;
@@ -3087,7 +3619,7 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
             PyTuple_SET_ITEM(fvarargs, i, o);
         }
         for (i = nargs_declared; i < nargs; i++) {
-            PyObject *obj = PyTuple_GET_ITEM(args, i);
+            PyObject *obj = args[i];
             CTypeDescrObject *ct;
 
             if (CData_Check(obj)) {
@@ -3119,23 +3651,33 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
 #else
         fabi = PyLong_AS_LONG(PyTuple_GET_ITEM(signature, 0));
 #endif
-        cif_descr = fb_prepare_cif(fvarargs, fresult, nargs_declared, fabi);
+        cif_descr = variadic_cache_lookup(cd->c_type, fvarargs, fresult,
+                                          nargs_declared, fabi, &cif_owner);
         if (cif_descr == NULL)
             goto error;
     }
 
-    buffer = PyObject_Malloc(cif_descr->exchange_size);
-    if (buffer == NULL) {
-        PyErr_NoMemory();
-        goto error;
+    /* reuse the exchange buffer cached on the cif_descr if no other
+       call (from another thread, or reentrant) is currently using it */
+    buffer = cif_descr->exchange_cache;
+    if (buffer != NULL) {
+        cif_descr->exchange_cache = NULL;
+    }
+    else {
+        buffer = PyObject_Malloc(cif_descr->exchange_size);
+        if (buffer == NULL) {
+            PyErr_NoMemory();
+            goto error;
+        }
     }
 
     buffer_array = (void **)buffer;
 
     for (i=0; i<nargs; i++) {
         CTypeDescrObject *argtype;
+        cffi_argconv_fn convert = cif_descr->call_plan[i];
         char *data = buffer + cif_descr->exchange_offset_arg[1 + i];
-        PyObject *obj = PyTuple_GET_ITEM(args, i);
+        PyObject *obj = args[i];
 
         buffer_array[i] = data;
 
@@ -3144,7 +3686,12 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
         else
             argtype = (CTypeDescrObject *)PyTuple_GET_ITEM(fvarargs, i);
 
-        if (argtype->ct_flags & CT_POINTER) {
+        if (convert != NULL) {
+            if (convert(data, argtype, obj) < 0)
+                goto error;
+        }
+        else {
+            /* pointer argument */
             char *tmpbuf;
             Py_ssize_t datasize = _prepare_pointer_call_argument(
                                             argtype, obj, (char **)data);
@@ -3174,19 +3721,27 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
                     goto error;
             }
         }
-        else if (convert_from_object(data, argtype, obj) < 0)
-            goto error;
     }
 
     resultdata = buffer + cif_descr->exchange_offset_arg[0];
     /*READ(cd->c_data, sizeof(void(*)(void)))*/
 
-    Py_BEGIN_ALLOW_THREADS
-    restore_errno();
-    ffi_call(&cif_descr->cif, (void (*)(void))(cd->c_data),
-             resultdata, buffer_array);
-    save_errno();
-    Py_END_ALLOW_THREADS
+    if (Py_TYPE(cd) == &CDataKeepGIL_Type) {
+        /* the function was loaded as too short to be worth releasing
+           the GIL around */
+        restore_errno();
+        ffi_call(&cif_descr->cif, (void (*)(void))(cd->c_data),
+                 resultdata, buffer_array);
+        save_errno();
+    }
+    else {
+        Py_BEGIN_ALLOW_THREADS
+        restore_errno();
+        ffi_call(&cif_descr->cif, (void (*)(void))(cd->c_data),
+                 resultdata, buffer_array);
+        save_errno();
+        Py_END_ALLOW_THREADS
+    }
 
     if (fresult->ct_flags & (CT_PRIMITIVE_CHAR | CT_PRIMITIVE_SIGNED |
                              CT_PRIMITIVE_UNSIGNED)) {
@@ -3217,16 +3772,35 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
         freeme = freeme->next;
         PyObject_Free(p);
     }
-    if (buffer)
-        PyObject_Free(buffer);
-    if (fvarargs != NULL) {
-        Py_DECREF(fvarargs);
-        if (cif_descr != NULL)  /* but only if fvarargs != NULL, if variadic */
-            PyObject_Free(cif_descr);
+    if (buffer) {
+        if (cif_descr->exchange_cache == NULL)
+            cif_descr->exchange_cache = buffer;
+        else
+            PyObject_Free(buffer);
     }
+    Py_XDECREF(fvarargs);
+    Py_XDECREF(cif_owner);   /* only if variadic */
     return res;
 }
 
+static PyObject*
+cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
+{
+    return cdata_call_impl(cd, &PyTuple_GET_ITEM(args, 0),
+                           PyTuple_GET_SIZE(args),
+                           kwds != NULL && PyDict_Size(kwds) != 0);
+}
+
+#ifdef CFFI_USE_VECTORCALL
+static PyObject*
+cdata_vectorcall(PyObject *cd, PyObject *const *args, size_t nargsf,
+                 PyObject *kwnames)
+{
+    return cdata_call_impl((CDataObject *)cd, args, PyVectorcall_NARGS(nargsf),
+                           kwnames != NULL && PyTuple_GET_SIZE(kwnames) != 0);
+}
+#endif
+
 static PyObject *cdata_dir(PyObject *cd, PyObject *noarg)
 {
     CTypeDescrObject *ct = ((CDataObject *)cd)->c_type;
@@ -3279,6 +3853,9 @@ static int explicit_release_case(PyObject *cd)
     else if (Py_TYPE(cd) == &CDataGCP_Type) {
         return 2;    /* ffi.gc() */
     }
+    else if (Py_TYPE(cd) == &CDataCFree_Type) {
+        return 3;    /* ffi.new_allocator(C functions) */
+    }
     PyErr_SetString(PyExc_ValueError,
         "only 'cdata' object from ffi.new(), ffi.gc(), ffi.from_buffer() "
         "or ffi.new_allocator()() can be used with the 'with' keyword or "
@@ -3314,6 +3891,9 @@ static PyObject *cdata_exit(PyObject *cd, PyObject *args)
                        ffi.new_allocator()("struct-or-union *") */
                     cdatagcp_finalize((CDataObject_gcp *)x);
                 }
+                else if (Py_TYPE(x) == &CDataCFree_Type) {
+                    cdatacfree_finalize((CDataObject_cfree *)x);
+                }
             }
             break;
 
@@ -3327,6 +3907,10 @@ static PyObject *cdata_exit(PyObject *cd, PyObject *args)
             cdatagcp_finalize((CDataObject_gcp *)cd);
             break;
 
+        case 3:    /* ffi.new_allocator(C functions) */
+            cdatacfree_finalize((CDataObject_cfree *)cd);
+            break;
+
         default:
             return NULL;
     }
@@ -3382,56 +3966,308 @@ static PyMappingMethods CDataOwn_as_mapping = {
     (objobjargproc)cdata_ass_sub, /*mp_ass_subscript*/
 };
 
-static PyMethodDef cdata_methods[] = {
-    {"__dir__",     cdata_dir,      METH_NOARGS},
-    {"__complex__", cdata_complex,  METH_NOARGS},
-    {"__enter__",   cdata_enter,    METH_NOARGS},
-    {"__exit__",    cdata_exit,     METH_VARARGS},
-    {NULL,          NULL}           /* sentinel */
-};
+static PyObject *_array_typestr(CTypeDescrObject *ct)
+{
+    /* Return the '__array_interface__' type string of the items of type
+       'ct', like '<i4' or '|V16', or NULL without exception if there
+       is none */
+    char kind, order = PY_BIG_ENDIAN ? '>' : '<';
+    Py_ssize_t size = ct->ct_size;
 
-static PyTypeObject CData_Type = {
-    PyVarObject_HEAD_INIT(NULL, 0)
-    "_cffi_backend._CDataBase",
-    sizeof(CDataObject),
-    0,
-    (destructor)cdata_dealloc,                  /* tp_dealloc */
-    0,                                          /* tp_print */
-    0,                                          /* tp_getattr */
-    0,                                          /* tp_setattr */
-    0,                                          /* tp_compare */
-    (reprfunc)cdata_repr,                       /* tp_repr */
-    &CData_as_number,                           /* tp_as_number */
-    0,                                          /* tp_as_sequence */
-    &CData_as_mapping,                          /* tp_as_mapping */
-    cdata_hash,                                 /* tp_hash */
-    (ternaryfunc)cdata_call,                    /* tp_call */
-    0,                                          /* tp_str */
-    (getattrofunc)cdata_getattro,               /* tp_getattro */
-    (setattrofunc)cdata_setattro,               /* tp_setattro */
-    0,                                          /* tp_as_buffer */
-    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES, /* tp_flags */
-    "The internal base type for CData objects.  Use FFI.CData to access "
-    "it.  Always check with isinstance(): subtypes are sometimes returned "
-    "on CPython, for performance reasons.",     /* tp_doc */
-    0,                                          /* tp_traverse */
-    0,                                          /* tp_clear */
-    cdata_richcompare,                          /* tp_richcompare */
-    offsetof(CDataObject, c_weakreflist),       /* tp_weaklistoffset */
-    (getiterfunc)cdata_iter,                    /* tp_iter */
-    0,                                          /* tp_iternext */
-    cdata_methods,                              /* tp_methods */
-    0,                                          /* tp_members */
-    0,                                          /* tp_getset */
-    0,                                          /* tp_base */
-    0,                                          /* tp_dict */
-    0,                                          /* tp_descr_get */
-    0,                                          /* tp_descr_set */
-    0,                                          /* tp_dictoffset */
-    0,                                          /* tp_init */
-    0,                                          /* tp_alloc */
-    0,                                          /* tp_new */
-    PyObject_Del,                               /* tp_free */
+    if (size < 0)
+        return NULL;
+    if (ct->ct_flags & CT_PRIMITIVE_COMPLEX)
+        kind = 'c';
+    else if (ct->ct_flags & CT_PRIMITIVE_FLOAT)
+        kind = 'f';
+    else if (ct->ct_flags & CT_PRIMITIVE_CHAR) {
+        if (size == 1)
+            kind = 'S';
+        else if (size == 4) {
+            kind = 'U';      /* '<U1' is one UCS4 character */
+            size = 1;
+        }
+        else
+            kind = 'u';      /* char16_t */
+    }
+    else if (ct->ct_flags & CT_PRIMITIVE_SIGNED)
+        kind = 'i';
+    else if (ct->ct_flags & CT_PRIMITIVE_UNSIGNED)
+        kind = (ct->ct_flags & CT_IS_BOOL) ? 'b' : 'u';
+    else if (ct->ct_flags & (CT_POINTER | CT_FUNCTIONPTR))
+        kind = 'u';          /* no pointer type in numpy: use uintptr_t */
+    else if ((ct->ct_flags & (CT_STRUCT | CT_UNION)) &&
+             !(ct->ct_flags & CT_IS_OPAQUE))
+        kind = 'V';
+    else
+        return NULL;
+
+    if (ct->ct_size == 1 || kind == 'V')
+        order = '|';
+    return PyText_FromFormat("%c%c%zd", order, kind, size);
+}
+
+static PyObject *_array_struct_descr(CTypeDescrObject *ct);
+
+static PyObject *_array_descr_item(PyObject *name, CTypeDescrObject *ct)
+{
+    /* Return a 'descr' entry (name, type) or (name, type, shape) for an
+       item of type 'ct', or NULL without exception if there is none */
+    PyObject *shape = NULL, *type = NULL, *res = NULL;
+
+    if (ct->ct_flags & CT_ARRAY) {
+        shape = PyList_New(0);
+        if (shape == NULL)
+            return NULL;
+        for (; ct->ct_flags & CT_ARRAY; ct = ct->ct_itemdescr) {
+            PyObject *o;
+            if (ct->ct_length < 0)
+                goto done;
+            o = PyLong_FromSsize_t(ct->ct_length);
+            if (o == NULL || PyList_Append(shape, o) < 0) {
+                Py_XDECREF(o);
+                goto done;
+            }
+            Py_DECREF(o);
+        }
+    }
+    if (ct->ct_flags & CT_STRUCT) {
+        type = _array_struct_descr(ct);
+        if (type == Py_None)
+            Py_CLEAR(type);
+    }
+    if (type == NULL && !PyErr_Occurred())
+        type = _array_typestr(ct);
+    if (type == NULL)
+        goto done;
+
+    if (shape == NULL) {
+        res = PyTuple_Pack(2, name, type);
+    }
+    else {
+        PyObject *tshape = PyList_AsTuple(shape);
+        if (tshape != NULL) {
+            res = PyTuple_Pack(3, name, type, tshape);
+            Py_DECREF(tshape);
+        }
+    }
+ done:
+    Py_XDECREF(type);
+    Py_XDECREF(shape);
+    return res;
+}
+
+static int _array_append_padding(PyObject *lst, Py_ssize_t size)
+{
+    PyObject *o = Py_BuildValue("(sN)", "",
+                                PyText_FromFormat("|V%zd", size));
+    int res;
+    if (o == NULL)
+        return -1;
+    res = PyList_Append(lst, o);
+    Py_DECREF(o);
+    return res;
+}
+
+static int _array_descr_fields(PyObject *lst, CTypeDescrObject *ct,
+                               Py_ssize_t base, Py_ssize_t *poffset)
+{
+    /* Append to 'lst' the entries of the fields of the struct 'ct',
+       which is itself at offset 'base', with explicit padding entries.
+       Anonymous nested structs are inlined.  Returns 0, or 1 if the
+       layout cannot be described (bitfields, overlapping fields), or
+       -1 on error. */
+    CFieldObject *cf;
+    int err;
+
+    if (force_lazy_struct(ct) <= 0)
+        return PyErr_Occurred() ? -1 : 1;
+
+    for (cf = (CFieldObject *)ct->ct_extra; cf != NULL; cf = cf->cf_next) {
+        Py_ssize_t start = base + cf->cf_offset;
+        PyObject *name, *item;
+
+        if (cf->cf_bitshift != BS_REGULAR || start < *poffset ||
+                cf->cf_type->ct_size < 0)
+            return 1;
+        name = get_field_name(ct, cf);
+        if (PyText_Check(name) && PyText_GetSize(name) == 0 &&
+                (cf->cf_type->ct_flags & CT_STRUCT)) {
+            err = _array_descr_fields(lst, cf->cf_type, start, poffset);
+            if (err != 0)
+                return err;
+            continue;
+        }
+        if (start > *poffset && _array_append_padding(lst,
+                                                      start - *poffset) < 0)
+            return -1;
+        item = _array_descr_item(name, cf->cf_type);
+        if (item == NULL)
+            return PyErr_Occurred() ? -1 : 1;
+        err = PyList_Append(lst, item);
+        Py_DECREF(item);
+        if (err < 0)
+            return -1;
+        *poffset = start + cf->cf_type->ct_size;
+    }
+    return 0;
+}
+
+static PyObject *_array_struct_descr(CTypeDescrObject *ct)
+{
+    /* Return the '__array_interface__' descr list of the struct 'ct',
+       or None if its layout cannot be described */
+    Py_ssize_t offset = 0;
+    PyObject *lst;
+    int err;
+
+    if (ct->ct_flags & (CT_IS_OPAQUE | CT_WITH_VAR_ARRAY))
+        Py_RETURN_NONE;
+    lst = PyList_New(0);
+    if (lst == NULL)
+        return NULL;
+    err = _array_descr_fields(lst, ct, 0, &offset);
+    if (err == 0 && ct->ct_size > offset)
+        err = _array_append_padding(lst, ct->ct_size - offset);
+    if (err != 0) {
+        Py_DECREF(lst);
+        if (err < 0)
+            return NULL;
+        Py_RETURN_NONE;
+    }
+    return lst;
+}
+
+static PyObject *cdata_array_interface(CDataObject *cd, void *context)
+{
+    CTypeDescrObject *ct = cd->c_type;
+    PyObject *shape, *o, *typestr = NULL, *descr = NULL, *res = NULL;
+
+    shape = PyList_New(0);
+    if (shape == NULL)
+        return NULL;
+    if (ct->ct_flags & CT_ARRAY) {
+        o = PyLong_FromSsize_t(get_array_length(cd));
+        if (o == NULL || PyList_Append(shape, o) < 0)
+            goto done1;
+        Py_DECREF(o);
+        ct = ct->ct_itemdescr;
+    }
+    else if (!((ct->ct_flags & CT_POINTER) && CDataOwn_Check(cd))) {
+        /* other pointers don't say how many items they point to */
+        ct = NULL;
+    }
+    else
+        ct = ct->ct_itemdescr;
+
+    for (; ct != NULL && (ct->ct_flags & CT_ARRAY); ct = ct->ct_itemdescr) {
+        if (ct->ct_length < 0) {
+            ct = NULL;
+            break;
+        }
+        o = PyLong_FromSsize_t(ct->ct_length);
+        if (o == NULL || PyList_Append(shape, o) < 0)
+            goto done1;
+        Py_DECREF(o);
+    }
+    if (ct != NULL)
+        typestr = _array_typestr(ct);
+    if (typestr == NULL) {
+        if (!PyErr_Occurred())
+            PyErr_Format(PyExc_AttributeError,
+                         "cdata '%s' has no __array_interface__",
+                         cd->c_type->ct_name);
+        goto done;
+    }
+    if (ct->ct_flags & CT_STRUCT) {
+        descr = _array_struct_descr(ct);
+        if (descr == NULL)
+            goto done;
+    }
+    if (descr == NULL || descr == Py_None) {
+        Py_XDECREF(descr);
+        descr = Py_BuildValue("[(sO)]", "", typestr);
+        if (descr == NULL)
+            goto done;
+    }
+    o = PyList_AsTuple(shape);
+    if (o == NULL)
+        goto done;
+    res = Py_BuildValue("{s:i,s:N,s:O,s:O,s:(NO),s:O}",
+                        "version", 3,
+                        "shape", o,
+                        "typestr", typestr,
+                        "descr", descr,
+                        "data", PyLong_FromVoidPtr(cd->c_data), Py_False,
+                        "strides", Py_None);
+    goto done;
+
+ done1:
+    Py_XDECREF(o);
+ done:
+    Py_XDECREF(descr);
+    Py_XDECREF(typestr);
+    Py_DECREF(shape);
+    return res;
+}
+
+static PyGetSetDef cdata_getsets[] = {
+    {"__array_interface__", (getter)cdata_array_interface, NULL,
+     "the numpy array interface of C arrays"},
+    {NULL}                        /* sentinel */
+};
+
+static PyMethodDef cdata_methods[] = {
+    {"__dir__",     cdata_dir,      METH_NOARGS},
+    {"__complex__", cdata_complex,  METH_NOARGS},
+    {"__enter__",   cdata_enter,    METH_NOARGS},
+    {"__exit__",    cdata_exit,     METH_VARARGS},
+    {NULL,          NULL}           /* sentinel */
+};
+
+static PyTypeObject CData_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_backend._CDataBase",
+    sizeof(CDataObject),
+    0,
+    (destructor)cdata_dealloc,                  /* tp_dealloc */
+    CDATA_VECTORCALL_OFFSET,                    /* tp_vectorcall_offset */
+    0,                                          /* tp_getattr */
+    0,                                          /* tp_setattr */
+    0,                                          /* tp_compare */
+    (reprfunc)cdata_repr,                       /* tp_repr */
+    &CData_as_number,                           /* tp_as_number */
+    0,                                          /* tp_as_sequence */
+    &CData_as_mapping,                          /* tp_as_mapping */
+    cdata_hash,                                 /* tp_hash */
+    (ternaryfunc)cdata_call,                    /* tp_call */
+    0,                                          /* tp_str */
+    (getattrofunc)cdata_getattro,               /* tp_getattro */
+    (setattrofunc)cdata_setattro,               /* tp_setattro */
+    0,                                          /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES  /* tp_flags */
+                       | CDATA_TPFLAGS_VECTORCALL,
+    "The internal base type for CData objects.  Use FFI.CData to access "
+    "it.  Always check with isinstance(): subtypes are sometimes returned "
+    "on CPython, for performance reasons.",     /* tp_doc */
+    0,                                          /* tp_traverse */
+    0,                                          /* tp_clear */
+    cdata_richcompare,                          /* tp_richcompare */
+    offsetof(CDataObject, c_weakreflist),       /* tp_weaklistoffset */
+    (getiterfunc)cdata_iter,                    /* tp_iter */
+    0,                                          /* tp_iternext */
+    cdata_methods,                              /* tp_methods */
+    0,                                          /* tp_members */
+    cdata_getsets,                              /* tp_getset */
+    0,                                          /* tp_base */
+    0,                                          /* tp_dict */
+    0,                                          /* tp_descr_get */
+    0,                                          /* tp_descr_set */
+    0,                                          /* tp_dictoffset */
+    0,                                          /* tp_init */
+    0,                                          /* tp_alloc */
+    0,                                          /* tp_new */
+    PyObject_Del,                               /* tp_free */
 };
 
 static PyTypeObject CDataOwning_Type = {
@@ -3440,7 +4276,7 @@ static PyTypeObject CDataOwning_Type = {
     sizeof(CDataObject),
     0,
     (destructor)cdataowning_dealloc,            /* tp_dealloc */
-    0,                                          /* tp_print */
+    CDATA_VECTORCALL_OFFSET,                    /* tp_vectorcall_offset */
     0,                                          /* tp_getattr */
     0,                                          /* tp_setattr */
     0,                                          /* tp_compare */
@@ -3454,7 +4290,8 @@ static PyTypeObject CDataOwning_Type = {
     0,  /* inherited */                         /* tp_getattro */
     0,  /* inherited */                         /* tp_setattro */
     0,                                          /* tp_as_buffer */
-    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES, /* tp_flags */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES  /* tp_flags */
+                       | CDATA_TPFLAGS_VECTORCALL,
     "This is an internal subtype of _CDataBase for performance only on "
     "CPython.  Check with isinstance(x, ffi.CData).",   /* tp_doc */
     0,                                          /* tp_traverse */
@@ -3483,7 +4320,7 @@ static PyTypeObject CDataOwningGC_Type = {
     sizeof(CDataObject_own_structptr),
     0,
     (destructor)cdataowninggc_dealloc,          /* tp_dealloc */
-    0,                                          /* tp_print */
+    CDATA_VECTORCALL_OFFSET,                    /* tp_vectorcall_offset */
     0,                                          /* tp_getattr */
     0,                                          /* tp_setattr */
     0,                                          /* tp_compare */
@@ -3498,6 +4335,7 @@ static PyTypeObject CDataOwningGC_Type = {
     0,  /* inherited */                         /* tp_setattro */
     0,                                          /* tp_as_buffer */
     Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES  /* tp_flags */
+                       | CDATA_TPFLAGS_VECTORCALL
                        | Py_TPFLAGS_HAVE_GC,
     "This is an internal subtype of _CDataBase for performance only on "
     "CPython.  Check with isinstance(x, ffi.CData).",   /* tp_doc */
@@ -3527,7 +4365,7 @@ static PyTypeObject CDataFromBuf_Type = {
     sizeof(CDataObject_frombuf),
     0,
     (destructor)cdatafrombuf_dealloc,           /* tp_dealloc */
-    0,                                          /* tp_print */
+    CDATA_VECTORCALL_OFFSET,                    /* tp_vectorcall_offset */
     0,                                          /* tp_getattr */
     0,                                          /* tp_setattr */
     0,                                          /* tp_compare */
@@ -3542,6 +4380,7 @@ static PyTypeObject CDataFromBuf_Type = {
     0,  /* inherited */                         /* tp_setattro */
     0,                                          /* tp_as_buffer */
     Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES  /* tp_flags */
+                       | CDATA_TPFLAGS_VECTORCALL
                        | Py_TPFLAGS_HAVE_GC,
     "This is an internal subtype of _CDataBase for performance only on "
     "CPython.  Check with isinstance(x, ffi.CData).",   /* tp_doc */
@@ -3571,7 +4410,7 @@ static PyTypeObject CDataGCP_Type = {
     sizeof(CDataObject_gcp),
     0,
     (destructor)cdatagcp_dealloc,               /* tp_dealloc */
-    0,                                          /* tp_print */
+    CDATA_VECTORCALL_OFFSET,                    /* tp_vectorcall_offset */
     0,                                          /* tp_getattr */
     0,                                          /* tp_setattr */
     0,                                          /* tp_compare */
@@ -3586,6 +4425,7 @@ static PyTypeObject CDataGCP_Type = {
     0,  /* inherited */                         /* tp_setattro */
     0,                                          /* tp_as_buffer */
     Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES  /* tp_flags */
+                       | CDATA_TPFLAGS_VECTORCALL
 #ifdef Py_TPFLAGS_HAVE_FINALIZE
                        | Py_TPFLAGS_HAVE_FINALIZE
 #endif
@@ -3623,6 +4463,94 @@ static PyTypeObject CDataGCP_Type = {
 #endif
 };
 
+static PyTypeObject CDataCFree_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_backend.__CDataCFree",
+    sizeof(CDataObject_cfree),
+    0,
+    (destructor)cdatacfree_dealloc,             /* tp_dealloc */
+    CDATA_VECTORCALL_OFFSET,                    /* tp_vectorcall_offset */
+    0,                                          /* tp_getattr */
+    0,                                          /* tp_setattr */
+    0,                                          /* tp_compare */
+    0,  /* inherited */                         /* tp_repr */
+    0,  /* inherited */                         /* tp_as_number */
+    0,                                          /* tp_as_sequence */
+    0,  /* inherited */                         /* tp_as_mapping */
+    0,  /* inherited */                         /* tp_hash */
+    0,  /* inherited */                         /* tp_call */
+    0,                                          /* tp_str */
+    0,  /* inherited */                         /* tp_getattro */
+    0,  /* inherited */                         /* tp_setattro */
+    0,                                          /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES  /* tp_flags */
+                       | CDATA_TPFLAGS_VECTORCALL,
+    "This is an internal subtype of _CDataBase for performance only on "
+    "CPython.  Check with isinstance(x, ffi.CData).",   /* tp_doc */
+    0,                                          /* tp_traverse */
+    0,                                          /* tp_clear */
+    0,  /* inherited */                         /* tp_richcompare */
+    0,  /* inherited */                         /* tp_weaklistoffset */
+    0,  /* inherited */                         /* tp_iter */
+    0,                                          /* tp_iternext */
+    0,  /* inherited */                         /* tp_methods */
+    0,                                          /* tp_members */
+    0,                                          /* tp_getset */
+    &CData_Type,                                /* tp_base */
+    0,                                          /* tp_dict */
+    0,                                          /* tp_descr_get */
+    0,                                          /* tp_descr_set */
+    0,                                          /* tp_dictoffset */
+    0,                                          /* tp_init */
+    0,                                          /* tp_alloc */
+    0,                                          /* tp_new */
+    PyObject_Del,                               /* tp_free */
+};
+
+static PyTypeObject CDataKeepGIL_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_backend.__CDataKeepGIL",
+    sizeof(CDataObject),
+    0,
+    (destructor)cdata_dealloc,                  /* tp_dealloc */
+    CDATA_VECTORCALL_OFFSET,                    /* tp_vectorcall_offset */
+    0,                                          /* tp_getattr */
+    0,                                          /* tp_setattr */
+    0,                                          /* tp_compare */
+    0,  /* inherited */                         /* tp_repr */
+    0,  /* inherited */                         /* tp_as_number */
+    0,                                          /* tp_as_sequence */
+    0,  /* inherited */                         /* tp_as_mapping */
+    0,  /* inherited */                         /* tp_hash */
+    0,  /* inherited */                         /* tp_call */
+    0,                                          /* tp_str */
+    0,  /* inherited */                         /* tp_getattro */
+    0,  /* inherited */                         /* tp_setattro */
+    0,                                          /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES  /* tp_flags */
+                       | CDATA_TPFLAGS_VECTORCALL,
+    "This is an internal subtype of _CDataBase for performance only on "
+    "CPython.  Check with isinstance(x, ffi.CData).",   /* tp_doc */
+    0,                                          /* tp_traverse */
+    0,                                          /* tp_clear */
+    0,  /* inherited */                         /* tp_richcompare */
+    0,  /* inherited */                         /* tp_weaklistoffset */
+    0,  /* inherited */                         /* tp_iter */
+    0,                                          /* tp_iternext */
+    0,  /* inherited */                         /* tp_methods */
+    0,                                          /* tp_members */
+    0,                                          /* tp_getset */
+    &CData_Type,                                /* tp_base */
+    0,                                          /* tp_dict */
+    0,                                          /* tp_descr_get */
+    0,                                          /* tp_descr_set */
+    0,                                          /* tp_dictoffset */
+    0,                                          /* tp_init */
+    0,                                          /* tp_alloc */
+    0,                                          /* tp_new */
+    PyObject_Del,                               /* tp_free */
+};
+
 /************************************************************/
 
 typedef struct {
@@ -3711,18 +4639,16 @@ static CDataObject *allocate_owning_object(Py_ssize_t size,
                                            int dont_clear)
 {
     /* note: objects with &CDataOwning_Type are always allocated with
-       either a plain malloc() or calloc(), and freed with free(). */
-    CDataObject *cd;
-    if (dont_clear)
-        cd = malloc(size);
-    else
-        cd = calloc(size, 1);
+       either a plain malloc() or calloc(), possibly reused from the
+       pool of small blocks, and freed with free(). */
+    CDataObject *cd = new_pool_malloc(size, dont_clear);
     if (PyObject_Init((PyObject *)cd, &CDataOwning_Type) == NULL)
         return NULL;
 
     Py_INCREF(ct);
     cd->c_type = ct;
     cd->c_weakreflist = NULL;
+    cdata_init_vectorcall(cd);
     return cd;
 }
 
@@ -3767,6 +4693,7 @@ static CDataObject *allocate_gcp_object(CDataObject *origobj,
     cd->head.c_data = origobj->c_data;
     cd->head.c_type = ct;
     cd->head.c_weakreflist = NULL;
+    cdata_init_vectorcall(cd);
     cd->origobj = (PyObject *)origobj;
     cd->destructor = destructor;
 
@@ -3774,6 +4701,57 @@ static CDataObject *allocate_gcp_object(CDataObject *origobj,
     return (CDataObject *)cd;
 }
 
+static void *_allocator_c_function(PyObject *x, int is_free)
+{
+    /* If 'x' is a cdata C function of type 'void *(size_t)' (or, if
+       'is_free', of type 'void(void *)'), return the C function.
+       Otherwise, return NULL.  Only plain function pointers qualify, not
+       the results of ffi.callback(): their code lives only as long as
+       the cdata object, which the CDataObject_cfree doesn't keep alive
+       (and, not being GC objects, they cannot hold on to it safely). */
+    CTypeDescrObject *ct, *ctres, *ctarg;
+
+    if (Py_TYPE(x) != &CData_Type)
+        return NULL;
+    ct = ((CDataObject *)x)->c_type;
+    if (!(ct->ct_flags & CT_FUNCTIONPTR) || ct->ct_extra == NULL ||
+            PyTuple_GET_SIZE(ct->ct_stuff) != 3 ||
+            PyInt_AsLong(PyTuple_GET_ITEM(ct->ct_stuff, 0)) != FFI_DEFAULT_ABI)
+        return NULL;
+    ctres = (CTypeDescrObject *)PyTuple_GET_ITEM(ct->ct_stuff, 1);
+    ctarg = (CTypeDescrObject *)PyTuple_GET_ITEM(ct->ct_stuff, 2);
+    if (is_free) {
+        if (!(ctres->ct_flags & CT_VOID) || !(ctarg->ct_flags & CT_POINTER))
+            return NULL;
+    }
+    else {
+        if (!(ctres->ct_flags & CT_POINTER) ||
+            !(ctarg->ct_flags & (CT_PRIMITIVE_SIGNED|CT_PRIMITIVE_UNSIGNED))
+            || (ctarg->ct_flags & CT_IS_BOOL) ||
+            ctarg->ct_size != sizeof(size_t))
+            return NULL;
+    }
+    return ((CDataObject *)x)->c_data;
+}
+
+static void allocator_find_c_functions(cffi_allocator_t *allocator)
+{
+    /* fill 'ca_c_alloc' and 'ca_c_free' if we can bypass the calls to
+       the cdata objects 'ca_alloc' and 'ca_free' */
+    void *c_alloc = NULL, *c_free = NULL;
+
+    if (allocator->ca_alloc != NULL) {
+        c_alloc = _allocator_c_function(allocator->ca_alloc, 0);
+        if (allocator->ca_free != NULL) {
+            c_free = _allocator_c_function(allocator->ca_free, 1);
+            if (c_free == NULL)
+                c_alloc = NULL;
+        }
+    }
+    allocator->ca_c_alloc = (void *(*)(size_t))c_alloc;
+    allocator->ca_c_free = c_alloc ? (void(*)(void *))c_free : NULL;
+}
+
 static CDataObject *allocate_with_allocator(Py_ssize_t basesize,
                                             Py_ssize_t datasize,
                                             CTypeDescrObject *ct,
@@ -3781,7 +4759,32 @@ static CDataObject *allocate_with_allocator(Py_ssize_t basesize,
 {
     CDataObject *cd;
 
-    if (allocator->ca_alloc == NULL) {
+    if (allocator->ca_c_alloc != NULL) {
+        /* C functions: no Python call, and a single non-GC object that
+           calls 'ca_c_free' when it dies */
+        CDataObject_cfree *cdf;
+        char *data = allocator->ca_c_alloc((size_t)datasize);
+        if (data == NULL) {
+            PyErr_SetString(PyExc_MemoryError, "alloc() returned NULL");
+            return NULL;
+        }
+        cdf = PyObject_New(CDataObject_cfree, &CDataCFree_Type);
+        if (cdf == NULL) {
+            if (allocator->ca_c_free != NULL)
+                allocator->ca_c_free(data);
+            return NULL;
+        }
+        Py_INCREF(ct);
+        cdf->head.c_data = data;
+        cdf->head.c_type = ct;
+        cdf->head.c_weakreflist = NULL;
+        cdata_init_vectorcall(cdf);
+        cdf->free_fn = allocator->ca_c_free;
+        if (!allocator->ca_dont_clear)
+            memset(data, 0, datasize);
+        cd = (CDataObject *)cdf;
+    }
+    else if (allocator->ca_alloc == NULL) {
         cd = allocate_owning_object(basesize + datasize, ct,
                                     allocator->ca_dont_clear);
         if (cd == NULL)
@@ -3822,12 +4825,17 @@ static CDataObject *allocate_with_allocator(Py_ssize_t basesize,
     return cd;
 }
 
-static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
-                             const cffi_allocator_t *allocator)
+static int newp_compute_size(CTypeDescrObject *ct, PyObject **pinit,
+                             Py_ssize_t *pdataoffset, Py_ssize_t *pdatasize,
+                             Py_ssize_t *pexplicitlength)
 {
+    /* Compute the size of the data for ffi.new(ct, *pinit), and the
+       offset of this data in an owning object.  If 'ct' is an array of
+       unspecified length, '*pexplicitlength' is set to its length (and
+       '*pinit' may be changed); otherwise it is set to -1. */
     CTypeDescrObject *ctitem;
-    CDataObject *cd;
     Py_ssize_t dataoffset, datasize, explicitlength;
+    PyObject *init = *pinit;
 
     explicitlength = -1;
     if (ct->ct_flags & CT_POINTER) {
@@ -3838,14 +4846,14 @@ static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
             PyErr_Format(PyExc_TypeError,
                          "cannot instantiate ctype '%s' of unknown size",
                          ctitem->ct_name);
-            return NULL;
+            return -1;
         }
         if (ctitem->ct_flags & CT_PRIMITIVE_CHAR)
             datasize *= 2;   /* forcefully add another character: a null */
 
         if (ctitem->ct_flags & (CT_STRUCT | CT_UNION)) {
             if (force_lazy_struct(ctitem) < 0)   /* for CT_WITH_VAR_ARRAY */
-                return NULL;
+                return -1;
 
             if (ctitem->ct_flags & CT_WITH_VAR_ARRAY) {
                 assert(ct->ct_flags & CT_IS_PTR_TO_OWNED);
@@ -3855,7 +4863,7 @@ static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
                     Py_ssize_t optvarsize = datasize;
                     if (convert_struct_from_object(NULL, ctitem, init,
                                                    &optvarsize) < 0)
-                        return NULL;
+                        return -1;
                     datasize = optvarsize;
                 }
             }
@@ -3867,7 +4875,7 @@ static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
         if (datasize < 0) {
             explicitlength = get_new_array_length(ct->ct_itemdescr, &init);
             if (explicitlength < 0)
-                return NULL;
+                return -1;
             ctitem = ct->ct_itemdescr;
             dataoffset = offsetof(CDataObject_own_length, alignment);
             datasize = MUL_WRAPAROUND(explicitlength, ctitem->ct_size);
@@ -3875,7 +4883,7 @@ static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
                     (datasize / explicitlength) != ctitem->ct_size) {
                 PyErr_SetString(PyExc_OverflowError,
                                 "array size would overflow a Py_ssize_t");
-                return NULL;
+                return -1;
             }
         }
     }
@@ -3883,9 +4891,25 @@ static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
         PyErr_Format(PyExc_TypeError,
                      "expected a pointer or array ctype, got '%s'",
                      ct->ct_name);
-        return NULL;
+        return -1;
     }
-
+    *pinit = init;
+    *pdataoffset = dataoffset;
+    *pdatasize = datasize;
+    *pexplicitlength = explicitlength;
+    return 0;
+}
+
+static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
+                             const cffi_allocator_t *allocator)
+{
+    CDataObject *cd;
+    Py_ssize_t dataoffset, datasize, explicitlength;
+
+    if (newp_compute_size(ct, &init, &dataoffset, &datasize,
+                          &explicitlength) < 0)
+        return NULL;
+
     if (ct->ct_flags & CT_IS_PTR_TO_OWNED) {
         /* common case of ptr-to-struct (or ptr-to-union): for this case
            we build two objects instead of one, with the memory-owning
@@ -4011,6 +5035,7 @@ static CDataObject *_new_casted_primitive(CTypeDescrObject *ct)
     cd->c_type = ct;
     cd->c_data = ((char*)cd) + dataoffset;
     cd->c_weakreflist = NULL;
+    cdata_init_vectorcall(cd);
     return cd;
 }
 
@@ -4300,9 +5325,10 @@ static PyObject *dl_load_function(DynLibObject *dlobj, PyObject *args)
     CTypeDescrObject *ct;
     char *funcname;
     void *funcptr;
+    int release_gil = 1;
 
-    if (!PyArg_ParseTuple(args, "O!s:load_function",
-                          &CTypeDescr_Type, &ct, &funcname))
+    if (!PyArg_ParseTuple(args, "O!s|i:load_function",
+                          &CTypeDescr_Type, &ct, &funcname, &release_gil))
         return NULL;
 
     if (dl_check_closed(dlobj) < 0)
@@ -4327,6 +5353,18 @@ static PyObject *dl_load_function(DynLibObject *dlobj, PyObject *args)
     if ((ct->ct_flags & CT_ARRAY) && ct->ct_length < 0) {
         ct = (CTypeDescrObject *)ct->ct_stuff;
     }
+    if (!release_gil && (ct->ct_flags & CT_FUNCTIONPTR)) {
+        /* same ctype, but calls to this cdata don't release the GIL */
+        CDataObject *cd = PyObject_New(CDataObject, &CDataKeepGIL_Type);
+        if (cd == NULL)
+            return NULL;
+        Py_INCREF(ct);
+        cd->c_data = funcptr;
+        cd->c_type = ct;
+        cd->c_weakreflist = NULL;
+        cdata_init_vectorcall(cd);
+        return (PyObject *)cd;
+    }
     return new_simple_cdata(funcptr, ct);
 }
 
@@ -5470,6 +6508,7 @@ static PyObject *b_complete_struct_or_union(PyObject *self, PyObject *args)
 
     ct->ct_size = totalsize;
     ct->ct_length = totalalignment;
+    field_cache_free(ct);
     ct->ct_stuff = interned_fields;
     ct->ct_flags &= ~CT_IS_OPAQUE;
 
@@ -5665,6 +6704,176 @@ static ffi_type *fb_fill_type(struct funcbuilder_s *fb, CTypeDescrObject *ct,
     }
 }
 
+/* Specialized argument converters used by the call plan of function
+   types.  They handle the common case of an exact Python int or float
+   directly, and fall back to convert_from_object() for everything else
+   (including all error cases, to get the usual error messages). */
+
+#define _CALLARG_INT_FN(NAME, TYPE, MINVALUE)                           \
+static int NAME(char *data, CTypeDescrObject *ct, PyObject *obj)        \
+{                                                                       \
+    if (PyLong_CheckExact(obj)) {                                       \
+        int overflow;                                                   \
+        PY_LONG_LONG value = PyLong_AsLongLongAndOverflow(obj, &overflow);\
+        if (!overflow && value >= (MINVALUE) &&                         \
+                value == (PY_LONG_LONG)(TYPE)value) {                   \
+            *(TYPE *)data = (TYPE)value;                                \
+            return 0;                                                   \
+        }                                                               \
+    }                                                                   \
+    return convert_from_object(data, ct, obj);                          \
+}
+_CALLARG_INT_FN(_callarg_int8, int8_t, INT8_MIN)
+_CALLARG_INT_FN(_callarg_int16, int16_t, INT16_MIN)
+_CALLARG_INT_FN(_callarg_int32, int32_t, INT32_MIN)
+_CALLARG_INT_FN(_callarg_int64, int64_t, INT64_MIN)
+_CALLARG_INT_FN(_callarg_uint8, uint8_t, 0)
+_CALLARG_INT_FN(_callarg_uint16, uint16_t, 0)
+_CALLARG_INT_FN(_callarg_uint32, uint32_t, 0)
+_CALLARG_INT_FN(_callarg_uint64, uint64_t, 0)
+#undef _CALLARG_INT_FN
+
+static int _callarg_float(char *data, CTypeDescrObject *ct, PyObject *obj)
+{
+    if (PyFloat_CheckExact(obj)) {
+        *(float *)data = (float)PyFloat_AS_DOUBLE(obj);
+        return 0;
+    }
+    return convert_from_object(data, ct, obj);
+}
+
+static int _callarg_double(char *data, CTypeDescrObject *ct, PyObject *obj)
+{
+    if (PyFloat_CheckExact(obj)) {
+        *(double *)data = PyFloat_AS_DOUBLE(obj);
+        return 0;
+    }
+    return convert_from_object(data, ct, obj);
+}
+
+static cffi_argconv_fn fb_select_converter(CTypeDescrObject *ct)
+{
+    if (ct->ct_flags & CT_POINTER)
+        return NULL;     /* special-cased in cdata_call() */
+
+    if ((ct->ct_flags & CT_PRIMITIVE_SIGNED) && !(ct->ct_flags & CT_IS_BOOL)) {
+        switch (ct->ct_size) {
+        case 1: return _callarg_int8;
+        case 2: return _callarg_int16;
+        case 4: return _callarg_int32;
+        case 8: return _callarg_int64;
+        }
+    }
+    else if ((ct->ct_flags & CT_PRIMITIVE_UNSIGNED) &&
+             !(ct->ct_flags & CT_IS_BOOL)) {
+        switch (ct->ct_size) {
+        case 1: return _callarg_uint8;
+        case 2: return _callarg_uint16;
+        case 4: return _callarg_uint32;
+        case 8: return _callarg_uint64;
+        }
+    }
+    else if ((ct->ct_flags & CT_PRIMITIVE_FLOAT) &&
+             !(ct->ct_flags & CT_IS_LONGDOUBLE)) {
+        if (ct->ct_size == sizeof(float))
+            return _callarg_float;
+        if (ct->ct_size == sizeof(double))
+            return _callarg_double;
+    }
+    return convert_from_object;
+}
+
+/* Specialized argument decoders used by the callback plan of function
+   types: the reverse of the converters above, for the arguments that a
+   callback receives from C.  They produce the same objects as
+   convert_to_object(), which is used for all the other types. */
+
+#define _CBARG_INT_FN(NAME, TYPE)                                       \
+static PyObject *NAME(char *data, CTypeDescrObject *ct)                 \
+{                                                                       \
+    return PyInt_FromLong((long)*(TYPE *)data);                         \
+}
+_CBARG_INT_FN(_cbarg_int8, int8_t)
+_CBARG_INT_FN(_cbarg_int16, int16_t)
+_CBARG_INT_FN(_cbarg_int32, int32_t)
+_CBARG_INT_FN(_cbarg_uint8, uint8_t)
+_CBARG_INT_FN(_cbarg_uint16, uint16_t)
+#undef _CBARG_INT_FN
+
+static PyObject *_cbarg_int64(char *data, CTypeDescrObject *ct)
+{
+    int64_t value = *(int64_t *)data;
+    if (ct->ct_flags & CT_PRIMITIVE_FITS_LONG)
+        return PyInt_FromLong((long)value);
+    else
+        return PyLong_FromLongLong(value);
+}
+
+static PyObject *_cbarg_uint32(char *data, CTypeDescrObject *ct)
+{
+    uint32_t value = *(uint32_t *)data;
+    if (ct->ct_flags & CT_PRIMITIVE_FITS_LONG)
+        return PyInt_FromLong((long)value);
+    else
+        return PyLong_FromUnsignedLongLong(value);
+}
+
+static PyObject *_cbarg_uint64(char *data, CTypeDescrObject *ct)
+{
+    uint64_t value = *(uint64_t *)data;
+    if (ct->ct_flags & CT_PRIMITIVE_FITS_LONG)
+        return PyInt_FromLong((long)value);
+    else
+        return PyLong_FromUnsignedLongLong(value);
+}
+
+static PyObject *_cbarg_float(char *data, CTypeDescrObject *ct)
+{
+    return PyFloat_FromDouble(*(float *)data);
+}
+
+static PyObject *_cbarg_double(char *data, CTypeDescrObject *ct)
+{
+    return PyFloat_FromDouble(*(double *)data);
+}
+
+static PyObject *_cbarg_pointer(char *data, CTypeDescrObject *ct)
+{
+    return new_simple_cdata(*(char **)data, ct);
+}
+
+static cffi_argdecode_fn fb_select_decoder(CTypeDescrObject *ct)
+{
+    if (ct->ct_flags & (CT_POINTER|CT_FUNCTIONPTR))
+        return _cbarg_pointer;
+
+    if ((ct->ct_flags & CT_PRIMITIVE_SIGNED) && !(ct->ct_flags & CT_IS_BOOL)) {
+        switch (ct->ct_size) {
+        case 1: return _cbarg_int8;
+        case 2: return _cbarg_int16;
+        case 4: return _cbarg_int32;
+        case 8: return _cbarg_int64;
+        }
+    }
+    else if ((ct->ct_flags & CT_PRIMITIVE_UNSIGNED) &&
+             !(ct->ct_flags & CT_IS_BOOL)) {
+        switch (ct->ct_size) {
+        case 1: return _cbarg_uint8;
+        case 2: return _cbarg_uint16;
+        case 4: return _cbarg_uint32;
+        case 8: return _cbarg_uint64;
+        }
+    }
+    else if ((ct->ct_flags & CT_PRIMITIVE_FLOAT) &&
+             !(ct->ct_flags & (CT_IS_LONGDOUBLE | CT_PRIMITIVE_COMPLEX))) {
+        if (ct->ct_size == sizeof(float))
+            return _cbarg_float;
+        if (ct->ct_size == sizeof(double))
+            return _cbarg_double;
+    }
+    return convert_to_object;
+}
+
 #define ALIGN_ARG(n)  ((n) + 7) & ~7
 
 static int fb_build(struct funcbuilder_s *fb, PyObject *fargs,
@@ -5673,6 +6882,8 @@ static int fb_build(struct funcbuilder_s *fb, PyObject *fargs,
     Py_ssize_t i, nargs = PyTuple_GET_SIZE(fargs);
     Py_ssize_t exchange_offset;
     cif_description_t *cif_descr;
+    cffi_argconv_fn *call_plan;
+    cffi_argdecode_fn *callback_plan;
 
     /* ffi buffer: start with a cif_description */
     cif_descr = fb_alloc(fb, sizeof(cif_description_t) +
@@ -5682,6 +6893,12 @@ static int fb_build(struct funcbuilder_s *fb, PyObject *fargs,
     fb->atypes = fb_alloc(fb, nargs * sizeof(ffi_type*));
     fb->nargs = nargs;
 
+    /* ffi buffer: next comes the call plan, one converter per argument */
+    call_plan = fb_alloc(fb, nargs * sizeof(cffi_argconv_fn));
+
+    /* ffi buffer: next comes the callback plan, one decoder per argument */
+    callback_plan = fb_alloc(fb, nargs * sizeof(cffi_argdecode_fn));
+
     /* ffi buffer: next comes the result type */
     fb->rtype = fb_fill_type(fb, fresult, 1);
     if (PyErr_Occurred())
@@ -5692,6 +6909,10 @@ static int fb_build(struct funcbuilder_s *fb, PyObject *fargs,
         exchange_offset = nargs * sizeof(void*);
         exchange_offset = ALIGN_ARG(exchange_offset);
         cif_descr->exchange_offset_arg[0] = exchange_offset;
+        cif_descr->exchange_cache = NULL;
+        cif_descr->call_plan = call_plan;
+        cif_descr->callback_plan = callback_plan;
+        cif_descr->callback_rawerr = NULL;
         /* then enough room for the result --- which means at least
            sizeof(ffi_arg), according to the ffi docs */
         i = fb->rtype->size;
@@ -5724,6 +6945,8 @@ static int fb_build(struct funcbuilder_s *fb, PyObject *fargs,
             exchange_offset = ALIGN_ARG(exchange_offset);
             cif_descr->exchange_offset_arg[1 + i] = exchange_offset;
             exchange_offset += atype->size;
+            call_plan[i] = fb_select_converter(farg);
+            callback_plan[i] = fb_select_decoder(farg);
         }
     }
 
@@ -6135,6 +7358,33 @@ static void _my_PyErr_WriteUnraisable(PyObject *t, PyObject *v, PyObject *tb,
 #endif
 }
 
+/* callbacks with up to this number of arguments are invoked with
+   vectorcall, from an array of arguments on the stack */
+#define CALLBACK_STACK_ARGS   8
+
+static PyObject *_callback_decode_arg(int decode_args_from_libffi,
+                                      char *args, Py_ssize_t i,
+                                      CTypeDescrObject *a_ct,
+                                      cif_description_t *cif_descr)
+{
+    char *a_src;
+
+    if (decode_args_from_libffi) {
+        a_src = ((void **)args)[i];
+    }
+    else {
+        a_src = args + i * 8;
+        if (a_ct->ct_flags & (CT_IS_LONGDOUBLE | CT_STRUCT | CT_UNION))
+            a_src = *(char **)a_src;
+    }
+    /* 'cif_descr' is NULL for extern "Python" functions whose type is
+       not supported by libffi; then use the generic decoder */
+    if (cif_descr != NULL)
+        return cif_descr->callback_plan[i](a_src, a_ct);
+    else
+        return convert_to_object(a_src, a_ct);
+}
+
 static void general_invoke_callback(int decode_args_from_libffi,
                                     void *result, char *args, void *userdata)
 {
@@ -6146,6 +7396,7 @@ static void general_invoke_callback(int decode_args_from_libffi,
     PyObject *py_res = NULL;
     PyObject *py_rawerr;
     PyObject *onerror_cb;
+    cif_description_t *cif_descr = (cif_description_t *)ct->ct_extra;
     Py_ssize_t i, n;
     char *extra_error_line = NULL;
 
@@ -6154,30 +7405,42 @@ static void general_invoke_callback(int decode_args_from_libffi,
     Py_INCREF(cb_args);
 
     n = PyTuple_GET_SIZE(signature) - 2;
-    py_args = PyTuple_New(n);
-    if (py_args == NULL)
-        goto error;
+#ifdef CFFI_USE_VECTORCALL
+    if (n <= CALLBACK_STACK_ARGS) {
+        /* one extra slot in front, for PY_VECTORCALL_ARGUMENTS_OFFSET */
+        PyObject *stack[1 + CALLBACK_STACK_ARGS] = { NULL };
 
-    for (i=0; i<n; i++) {
-        char *a_src;
-        PyObject *a;
-        CTypeDescrObject *a_ct = SIGNATURE(2 + i);
-
-        if (decode_args_from_libffi) {
-            a_src = ((void **)args)[i];
-        }
-        else {
-            a_src = args + i * 8;
-            if (a_ct->ct_flags & (CT_IS_LONGDOUBLE | CT_STRUCT | CT_UNION))
-                a_src = *(char **)a_src;
+        for (i=0; i<n; i++) {
+            PyObject *a = _callback_decode_arg(decode_args_from_libffi, args,
+                                               i, SIGNATURE(2 + i), cif_descr);
+            if (a == NULL) {
+                while (i > 0)
+                    Py_DECREF(stack[i--]);
+                goto error;
+            }
+            stack[1 + i] = a;
         }
-        a = convert_to_object(a_src, a_ct);
-        if (a == NULL)
-            goto error;
-        PyTuple_SET_ITEM(py_args, i, a);
+        py_res = PyObject_Vectorcall(py_ob, stack + 1,
+                                     n | PY_VECTORCALL_ARGUMENTS_OFFSET, NULL);
+        for (i=0; i<n; i++)
+            Py_DECREF(stack[1 + i]);
     }
+    else
+#endif
+    {
+        py_args = PyTuple_New(n);
+        if (py_args == NULL)
+            goto error;
 
-    py_res = PyObject_Call(py_ob, py_args, NULL);
+        for (i=0; i<n; i++) {
+            PyObject *a = _callback_decode_arg(decode_args_from_libffi, args,
+                                               i, SIGNATURE(2 + i), cif_descr);
+            if (a == NULL)
+                goto error;
+            PyTuple_SET_ITEM(py_args, i, a);
+        }
+        py_res = PyObject_Call(py_ob, py_args, NULL);
+    }
     if (py_res == NULL)
         goto error;
     if (convert_from_object_fficallback(result, SIGNATURE(1), py_res,
@@ -6276,6 +7539,7 @@ static PyObject *prepare_callback_info_tuple(CTypeDescrObject *ct,
 {
     CTypeDescrObject *ctresult;
     PyObject *py_rawerr, *infotuple;
+    cif_description_t *cif_descr;
     Py_ssize_t size;
 
     if (!(ct->ct_flags & CT_FUNCTIONPTR)) {
@@ -6296,24 +7560,52 @@ static PyObject *prepare_callback_info_tuple(CTypeDescrObject *ct,
         return NULL;
     }
 
-    ctresult = (CTypeDescrObject *)PyTuple_GET_ITEM(ct->ct_stuff, 1);
-    size = ctresult->ct_size;
-    if (size < (Py_ssize_t)sizeof(ffi_arg))
-        size = sizeof(ffi_arg);
-    py_rawerr = PyBytes_FromStringAndSize(NULL, size);
-    if (py_rawerr == NULL)
-        return NULL;
-    memset(PyBytes_AS_STRING(py_rawerr), 0, size);
-    if (error_ob != Py_None) {
-        if (convert_from_object_fficallback(
-                PyBytes_AS_STRING(py_rawerr), ctresult, error_ob,
-                decode_args_from_libffi) < 0) {
-            Py_DECREF(py_rawerr);
+    /* The common case is a callback without an explicit 'error' value.
+       Then the raw error value is all zeroes and only depends on the
+       function type, so we build it once and store it in the
+       cif_description_t: creating more callbacks of the same type only
+       needs to build the info tuple. */
+    cif_descr = (cif_description_t *)ct->ct_extra;
+    if (error_ob == Py_None && cif_descr != NULL &&
+            cif_descr->callback_rawerr != NULL) {
+        py_rawerr = cif_descr->callback_rawerr;
+        Py_INCREF(py_rawerr);
+    }
+    else {
+        ctresult = (CTypeDescrObject *)PyTuple_GET_ITEM(ct->ct_stuff, 1);
+        size = ctresult->ct_size;
+        if (size < (Py_ssize_t)sizeof(ffi_arg))
+            size = sizeof(ffi_arg);
+        py_rawerr = PyBytes_FromStringAndSize(NULL, size);
+        if (py_rawerr == NULL)
             return NULL;
+        memset(PyBytes_AS_STRING(py_rawerr), 0, size);
+        if (error_ob != Py_None) {
+            if (convert_from_object_fficallback(
+                    PyBytes_AS_STRING(py_rawerr), ctresult, error_ob,
+                    decode_args_from_libffi) < 0) {
+                Py_DECREF(py_rawerr);
+                return NULL;
+            }
         }
+        else if (cif_descr != NULL) {
+            Py_INCREF(py_rawerr);
+            cif_descr->callback_rawerr = py_rawerr;
+        }
+    }
+
+    infotuple = PyTuple_New(4);
+    if (infotuple == NULL) {
+        Py_DECREF(py_rawerr);
+        return NULL;
     }
-    infotuple = Py_BuildValue("OOOO", ct, ob, py_rawerr, onerror_ob);
-    Py_DECREF(py_rawerr);
+    Py_INCREF(ct);
+    PyTuple_SET_ITEM(infotuple, 0, (PyObject *)ct);
+    Py_INCREF(ob);
+    PyTuple_SET_ITEM(infotuple, 1, ob);
+    PyTuple_SET_ITEM(infotuple, 2, py_rawerr);    /* steals the ref */
+    Py_INCREF(onerror_ob);
+    PyTuple_SET_ITEM(infotuple, 3, onerror_ob);
 
 #if defined(WITH_THREAD) && PY_VERSION_HEX < 0x03070000
     /* We must setup the GIL here, in case the callback is invoked in
@@ -6337,25 +7629,20 @@ static PyObject *prepare_callback_info_tuple(CTypeDescrObject *ct,
 #  pragma GCC diagnostic push
 #  pragma GCC diagnostic ignored "-Wdeprecated-declarations"
 #endif
-static PyObject *b_callback(PyObject *self, PyObject *args)
-{
-    CTypeDescrObject *ct;
+static PyObject *new_closure_cdata(CTypeDescrObject *ct,
+                                   void (*fun)(ffi_cif *, void *,
+                                               void **, void *),
+                                   PyObject *infotuple)
+{
+    /* Build a <cdata> whose C function pointer is a libffi closure
+       calling 'fun' with 'infotuple' as its last argument.  Steals
+       the reference to 'infotuple', which is then owned by the cdata. */
     CDataObject_closure *cd;
-    PyObject *ob, *error_ob = Py_None, *onerror_ob = Py_None;
-    PyObject *infotuple;
     cif_description_t *cif_descr;
     ffi_closure *closure;
     ffi_status status;
     void *closure_exec;
 
-    if (!PyArg_ParseTuple(args, "O!O|OO:callback", &CTypeDescr_Type, &ct, &ob,
-                          &error_ob, &onerror_ob))
-        return NULL;
-
-    infotuple = prepare_callback_info_tuple(ct, ob, error_ob, onerror_ob, 1);
-    if (infotuple == NULL)
-        return NULL;
-
 #if CFFI_CHECK_FFI_CLOSURE_ALLOC_MAYBE
     if (CFFI_CHECK_FFI_CLOSURE_ALLOC) {
         closure = ffi_closure_alloc(sizeof(ffi_closure), &closure_exec);
@@ -6382,6 +7669,7 @@ static PyObject *b_callback(PyObject *self, PyObject *args)
     cd->head.c_type = ct;
     cd->head.c_data = (char *)closure_exec;
     cd->head.c_weakreflist = NULL;
+    cdata_init_vectorcall(cd);
     closure->user_data = NULL;
     cd->closure = closure;
 
@@ -6396,7 +7684,7 @@ static PyObject *b_callback(PyObject *self, PyObject *args)
 #if CFFI_CHECK_FFI_PREP_CLOSURE_LOC_MAYBE
     if (CFFI_CHECK_FFI_PREP_CLOSURE_LOC) {
         status = ffi_prep_closure_loc(closure, &cif_descr->cif,
-                                      invoke_callback, infotuple, closure_exec);
+                                      fun, infotuple, closure_exec);
     }
     else
 #endif
@@ -6406,7 +7694,7 @@ static PyObject *b_callback(PyObject *self, PyObject *args)
         goto error;
 #else
         status = ffi_prep_closure(closure, &cif_descr->cif,
-                                  invoke_callback, infotuple);
+                                  fun, infotuple);
 #endif
     }
 
@@ -6455,6 +7743,63 @@ static PyObject *b_callback(PyObject *self, PyObject *args)
 #  pragma GCC diagnostic pop
 #endif
 
+static PyObject *new_callback(CTypeDescrObject *ct, PyObject *ob,
+                              PyObject *error_ob, PyObject *onerror_ob)
+{
+    PyObject *infotuple;
+
+    infotuple = prepare_callback_info_tuple(ct, ob, error_ob, onerror_ob, 1);
+    if (infotuple == NULL)
+        return NULL;
+    return new_closure_cdata(ct, invoke_callback, infotuple);
+}
+
+static PyObject *b_callback(PyObject *self, PyObject *args)
+{
+    CTypeDescrObject *ct;
+    PyObject *ob, *error_ob = Py_None, *onerror_ob = Py_None;
+
+    if (!PyArg_ParseTuple(args, "O!O|OO:callback", &CTypeDescr_Type, &ct, &ob,
+                          &error_ob, &onerror_ob))
+        return NULL;
+
+    return new_callback(ct, ob, error_ob, onerror_ob);
+}
+
+static PyObject *b_reserve_callbacks(PyObject *self, PyObject *arg)
+{
+    Py_ssize_t n = PyInt_AsSsize_t(arg);
+    if (n == -1 && PyErr_Occurred())
+        return NULL;
+    if (n < 0) {
+        PyErr_SetString(PyExc_ValueError, "negative number of callbacks");
+        return NULL;
+    }
+#if CFFI_CHECK_FFI_CLOSURE_ALLOC_MAYBE
+    if (CFFI_CHECK_FFI_CLOSURE_ALLOC) {
+        /* libffi's ffi_closure_alloc() manages its own memory */
+    } else
+#endif
+    if (cffi_closure_reserve(n) < 0) {
+        PyErr_SetString(PyExc_MemoryError,
+            "Cannot allocate write+execute memory for ffi.callback()");
+        return NULL;
+    }
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+static PyObject *b_get_callback_pool_info(PyObject *self, PyObject *noarg)
+{
+    return Py_BuildValue("{s:n,s:n,s:n,s:n,s:n,s:n}",
+                         "in_use", closure_in_use,
+                         "peak", closure_peak,
+                         "free", closure_num_free,
+                         "reserved", closure_reserved,
+                         "chunks", closure_num_chunks,
+                         "pages_mapped", closure_pages_mapped);
+}
+
 static PyObject *b_new_enum_type(PyObject *self, PyObject *args)
 {
     char *ename;
@@ -6858,79 +8203,363 @@ static PyObject *b_string(PyObject *self, PyObject *args, PyObject *kwds)
     return NULL;
 }
 
-static PyObject *b_unpack(PyObject *self, PyObject *args, PyObject *kwds)
+struct call_many_column_s {
+    char *data;          /* raw C array, or NULL to convert from 'items' */
+    Py_ssize_t stride;
+    PyObject *tuple;     /* snapshot of the sequence, or NULL */
+    PyObject **items;
+};
+
+static PyObject *b_call_many(PyObject *self, PyObject *args, PyObject *kwds)
 {
     CDataObject *cd;
-    CTypeDescrObject *ctitem;
-    Py_ssize_t i, length, itemsize;
-    PyObject *result;
-    char *src;
-    int casenum;
-    static char *keywords[] = {"cdata", "length", NULL};
+    PyObject *signature, *res = NULL, *out = Py_None;
+    CTypeDescrObject *fresult;
+    cif_description_t *cif_descr;
+    struct call_many_column_s *columns = NULL;
+    char *buffer = NULL, *outdata = NULL, *resultdata;
+    void **buffer_array;
+    Py_ssize_t i, j, nargs, count = -1, outsize = 0;
+    int all_raw = 1;
+    struct freeme_s {
+        struct freeme_s *next;
+        union_alignment alignment;
+    } *freeme = NULL;
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!n:unpack", keywords,
-                                     &CData_Type, &cd, &length))
+    if (PyTuple_GET_SIZE(args) < 1) {
+        PyErr_SetString(PyExc_TypeError,
+                        "call_many() takes at least 1 argument (0 given)");
         return NULL;
-
-    if (!(cd->c_type->ct_flags & (CT_ARRAY|CT_POINTER))) {
+    }
+    if (kwds != NULL) {
+        Py_ssize_t pos = 0;
+        PyObject *key, *value;
+        while (PyDict_Next(kwds, &pos, &key, &value)) {
+            if (!PyText_Check(key) ||
+                    strcmp(PyText_AS_UTF8(key), "out") != 0) {
+                PyErr_SetString(PyExc_TypeError,
+                        "call_many() got an unexpected keyword argument");
+                return NULL;
+            }
+            out = value;
+        }
+    }
+    cd = (CDataObject *)PyTuple_GET_ITEM(args, 0);
+    if (!CData_Check(cd) || !(cd->c_type->ct_flags & CT_FUNCTIONPTR)) {
         PyErr_Format(PyExc_TypeError,
-                     "expected a pointer or array, got '%s'",
+                     "call_many() expects a cdata function pointer, got %.200s",
+                     Py_TYPE(cd)->tp_name);
+        return NULL;
+    }
+    if (cd->c_data == NULL) {
+        PyErr_Format(PyExc_RuntimeError,
+                     "cannot call null pointer pointer from cdata '%s'",
                      cd->c_type->ct_name);
         return NULL;
     }
-    if (length < 0) {
-        PyErr_SetString(PyExc_ValueError, "'length' cannot be negative");
+    signature = cd->c_type->ct_stuff;
+    cif_descr = (cif_description_t *)cd->c_type->ct_extra;
+    if (cif_descr == NULL) {
+        /* either a variadic function, or one whose signature libffi
+           cannot describe: in the latter case, give the same error as
+           a regular call, by trying again to build the cif */
+        PyObject *fargs = PyTuple_GetSlice(signature, 2,
+                                           PyTuple_GET_SIZE(signature));
+        if (fargs == NULL)
+            return NULL;
+        cif_descr = fb_prepare_cif(fargs,
+                        (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 1),
+                        PyTuple_GET_SIZE(fargs),
+                        PyInt_AsLong(PyTuple_GET_ITEM(signature, 0)));
+        Py_DECREF(fargs);
+        if (cif_descr == NULL)
+            return NULL;
+        cif_description_free(cif_descr);
+        PyErr_Format(PyExc_TypeError,
+                     "call_many() cannot call the variadic function '%s'",
+                     cd->c_type->ct_name);
         return NULL;
     }
-    if (cd->c_data == NULL) {
-        PyObject *s = cdata_repr(cd);
-        if (s != NULL) {
-            PyErr_Format(PyExc_RuntimeError,
-                         "cannot use unpack() on %s",
-                         PyText_AS_UTF8(s));
-            Py_DECREF(s);
-        }
+    fresult = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 1);
+    nargs = PyTuple_GET_SIZE(signature) - 2;
+    if (PyTuple_GET_SIZE(args) - 1 != nargs) {
+        PyErr_Format(PyExc_TypeError,
+                     "'%s' expects %zd argument sequences, got %zd",
+                     cd->c_type->ct_name, nargs, PyTuple_GET_SIZE(args) - 1);
         return NULL;
     }
-
-    /* byte- and unicode strings */
-    ctitem = cd->c_type->ct_itemdescr;
-    if (ctitem->ct_flags & CT_PRIMITIVE_CHAR) {
-        switch (ctitem->ct_size) {
-        case sizeof(char):
-            return PyBytes_FromStringAndSize(cd->c_data, length);
-        case 2:
-            return _my_PyUnicode_FromChar16((cffi_char16_t *)cd->c_data,length);
-        case 4:
-            return _my_PyUnicode_FromChar32((cffi_char32_t *)cd->c_data,length);
-        }
+    if (nargs == 0) {
+        PyErr_Format(PyExc_TypeError,
+                     "call_many() needs a function taking at least one "
+                     "argument, got '%s'", cd->c_type->ct_name);
+        return NULL;
     }
 
-    /* else, the result is a list.  This implementation should be
-       equivalent to but much faster than '[p[i] for i in range(length)]'.
-       (Note that on PyPy, 'list(p[0:length])' should be equally fast,
-       but arguably, finding out that there *is* such an unexpected way
-       to write things down is the real problem.)
-    */
-    result = PyList_New(length);
-    if (result == NULL)
-        return NULL;
+    columns = PyMem_Malloc(nargs * sizeof(struct call_many_column_s));
+    if (columns == NULL)
+        return PyErr_NoMemory();
+    memset(columns, 0, nargs * sizeof(struct call_many_column_s));
 
-    src = cd->c_data;
-    itemsize = ctitem->ct_size;
-    if (itemsize < 0) {
-        Py_DECREF(result);
-        PyErr_Format(PyExc_ValueError, "'%s' points to items of unknown size",
-                     cd->c_type->ct_name);
-        return NULL;
+    for (i = 0; i < nargs; i++) {
+        PyObject *seq = PyTuple_GET_ITEM(args, 1 + i);
+        CTypeDescrObject *argtype;
+        Py_ssize_t length;
+
+        argtype = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 2 + i);
+        if (CData_Check(seq) &&
+                (((CDataObject *)seq)->c_type->ct_flags & CT_ARRAY) &&
+                ((CDataObject *)seq)->c_type->ct_itemdescr == argtype) {
+            /* a C array of exactly the argument type: the arguments
+               are passed directly from the array, without conversion */
+            columns[i].data = ((CDataObject *)seq)->c_data;
+            columns[i].stride = argtype->ct_size;
+            length = get_array_length((CDataObject *)seq);
+        }
+        else {
+            /* take a tuple copy of lists: the converters below can run
+               Python code, and the GIL is released around each call,
+               so the list could be resized under our feet */
+            PyObject *fast = PySequence_Fast(seq,
+                        "call_many() expects sequences of arguments");
+            if (fast == NULL)
+                goto error;
+            if (PyList_Check(fast)) {
+                columns[i].tuple = PyList_AsTuple(fast);
+                Py_DECREF(fast);
+                if (columns[i].tuple == NULL)
+                    goto error;
+            }
+            else
+                columns[i].tuple = fast;
+            columns[i].items = &PyTuple_GET_ITEM(columns[i].tuple, 0);
+            length = PyTuple_GET_SIZE(columns[i].tuple);
+            all_raw = 0;
+        }
+        if (count < 0)
+            count = length;
+        else if (length != count) {
+            PyErr_Format(PyExc_ValueError,
+                         "call_many() got argument sequences of different "
+                         "lengths (%zd and %zd)", count, length);
+            goto error;
+        }
     }
 
-    /* Determine some common fast-paths for the loop below.  The case -1
-       is the fall-back, which always gives the right answer. */
+    if (out != Py_None) {
+        CTypeDescrObject *ct;
+        if (fresult->ct_flags & CT_VOID) {
+            PyErr_Format(PyExc_TypeError,
+                         "'out' cannot be given for the function '%s' "
+                         "returning void", cd->c_type->ct_name);
+            goto error;
+        }
+        if (!CData_Check(out) ||
+                !(((CDataObject *)out)->c_type->ct_flags &
+                  (CT_ARRAY | CT_POINTER)) ||
+                ((CDataObject *)out)->c_type->ct_itemdescr != fresult) {
+            PyErr_Format(PyExc_TypeError,
+                         "'out' must be an array or pointer of '%s', got %.200s",
+                         fresult->ct_name,
+                         CData_Check(out) ? ((CDataObject *)out)->c_type->ct_name
+                                          : Py_TYPE(out)->tp_name);
+            goto error;
+        }
+        ct = ((CDataObject *)out)->c_type;
+        if ((ct->ct_flags & CT_ARRAY) &&
+                get_array_length((CDataObject *)out) < count) {
+            PyErr_Format(PyExc_IndexError,
+                         "'out' has room for %zd results, but %zd are needed",
+                         get_array_length((CDataObject *)out), count);
+            goto error;
+        }
+        outdata = ((CDataObject *)out)->c_data;
+        outsize = fresult->ct_size;
+    }
+    else if (!(fresult->ct_flags & CT_VOID)) {
+        res = PyList_New(count);
+        if (res == NULL)
+            goto error;
+    }
 
-#define ALIGNMENT_CHECK(align)                          \
+    buffer = cif_descr->exchange_cache;
+    if (buffer != NULL) {
+        cif_descr->exchange_cache = NULL;
+    }
+    else {
+        buffer = PyObject_Malloc(cif_descr->exchange_size);
+        if (buffer == NULL) {
+            PyErr_NoMemory();
+            goto error;
+        }
+    }
+    buffer_array = (void **)buffer;
+    resultdata = buffer + cif_descr->exchange_offset_arg[0];
+    if (fresult->ct_flags & (CT_PRIMITIVE_CHAR | CT_PRIMITIVE_SIGNED |
+                             CT_PRIMITIVE_UNSIGNED)) {
+#ifdef WORDS_BIGENDIAN
+        /* see cdata_call_impl() */
+        if (fresult->ct_size < sizeof(ffi_arg))
+            resultdata += (sizeof(ffi_arg) - fresult->ct_size);
+#endif
+    }
+
+    if (all_raw && res == NULL) {
+        /* nothing needs the GIL: run the whole loop without it */
+        PyThreadState *ts = NULL;
+        if (Py_TYPE(cd) != &CDataKeepGIL_Type)
+            ts = PyEval_SaveThread();
+        restore_errno();
+        for (j = 0; j < count; j++) {
+            for (i = 0; i < nargs; i++)
+                buffer_array[i] = columns[i].data + j * columns[i].stride;
+            ffi_call(&cif_descr->cif, (void (*)(void))(cd->c_data),
+                     resultdata, buffer_array);
+            if (outdata != NULL)
+                memcpy(outdata + j * outsize, resultdata, outsize);
+        }
+        save_errno();
+        if (ts != NULL)
+            PyEval_RestoreThread(ts);
+        goto done;
+    }
+
+    for (j = 0; j < count; j++) {
+        for (i = 0; i < nargs; i++) {
+            CTypeDescrObject *argtype;
+            cffi_argconv_fn convert;
+            char *data;
+            PyObject *obj;
+
+            if (columns[i].data != NULL) {
+                buffer_array[i] = columns[i].data + j * columns[i].stride;
+                continue;
+            }
+            argtype = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 2 + i);
+            convert = cif_descr->call_plan[i];
+            data = buffer + cif_descr->exchange_offset_arg[1 + i];
+            obj = columns[i].items[j];
+            buffer_array[i] = data;
+
+            if (convert != NULL) {
+                if (convert(data, argtype, obj) < 0)
+                    goto error;
+            }
+            else {
+                /* pointer argument */
+                Py_ssize_t datasize = _prepare_pointer_call_argument(
+                                                argtype, obj, (char **)data);
+                if (datasize == 0)
+                    ;    /* successfully filled '*data' */
+                else if (datasize < 0)
+                    goto error;
+                else {
+                    struct freeme_s *fp = (struct freeme_s *)PyObject_Malloc(
+                        offsetof(struct freeme_s, alignment) +
+                        (size_t)datasize);
+                    if (fp == NULL) {
+                        PyErr_NoMemory();
+                        goto error;
+                    }
+                    fp->next = freeme;
+                    freeme = fp;
+                    memset(&fp->alignment, 0, datasize);
+                    *(char **)data = (char *)&fp->alignment;
+                    if (convert_array_from_object((char *)&fp->alignment,
+                                                  argtype, obj) < 0)
+                        goto error;
+                }
+            }
+        }
+
+        if (Py_TYPE(cd) == &CDataKeepGIL_Type) {
+            restore_errno();
+            ffi_call(&cif_descr->cif, (void (*)(void))(cd->c_data),
+                     resultdata, buffer_array);
+            save_errno();
+        }
+        else {
+            Py_BEGIN_ALLOW_THREADS
+            restore_errno();
+            ffi_call(&cif_descr->cif, (void (*)(void))(cd->c_data),
+                     resultdata, buffer_array);
+            save_errno();
+            Py_END_ALLOW_THREADS
+        }
+
+        while (freeme != NULL) {
+            void *p = (void *)freeme;
+            freeme = freeme->next;
+            PyObject_Free(p);
+        }
+
+        if (outdata != NULL) {
+            memcpy(outdata + j * outsize, resultdata, outsize);
+        }
+        else if (res != NULL) {
+            PyObject *x;
+            if (fresult->ct_flags & CT_STRUCT)
+                x = convert_struct_to_owning_object(resultdata, fresult);
+            else
+                x = convert_to_object(resultdata, fresult);
+            if (x == NULL)
+                goto error;
+            PyList_SET_ITEM(res, j, x);
+        }
+    }
+
+ done:
+    if (res == NULL) {
+        res = out;
+        Py_INCREF(res);
+    }
+    goto cleanup;
+
+ error:
+    Py_CLEAR(res);
+    while (freeme != NULL) {
+        void *p = (void *)freeme;
+        freeme = freeme->next;
+        PyObject_Free(p);
+    }
+ cleanup:
+    if (buffer) {
+        if (cif_descr->exchange_cache == NULL)
+            cif_descr->exchange_cache = buffer;
+        else
+            PyObject_Free(buffer);
+    }
+    for (i = 0; i < nargs; i++)
+        Py_XDECREF(columns[i].tuple);
+    PyMem_Free(columns);
+    return res;
+}
+
+static PyObject *unpack_to_list(char *src, CTypeDescrObject *ctitem,
+                                Py_ssize_t length, Py_ssize_t stride)
+{
+    /* Return a list of the 'length' items of type 'ctitem' found at
+       'src', 'src + stride', 'src + 2 * stride', etc.  This
+       implementation should be equivalent to but much faster than
+       '[p[i] for i in range(length)]'.  (Note that on PyPy,
+       'list(p[0:length])' should be equally fast, but arguably, finding
+       out that there *is* such an unexpected way to write things down
+       is the real problem.)
+    */
+    Py_ssize_t i, itemsize = ctitem->ct_size;
+    PyObject *result;
+    int casenum;
+
+    result = PyList_New(length);
+    if (result == NULL)
+        return NULL;
+
+    /* Determine some common fast-paths for the loop below.  The case -1
+       is the fall-back, which always gives the right answer. */
+
+#define ALIGNMENT_CHECK(align)                          \
         (((align) & ((align) - 1)) == 0 &&              \
-         (((uintptr_t)src) & ((align) - 1)) == 0)
+         (((uintptr_t)src) & ((align) - 1)) == 0 &&     \
+         (((uintptr_t)stride) & ((align) - 1)) == 0)
 
     casenum = -1;
 
@@ -6963,7 +8592,8 @@ static PyObject *b_unpack(PyObject *self, PyObject *args, PyObject *kwds)
             else if (itemsize == sizeof(float))  casenum = 8;
         }
     }
-    else if (ctitem->ct_flags & (CT_POINTER | CT_FUNCTIONPTR)) {
+    else if ((ctitem->ct_flags & (CT_POINTER | CT_FUNCTIONPTR)) &&
+             ALIGNMENT_CHECK(sizeof(char *))) {
         casenum = 10;    /* any pointer */
     }
 #undef ALIGNMENT_CHECK
@@ -6999,8 +8629,632 @@ static PyObject *b_unpack(PyObject *self, PyObject *args, PyObject *kwds)
             return NULL;
         }
         PyList_SET_ITEM(result, i, x);
-        src += itemsize;
+        src += stride;
+    }
+    return result;
+}
+
+static int _check_unpack_source(CDataObject *cd, Py_ssize_t length,
+                                const char *funcname)
+{
+    if (!(cd->c_type->ct_flags & (CT_ARRAY|CT_POINTER))) {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a pointer or array, got '%s'",
+                     cd->c_type->ct_name);
+        return -1;
+    }
+    if (length < 0) {
+        PyErr_SetString(PyExc_ValueError, "'length' cannot be negative");
+        return -1;
+    }
+    if (cd->c_data == NULL) {
+        PyObject *s = cdata_repr(cd);
+        if (s != NULL) {
+            PyErr_Format(PyExc_RuntimeError,
+                         "cannot use %s() on %s",
+                         funcname, PyText_AS_UTF8(s));
+            Py_DECREF(s);
+        }
+        return -1;
+    }
+    return 0;
+}
+
+static PyObject *b_unpack(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    CDataObject *cd;
+    CTypeDescrObject *ctitem;
+    Py_ssize_t length;
+    static char *keywords[] = {"cdata", "length", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!n:unpack", keywords,
+                                     &CData_Type, &cd, &length))
+        return NULL;
+
+    if (_check_unpack_source(cd, length, "unpack") < 0)
+        return NULL;
+
+    /* byte- and unicode strings */
+    ctitem = cd->c_type->ct_itemdescr;
+    if (ctitem->ct_flags & CT_PRIMITIVE_CHAR) {
+        switch (ctitem->ct_size) {
+        case sizeof(char):
+            return PyBytes_FromStringAndSize(cd->c_data, length);
+        case 2:
+            return _my_PyUnicode_FromChar16((cffi_char16_t *)cd->c_data,length);
+        case 4:
+            return _my_PyUnicode_FromChar32((cffi_char32_t *)cd->c_data,length);
+        }
     }
+
+    /* else, the result is a list */
+    if (ctitem->ct_size < 0) {
+        PyErr_Format(PyExc_ValueError, "'%s' points to items of unknown size",
+                     cd->c_type->ct_name);
+        return NULL;
+    }
+    return unpack_to_list(cd->c_data, ctitem, length, ctitem->ct_size);
+}
+
+static PyObject *b_unpack_fields(PyObject *self, PyObject *args,
+                                 PyObject *kwds)
+{
+    CDataObject *cd;
+    CTypeDescrObject *ctitem;
+    Py_ssize_t i, j, length, nfields;
+    PyObject *fieldnames, *result = NULL;
+    static char *keywords[] = {"cdata", "length", "fieldnames", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!nO:unpack_fields",
+                                     keywords, &CData_Type, &cd, &length,
+                                     &fieldnames))
+        return NULL;
+
+    if (_check_unpack_source(cd, length, "unpack_fields") < 0)
+        return NULL;
+
+    ctitem = cd->c_type->ct_itemdescr;
+    if (!(ctitem->ct_flags & (CT_STRUCT|CT_UNION))) {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a pointer or array of struct or union, got '%s'",
+                     cd->c_type->ct_name);
+        return NULL;
+    }
+    if (force_lazy_struct(ctitem) <= 0) {
+        if (!PyErr_Occurred())
+            PyErr_Format(PyExc_TypeError, "'%s' is opaque", ctitem->ct_name);
+        return NULL;
+    }
+
+    fieldnames = PySequence_Fast(fieldnames,
+                                 "'fieldnames' must be a sequence of strings");
+    if (fieldnames == NULL)
+        return NULL;
+    nfields = PySequence_Fast_GET_SIZE(fieldnames);
+    result = PyList_New(nfields);
+    if (result == NULL)
+        goto error;
+
+    for (i = 0; i < nfields; i++) {
+        PyObject *name = PySequence_Fast_GET_ITEM(fieldnames, i);
+        PyObject *column;
+        CFieldObject *cf;
+        char *src;
+
+        cf = (CFieldObject *)PyDict_GetItem(ctitem->ct_stuff, name);
+        if (cf == NULL) {
+            if (PyText_Check(name))
+                PyErr_Format(PyExc_KeyError, "'%s' has no field '%s'",
+                             ctitem->ct_name, PyText_AS_UTF8(name));
+            else
+                PyErr_Format(PyExc_TypeError,
+                             "field names must be strings, not %.200s",
+                             Py_TYPE(name)->tp_name);
+            goto error;
+        }
+        src = cd->c_data + cf->cf_offset;
+
+        if (cf->cf_bitshift == BS_REGULAR) {
+            column = unpack_to_list(src, cf->cf_type, length,
+                                    ctitem->ct_size);
+        }
+        else if (cf->cf_bitshift == BS_EMPTY_ARRAY) {
+            PyErr_Format(PyExc_TypeError,
+                         "field '%s.%s' is a variable-length array",
+                         ctitem->ct_name, PyText_AS_UTF8(name));
+            goto error;
+        }
+        else {
+            column = PyList_New(length);
+            for (j = 0; column != NULL && j < length; j++) {
+                PyObject *x = convert_to_object_bitfield(src, cf);
+                if (x == NULL)
+                    Py_CLEAR(column);
+                else
+                    PyList_SET_ITEM(column, j, x);
+                src += ctitem->ct_size;
+            }
+        }
+        if (column == NULL)
+            goto error;
+        PyList_SET_ITEM(result, i, column);
+    }
+    Py_DECREF(fieldnames);
+    return result;
+
+ error:
+    Py_XDECREF(result);
+    Py_DECREF(fieldnames);
+    return NULL;
+}
+
+struct pack_field_s {
+    CFieldObject *cf;
+    cffi_argconv_fn convert;   /* or NULL to use convert_field_from_object() */
+};
+
+static void pack_prepare_field(struct pack_field_s *pf, CFieldObject *cf,
+                               char *data, Py_ssize_t stride)
+{
+    /* The converters of fb_select_converter() write the value directly,
+       so they need aligned fields; this is not the case e.g. in packed
+       structs */
+    CTypeDescrObject *ct = cf->cf_type;
+    Py_ssize_t align = ct->ct_length;
+
+    pf->cf = cf;
+    pf->convert = NULL;
+    if (cf->cf_bitshift == BS_REGULAR &&
+            (ct->ct_flags & CT_PRIMITIVE_ANY) && align > 0 &&
+            (align & (align - 1)) == 0 &&
+            ((uintptr_t)(data + cf->cf_offset) & (align - 1)) == 0 &&
+            (stride & (align - 1)) == 0) {
+        pf->convert = fb_select_converter(ct);
+        if (pf->convert == convert_from_object)
+            pf->convert = NULL;
+    }
+}
+
+static int pack_field(char *data, struct pack_field_s *pf, PyObject *value)
+{
+    if (pf->convert != NULL)
+        return pf->convert(data + pf->cf->cf_offset, pf->cf->cf_type, value);
+    return convert_field_from_object(data, pf->cf, value);
+}
+
+static CFieldObject *pack_lookup_field(CTypeDescrObject *ct, PyObject *name)
+{
+    cffi_field_cache_entry_t *entry = field_cache_lookup(ct, name);
+    CFieldObject *cf;
+
+    if (entry != NULL)
+        return entry->fc_field;
+    cf = (CFieldObject *)PyDict_GetItem(ct->ct_stuff, name);
+    if (cf == NULL) {
+        PyErr_SetObject(PyExc_KeyError, name);
+        return NULL;
+    }
+    field_cache_store(ct, name, cf);
+    return cf;
+}
+
+static PyObject *pack_snapshot(PyObject *obj, const char *errmsg)
+{
+    /* like PySequence_Fast(), but always returns a tuple: the converters
+       used by pack_into() can run Python code, which could resize a list
+       that we are iterating over */
+    PyObject *fast = PySequence_Fast(obj, errmsg);
+    if (fast != NULL && PyList_Check(fast)) {
+        PyObject *tuple = PyList_AsTuple(fast);
+        Py_DECREF(fast);
+        fast = tuple;
+    }
+    return fast;
+}
+
+static int pack_records(char *data, CTypeDescrObject *ct, PyObject *seq,
+                        Py_ssize_t nrows)
+{
+    PyObject **rows = &PyTuple_GET_ITEM(seq, 0);
+    struct pack_field_s *fields;
+    CFieldObject *cf;
+    Py_ssize_t i, j, nfields = 0;
+    int res = -1;
+
+    for (cf = (CFieldObject *)ct->ct_extra; cf != NULL; cf = cf->cf_next)
+        nfields++;
+    fields = PyMem_Malloc((nfields + 1) * sizeof(struct pack_field_s));
+    if (fields == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    /* the fields initialized by a list or tuple, in order */
+    nfields = 0;
+    for (cf = (CFieldObject *)ct->ct_extra; cf != NULL; cf = cf->cf_next) {
+        if (!(cf->cf_flags & BF_IGNORE_IN_CTOR))
+            pack_prepare_field(&fields[nfields++], cf, data, ct->ct_size);
+    }
+
+    for (i = 0; i < nrows; i++, data += ct->ct_size) {
+        PyObject *row = rows[i];
+
+        if ((PyList_Check(row) || PyTuple_Check(row)) &&
+                PySequence_Fast_GET_SIZE(row) <= nfields) {
+            /* re-read the size and the item every time, in case a
+               converter changes a list row */
+            for (j = 0; j < PySequence_Fast_GET_SIZE(row) && j < nfields;
+                     j++) {
+                PyObject *item = PySequence_Fast_GET_ITEM(row, j);
+                int err;
+                Py_INCREF(item);
+                err = pack_field(data, &fields[j], item);
+                Py_DECREF(item);
+                if (err < 0)
+                    goto done;
+            }
+        }
+        else if (PyDict_Check(row)) {
+            PyObject *d_key, *d_value;
+            Py_ssize_t pos = 0;
+            while (PyDict_Next(row, &pos, &d_key, &d_value)) {
+                int err = -1;
+                Py_INCREF(d_key);
+                Py_INCREF(d_value);
+                cf = pack_lookup_field(ct, d_key);
+                if (cf != NULL)
+                    err = convert_field_from_object(data, cf, d_value);
+                Py_DECREF(d_value);
+                Py_DECREF(d_key);
+                if (err < 0)
+                    goto done;
+            }
+        }
+        else {
+            /* struct cdata, or error */
+            if (convert_from_object(data, ct, row) < 0)
+                goto done;
+        }
+    }
+    res = 0;
+
+ done:
+    PyMem_Free(fields);
+    return res;
+}
+
+static int pack_column(char *data, CTypeDescrObject *ct, PyObject *name,
+                       PyObject *column, Py_ssize_t *pnrows)
+{
+    struct pack_field_s pf;
+    CFieldObject *cf;
+    PyObject *seq;
+    Py_ssize_t i, n;
+
+    cf = pack_lookup_field(ct, name);
+    if (cf == NULL)
+        return -1;
+
+    if (CData_Check(column) &&
+            (((CDataObject *)column)->c_type->ct_flags & CT_ARRAY) &&
+            ((CDataObject *)column)->c_type->ct_itemdescr == cf->cf_type &&
+            cf->cf_bitshift == BS_REGULAR) {
+        /* a C array of exactly the field type: copy the raw items */
+        char *src = ((CDataObject *)column)->c_data;
+        Py_ssize_t size = cf->cf_type->ct_size;
+        n = get_array_length((CDataObject *)column);
+        if (*pnrows >= 0 && n != *pnrows)
+            goto wrong_length;
+        *pnrows = n;
+        data += cf->cf_offset;
+        for (i = 0; i < n; i++) {
+            memcpy(data, src, size);
+            data += ct->ct_size;
+            src += size;
+        }
+        return 0;
+    }
+
+    seq = pack_snapshot(column, "each column must be a sequence");
+    if (seq == NULL)
+        return -1;
+    n = PyTuple_GET_SIZE(seq);
+    if (*pnrows >= 0 && n != *pnrows) {
+        Py_DECREF(seq);
+        goto wrong_length;
+    }
+    *pnrows = n;
+    pack_prepare_field(&pf, cf, data, ct->ct_size);
+    for (i = 0; i < n; i++) {
+        if (pack_field(data, &pf, PyTuple_GET_ITEM(seq, i)) < 0) {
+            Py_DECREF(seq);
+            return -1;
+        }
+        data += ct->ct_size;
+    }
+    Py_DECREF(seq);
+    return 0;
+
+ wrong_length:
+    PyErr_Format(PyExc_ValueError,
+                 "all columns must have the same length (got %zd and %zd)",
+                 *pnrows, n);
+    return -1;
+}
+
+static Py_ssize_t pack_column_length(PyObject *column)
+{
+    if (CData_Check(column) &&
+            (((CDataObject *)column)->c_type->ct_flags & CT_ARRAY))
+        return get_array_length((CDataObject *)column);
+    return PyObject_Size(column);
+}
+
+static PyObject *b_pack_into(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    CDataObject *cd;
+    CTypeDescrObject *ctitem;
+    PyObject *data, *fieldnames = Py_None, *seq;
+    Py_ssize_t i, nrows, maxrows = -1;
+    static char *keywords[] = {"cdata", "data", "fieldnames", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!O|O:pack_into",
+                                     keywords, &CData_Type, &cd, &data,
+                                     &fieldnames))
+        return NULL;
+
+    if (_check_unpack_source(cd, 0, "pack_into") < 0)
+        return NULL;
+    ctitem = cd->c_type->ct_itemdescr;
+    if (!(ctitem->ct_flags & (CT_STRUCT|CT_UNION))) {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a pointer or array of struct or union, got '%s'",
+                     cd->c_type->ct_name);
+        return NULL;
+    }
+    if (force_lazy_struct(ctitem) <= 0) {
+        if (!PyErr_Occurred())
+            PyErr_Format(PyExc_TypeError, "'%s' is opaque", ctitem->ct_name);
+        return NULL;
+    }
+    if (cd->c_type->ct_flags & CT_ARRAY)
+        maxrows = get_array_length(cd);
+
+    if (fieldnames == Py_None) {
+        /* 'data' is a sequence of records */
+        seq = pack_snapshot(data, "expected a sequence of records");
+        if (seq == NULL)
+            return NULL;
+        nrows = PyTuple_GET_SIZE(seq);
+        if (maxrows >= 0 && nrows > maxrows)
+            goto too_many_rows;
+        if (pack_records(cd->c_data, ctitem, seq, nrows) < 0)
+            goto error;
+    }
+    else {
+        /* 'data' is a sequence of columns, one per name in 'fieldnames' */
+        PyObject *names;
+        seq = pack_snapshot(data, "expected a sequence of columns");
+        if (seq == NULL)
+            return NULL;
+        names = pack_snapshot(fieldnames,
+                              "'fieldnames' must be a sequence of strings");
+        if (names == NULL)
+            goto error;
+        if (PyTuple_GET_SIZE(names) != PyTuple_GET_SIZE(seq)) {
+            PyErr_Format(PyExc_ValueError,
+                         "got %zd field names but %zd columns",
+                         PyTuple_GET_SIZE(names),
+                         PyTuple_GET_SIZE(seq));
+            Py_DECREF(names);
+            goto error;
+        }
+        nrows = -1;
+        if (maxrows >= 0 && PyTuple_GET_SIZE(seq) > 0) {
+            /* check the length before writing anything */
+            nrows = pack_column_length(PyTuple_GET_ITEM(seq, 0));
+            if (nrows < 0) {
+                Py_DECREF(names);
+                goto error;
+            }
+            if (nrows > maxrows) {
+                Py_DECREF(names);
+                goto too_many_rows;
+            }
+        }
+        for (i = 0; i < PyTuple_GET_SIZE(seq); i++) {
+            if (pack_column(cd->c_data, ctitem,
+                            PyTuple_GET_ITEM(names, i),
+                            PyTuple_GET_ITEM(seq, i), &nrows) < 0) {
+                Py_DECREF(names);
+                goto error;
+            }
+        }
+        Py_DECREF(names);
+    }
+    Py_DECREF(seq);
+    Py_INCREF(Py_None);
+    return Py_None;
+
+ too_many_rows:
+    PyErr_Format(PyExc_IndexError,
+                 "too many rows for '%s' (got %zd)",
+                 cd->c_type->ct_name, nrows);
+ error:
+    Py_DECREF(seq);
+    return NULL;
+}
+
+/* PEP 3118 format strings, for the typed buffers exported by
+   ffi.buffer().  _buffer_format_append_type() returns 0 on success, -1
+   if the type cannot be described (e.g. bitfields or unions), or -2 if
+   an exception is set. */
+
+struct buffer_format_s {
+    char *buf;
+    Py_ssize_t len, allocated;
+};
+
+static int _buffer_format_append(struct buffer_format_s *f, const char *s,
+                                 Py_ssize_t n)
+{
+    if (f->len + n >= f->allocated) {
+        Py_ssize_t newsize = (f->len + n) * 2 + 16;
+        char *newbuf = PyMem_Realloc(f->buf, newsize);
+        if (newbuf == NULL) {
+            PyErr_NoMemory();
+            return -2;
+        }
+        f->buf = newbuf;
+        f->allocated = newsize;
+    }
+    memcpy(f->buf + f->len, s, n);
+    f->len += n;
+    f->buf[f->len] = 0;
+    return 0;
+}
+
+static const char *_buffer_format_primitive(CTypeDescrObject *ct)
+{
+    if (ct->ct_flags & CT_PRIMITIVE_SIGNED) {
+        switch (ct->ct_size) {
+        case 1: return "b";
+        case 2: return "h";
+        case 4: return "i";
+        case 8: return "q";
+        }
+    }
+    else if (ct->ct_flags & CT_PRIMITIVE_UNSIGNED) {
+        if (ct->ct_flags & CT_IS_BOOL)
+            return "?";
+        switch (ct->ct_size) {
+        case 1: return "B";
+        case 2: return "H";
+        case 4: return "I";
+        case 8: return "Q";
+        }
+    }
+    else if (ct->ct_flags & CT_PRIMITIVE_COMPLEX) {
+        if (ct->ct_size == 2 * sizeof(float))
+            return "Zf";
+        if (ct->ct_size == 2 * sizeof(double))
+            return "Zd";
+    }
+    else if (ct->ct_flags & CT_PRIMITIVE_FLOAT) {
+        if (ct->ct_flags & CT_IS_LONGDOUBLE)
+            return "g";
+        if (ct->ct_size == sizeof(float))
+            return "f";
+        if (ct->ct_size == sizeof(double))
+            return "d";
+    }
+    else if (ct->ct_flags & CT_PRIMITIVE_CHAR) {
+        if (ct->ct_size == 1)
+            return "c";
+    }
+    else if (ct->ct_flags & (CT_POINTER | CT_FUNCTIONPTR)) {
+        return "P";
+    }
+    return NULL;
+}
+
+static int _buffer_format_append_type(struct buffer_format_s *f,
+                                      CTypeDescrObject *ct)
+{
+    const char *code;
+    char tmp[32];
+    int err;
+
+    if (ct->ct_flags & CT_ARRAY) {
+        /* "(2,3)i" for 'int[2][3]' */
+        char sep = '(';
+        while (ct->ct_flags & CT_ARRAY) {
+            if (ct->ct_length < 0)
+                return -1;
+            sprintf(tmp, "%c%llu", sep, (unsigned PY_LONG_LONG)ct->ct_length);
+            if ((err = _buffer_format_append(f, tmp, strlen(tmp))) < 0)
+                return err;
+            sep = ',';
+            ct = ct->ct_itemdescr;
+        }
+        if ((err = _buffer_format_append(f, ")", 1)) < 0)
+            return err;
+    }
+
+    if (ct->ct_flags & CT_STRUCT) {
+        /* "T{i:x:4xd:y:}", with explicit padding everywhere; the caller
+           starts the whole format with '^' (native, without alignment) */
+        CFieldObject *cf;
+        Py_ssize_t offset = 0;
+
+        if (ct->ct_flags & (CT_IS_OPAQUE | CT_WITH_VAR_ARRAY) ||
+                force_lazy_struct(ct) <= 0)
+            return PyErr_Occurred() ? -2 : -1;
+        if ((err = _buffer_format_append(f, "T{", 2)) < 0)
+            return err;
+        for (cf = (CFieldObject *)ct->ct_extra; cf != NULL; cf = cf->cf_next) {
+            PyObject *name;
+            if (cf->cf_bitshift != BS_REGULAR || cf->cf_offset < offset ||
+                    cf->cf_type->ct_size < 0)
+                return -1;
+            if (cf->cf_offset > offset) {
+                sprintf(tmp, "%llux",
+                        (unsigned PY_LONG_LONG)(cf->cf_offset - offset));
+                if ((err = _buffer_format_append(f, tmp, strlen(tmp))) < 0)
+                    return err;
+            }
+            if ((err = _buffer_format_append_type(f, cf->cf_type)) < 0)
+                return err;
+            name = get_field_name(ct, cf);
+            if (!PyText_Check(name) || PyText_GetSize(name) == 0 ||
+                    strchr(PyText_AS_UTF8(name), ':') != NULL)
+                return -1;
+            if ((err = _buffer_format_append(f, ":", 1)) < 0 ||
+                (err = _buffer_format_append(f, PyText_AS_UTF8(name),
+                                         strlen(PyText_AS_UTF8(name)))) < 0 ||
+                (err = _buffer_format_append(f, ":", 1)) < 0)
+                return err;
+            offset = cf->cf_offset + cf->cf_type->ct_size;
+        }
+        if (ct->ct_size > offset) {
+            sprintf(tmp, "%llux", (unsigned PY_LONG_LONG)(ct->ct_size - offset));
+            if ((err = _buffer_format_append(f, tmp, strlen(tmp))) < 0)
+                return err;
+        }
+        return _buffer_format_append(f, "}", 1);
+    }
+
+    code = _buffer_format_primitive(ct);
+    if (code == NULL)
+        return -1;
+    return _buffer_format_append(f, code, strlen(code));
+}
+
+static PyObject *_ctype_buffer_format(CTypeDescrObject *ct)
+{
+    /* Return the PEP 3118 format of the items of type 'ct', as a bytes
+       object, or None if we can't describe it.  Strings of 'char' or
+       'wchar_t' are left as raw bytes. */
+    struct buffer_format_s f = { NULL, 0, 0 };
+    PyObject *result;
+    int err;
+
+    if (ct->ct_flags & CT_PRIMITIVE_CHAR) {
+        Py_INCREF(Py_None);
+        return Py_None;
+    }
+    err = _buffer_format_append(&f, "^", (ct->ct_flags & CT_STRUCT) ? 1 : 0);
+    if (err == 0)
+        err = _buffer_format_append_type(&f, ct);
+    if (err == 0) {
+        result = PyBytes_FromStringAndSize(f.buf, f.len);
+    }
+    else if (err == -1) {
+        result = Py_None;
+        Py_INCREF(result);
+    }
+    else
+        result = NULL;
+    PyMem_Free(f.buf);
     return result;
 }
 
@@ -7010,10 +9264,11 @@ b_buffer_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
     /* this is the constructor of the type implemented in minibuffer.h */
     CDataObject *cd;
     Py_ssize_t size = -1;
-    static char *keywords[] = {"cdata", "size", NULL};
+    int typed = 0;
+    static char *keywords[] = {"cdata", "size", "typed", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!|n:buffer", keywords,
-                                     &CData_Type, &cd, &size))
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!|ni:buffer", keywords,
+                                     &CData_Type, &cd, &size, &typed))
         return NULL;
 
     if (size < 0)
@@ -7040,7 +9295,8 @@ b_buffer_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
         return NULL;
     }
     /*WRITE(cd->c_data, size)*/
-    return minibuffer_new(cd->c_data, size, (PyObject *)cd);
+    return minibuffer_new(cd->c_data, size, (PyObject *)cd,
+                          typed ? cd->c_type->ct_itemdescr : NULL);
 }
 
 static PyObject *b_get_errno(PyObject *self, PyObject *noarg)
@@ -7079,6 +9335,7 @@ static PyObject *newp_handle(CTypeDescrObject *ct_voidp, PyObject *x)
     cd->head.c_type = ct_voidp;
     cd->head.c_data = (char *)cd;
     cd->head.c_weakreflist = NULL;
+    cdata_init_vectorcall(cd);
     Py_INCREF(x);
     cd->structobj = x;
     PyObject_GC_Track(cd);
@@ -7272,6 +9529,7 @@ static PyObject *direct_from_buffer(CTypeDescrObject *ct, PyObject *x,
     cd->c_type = ct;
     cd->c_data = view->buf;
     cd->c_weakreflist = NULL;
+    cdata_init_vectorcall(cd);
     ((CDataObject_frombuf *)cd)->length = arraylength;
     ((CDataObject_frombuf *)cd)->bufferview = view;
     PyObject_GC_Track(cd);
@@ -7687,6 +9945,12 @@ static PyObject *b__testbuff(PyObject *self, PyObject *args)
 
 static PyObject *b_init_cffi_1_0_external_module(PyObject *, PyObject *);
 /* forward, see cffi1_module.c */
+static PyObject *b_get_extern_python_cache_info(PyObject *, PyObject *);
+/* forward, see call_python.c */
+static PyObject *b_callback_queue(PyObject *, PyObject *);
+/* forward, see callback_queue.c */
+static PyObject *b_arena(PyObject *, PyObject *);
+/* forward, see arena.c */
 
 
 static PyMethodDef FFIBackendMethods[] = {
@@ -7703,6 +9967,11 @@ static PyMethodDef FFIBackendMethods[] = {
     {"newp", b_newp, METH_VARARGS},
     {"cast", b_cast, METH_VARARGS},
     {"callback", b_callback, METH_VARARGS},
+    {"reserve_callbacks", b_reserve_callbacks, METH_O},
+    {"callback_queue", b_callback_queue, METH_VARARGS},
+    {"get_callback_pool_info", b_get_callback_pool_info, METH_NOARGS},
+    {"get_extern_python_cache_info", b_get_extern_python_cache_info,
+                                     METH_NOARGS},
     {"alignof", b_alignof, METH_O},
     {"sizeof", b_sizeof, METH_O},
     {"typeof", b_typeof, METH_O},
@@ -7711,6 +9980,11 @@ static PyMethodDef FFIBackendMethods[] = {
     {"getcname", b_getcname, METH_VARARGS},
     {"string", (PyCFunction)b_string, METH_VARARGS | METH_KEYWORDS},
     {"unpack", (PyCFunction)b_unpack, METH_VARARGS | METH_KEYWORDS},
+    {"unpack_fields", (PyCFunction)b_unpack_fields,
+                                        METH_VARARGS | METH_KEYWORDS},
+    {"pack_into", (PyCFunction)b_pack_into, METH_VARARGS | METH_KEYWORDS},
+    {"call_many", (PyCFunction)b_call_many, METH_VARARGS | METH_KEYWORDS},
+    {"arena", b_arena, METH_VARARGS},
     {"get_errno", b_get_errno, METH_NOARGS},
     {"set_errno", b_set_errno, METH_O},
     {"newp_handle", b_newp_handle, METH_VARARGS},
@@ -7719,6 +9993,10 @@ static PyMethodDef FFIBackendMethods[] = {
     {"memmove", (PyCFunction)b_memmove, METH_VARARGS | METH_KEYWORDS},
     {"gcp", (PyCFunction)b_gcp, METH_VARARGS | METH_KEYWORDS},
     {"release", b_release, METH_O},
+    {"get_variadic_cache_info", b_get_variadic_cache_info, METH_NOARGS},
+    {"set_variadic_cache_size", b_set_variadic_cache_size, METH_O},
+    {"get_new_pool_info", b_get_new_pool_info, METH_NOARGS},
+    {"set_new_pool_size", b_set_new_pool_size, METH_VARARGS},
 #ifdef MS_WIN32
     {"getwinerror", (PyCFunction)b_getwinerror, METH_VARARGS | METH_KEYWORDS},
 #endif
@@ -7910,6 +10188,8 @@ static void *cffi_exports[] = {
     cffi_call_python,
     _cffi_to_c_wchar3216_t,
     _cffi_from_c_wchar3216_t,
+    cffi_thread_attach,
+    cffi_thread_detach,
 };
 
 static struct { const char *name; int value; } all_dlopen_flags[] = {
@@ -7972,11 +10252,15 @@ init_cffi_backend(void)
         &CDataOwningGC_Type,
         &CDataFromBuf_Type,
         &CDataGCP_Type,
+        &CDataCFree_Type,
+        &CDataKeepGIL_Type,
         &CDataIter_Type,
         &MiniBuffer_Type,
         &FFI_Type,
         &Lib_Type,
         &GlobSupport_Type,
+        &Arena_Type,
+        &CallbackQueue_Type,
         NULL
     };
 
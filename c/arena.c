@@ -0,0 +1,230 @@
+/* An arena object, returned by ffi.arena(size).  It owns one block of
+   'size' bytes, and arena.new() is like ffi.new() but returns cdata
+   objects that point inside this block, allocated by bumping a pointer.
+   These cdata objects don't own their memory, but they keep the arena
+   alive: all the memory is released at once when the arena is released
+   (with the 'with' statement or arena.release()), or when neither the
+   arena object nor any of these cdata objects is alive any more.
+*/
+
+typedef struct {
+    PyObject_HEAD
+    FFIObject        *ar_ffi;       /* for parsing types, or NULL */
+    char             *ar_data;      /* NULL if released */
+    Py_ssize_t        ar_size;
+    Py_ssize_t        ar_used;
+} ArenaObject;
+
+static PyTypeObject Arena_Type;   /* forward */
+
+static PyObject *arena_new_object(FFIObject *ffi, Py_ssize_t size)
+{
+    ArenaObject *ar;
+
+    if (size < 0) {
+        PyErr_SetString(PyExc_ValueError, "negative arena size");
+        return NULL;
+    }
+    ar = PyObject_New(ArenaObject, &Arena_Type);
+    if (ar == NULL)
+        return NULL;
+    ar->ar_data = malloc(size > 0 ? size : 1);
+    if (ar->ar_data == NULL) {
+        ar->ar_ffi = NULL;
+        Py_DECREF(ar);
+        return PyErr_NoMemory();
+    }
+    Py_XINCREF(ffi);
+    ar->ar_ffi = ffi;
+    ar->ar_size = size;
+    ar->ar_used = 0;
+    return (PyObject *)ar;
+}
+
+static void arena_dealloc(ArenaObject *ar)
+{
+    free(ar->ar_data);
+    Py_XDECREF(ar->ar_ffi);
+    PyObject_Del(ar);
+}
+
+static PyObject *arena_new_cdata(ArenaObject *ar, char *data,
+                                 CTypeDescrObject *ct, Py_ssize_t length)
+{
+    /* like allocate_gcp_object(), with the arena as 'origobj' and no
+       destructor: the cdata keeps the arena alive */
+    CDataObject_gcp *cd = PyObject_GC_New(CDataObject_gcp, &CDataGCP_Type);
+    if (cd == NULL)
+        return NULL;
+
+    Py_INCREF(ar);
+    Py_INCREF(ct);
+    cd->head.c_data = data;
+    cd->head.c_type = ct;
+    cd->head.c_weakreflist = NULL;
+    cdata_init_vectorcall(cd);
+    cd->length = length;
+    cd->origobj = (PyObject *)ar;
+    cd->destructor = NULL;
+
+    PyObject_GC_Track(cd);
+    return (PyObject *)cd;
+}
+
+PyDoc_STRVAR(arena_new_doc,
+"Allocate an instance according to the specified C type and return a\n"
+"pointer to it, like ffi.new(), but from the memory of the arena.\n"
+"\n"
+"The returned <cdata> object does not own its memory, but it keeps the\n"
+"arena alive.  It is valid until the arena is explicitly released.");
+
+static PyObject *arena_new(ArenaObject *ar, PyObject *args, PyObject *kwds)
+{
+    CTypeDescrObject *ct, *ctitem;
+    PyObject *arg, *init = Py_None, *cd;
+    Py_ssize_t dataoffset, datasize, explicitlength, align, start;
+    char *data;
+    static char *keywords[] = {"cdecl", "init", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O:new", keywords,
+                                     &arg, &init))
+        return NULL;
+
+    if (ar->ar_data == NULL) {
+        PyErr_SetString(PyExc_ValueError, "this arena was released");
+        return NULL;
+    }
+    if (ar->ar_ffi != NULL) {
+        ct = _ffi_type(ar->ar_ffi, arg, ACCEPT_STRING|ACCEPT_CTYPE);
+        if (ct == NULL)
+            return NULL;
+    }
+    else if (CTypeDescr_Check(arg)) {
+        ct = (CTypeDescrObject *)arg;
+    }
+    else {
+        PyErr_SetString(PyExc_TypeError, "expected a ctype object");
+        return NULL;
+    }
+
+    if (newp_compute_size(ct, &init, &dataoffset, &datasize,
+                          &explicitlength) < 0)
+        return NULL;
+    ctitem = ct->ct_itemdescr;
+    align = get_alignment(ctitem);
+    if (align < 0)
+        return NULL;
+
+    start = ((ar->ar_used + align - 1) / align) * align;
+    if (start > ar->ar_size || datasize > ar->ar_size - start) {
+        PyErr_Format(PyExc_MemoryError,
+                     "arena of %zd bytes is full (%zd bytes used, "
+                     "%zd requested)", ar->ar_size, ar->ar_used, datasize);
+        return NULL;
+    }
+    data = ar->ar_data + start;
+    memset(data, 0, datasize);
+
+    cd = arena_new_cdata(ar, data, ct, explicitlength);
+    if (cd == NULL)
+        return NULL;
+
+    if (init != Py_None) {
+        if (convert_from_object(data,
+              (ct->ct_flags & CT_POINTER) ? ctitem : ct, init) < 0) {
+            Py_DECREF(cd);
+            return NULL;
+        }
+    }
+    ar->ar_used = start + datasize;
+    return cd;
+}
+
+PyDoc_STRVAR(arena_release_doc,
+"Release now the memory of the arena.  All the cdata objects returned\n"
+"by arena.new() must not be used afterwards.\n"
+"\n"
+"'arena.release()' is equivalent to 'arena.__exit__()'.");
+
+static PyObject *arena_release(ArenaObject *ar, PyObject *noarg)
+{
+    free(ar->ar_data);
+    ar->ar_data = NULL;
+    ar->ar_used = 0;
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+static PyObject *arena_enter(ArenaObject *ar, PyObject *noarg)
+{
+    if (ar->ar_data == NULL) {
+        PyErr_SetString(PyExc_ValueError, "this arena was released");
+        return NULL;
+    }
+    Py_INCREF(ar);
+    return (PyObject *)ar;
+}
+
+static PyObject *arena_exit(ArenaObject *ar, PyObject *args)
+{
+    /* 'args' ignored */
+    return arena_release(ar, NULL);
+}
+
+static PyMethodDef arena_methods[] = {
+    {"new",       (PyCFunction)arena_new,     METH_VARARGS | METH_KEYWORDS,
+                                              arena_new_doc},
+    {"release",   (PyCFunction)arena_release, METH_NOARGS, arena_release_doc},
+    {"__enter__", (PyCFunction)arena_enter,   METH_NOARGS},
+    {"__exit__",  (PyCFunction)arena_exit,    METH_VARARGS},
+    {NULL,        NULL}           /* sentinel */
+};
+
+static PyMemberDef arena_members[] = {
+    {"size", T_PYSSIZET, offsetof(ArenaObject, ar_size), READONLY,
+     "total size of the arena, in bytes"},
+    {"used", T_PYSSIZET, offsetof(ArenaObject, ar_used), READONLY,
+     "number of bytes allocated so far, including alignment padding"},
+    {NULL}
+};
+
+static PyTypeObject Arena_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_backend.Arena",
+    sizeof(ArenaObject),
+    0,
+    (destructor)arena_dealloc,                  /* tp_dealloc */
+    0,                                          /* tp_print */
+    0,                                          /* tp_getattr */
+    0,                                          /* tp_setattr */
+    0,                                          /* tp_compare */
+    0,                                          /* tp_repr */
+    0,                                          /* tp_as_number */
+    0,                                          /* tp_as_sequence */
+    0,                                          /* tp_as_mapping */
+    0,                                          /* tp_hash */
+    0,                                          /* tp_call */
+    0,                                          /* tp_str */
+    PyObject_GenericGetAttr,                    /* tp_getattro */
+    0,                                          /* tp_setattro */
+    0,                                          /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,                         /* tp_flags */
+    0,                                          /* tp_doc */
+    0,                                          /* tp_traverse */
+    0,                                          /* tp_clear */
+    0,                                          /* tp_richcompare */
+    0,                                          /* tp_weaklistoffset */
+    0,                                          /* tp_iter */
+    0,                                          /* tp_iternext */
+    arena_methods,                              /* tp_methods */
+    arena_members,                              /* tp_members */
+};
+
+static PyObject *b_arena(PyObject *self, PyObject *args)
+{
+    Py_ssize_t size;
+
+    if (!PyArg_ParseTuple(args, "n:arena", &size))
+        return NULL;
+    return arena_new_object(NULL, size);
+}
@@ -69,10 +69,75 @@ static PyObject *_get_interpstate_dict(void)
     return NULL;
 }
 
+/* Each extern "Python" function keeps in 'externpy->reserved2' a small
+   cache of the infotuples that were attached to it in the most recently
+   used (sub)interpreters, most recent first.  'externpy->reserved1' is
+   the key of the interpreter in the first slot, so that calling again
+   from the same interpreter only needs a pointer comparison, and
+   alternating between a few interpreters doesn't need any dict lookup.
+   The interpstate dict remains the reference: the cache is refilled
+   from it when we switch to an interpreter that is not in the cache.
+*/
+#define EXTERNPY_CACHE_SLOTS   8
+
+typedef struct {
+    PyObject *interp_key;      /* a reference, or NULL if the slot is free */
+    PyObject *infotuple;       /* a reference, or NULL if the slot is free */
+} externpy_slot_t;
+
+typedef struct {
+    externpy_slot_t slots[EXTERNPY_CACHE_SLOTS];
+} externpy_cache_t;
+
+static Py_ssize_t externpy_cache_switches = 0;   /* found in a later slot */
+static Py_ssize_t externpy_cache_refreshes = 0;  /* looked up in the dict */
+
+static int _externpy_cache_put(struct _cffi_externpy_s *externpy,
+                               PyObject *interp_key, PyObject *infotuple)
+{
+    /* Store (interp_key, infotuple) in the first slot, moving the other
+       slots down.  If 'interp_key' was already in a slot, that slot is
+       reused; otherwise the last slot is evicted. */
+    externpy_cache_t *cache = (externpy_cache_t *)externpy->reserved2;
+    externpy_slot_t old;
+    int i;
+
+    if (cache == NULL) {
+        cache = calloc(1, sizeof(externpy_cache_t));
+        if (cache == NULL)
+            return -1;
+        externpy->reserved2 = cache;
+    }
+    for (i = 0; i < EXTERNPY_CACHE_SLOTS - 1; i++) {
+        if (cache->slots[i].interp_key == interp_key ||
+                cache->slots[i].interp_key == NULL)
+            break;
+    }
+    old = cache->slots[i];
+    memmove(&cache->slots[1], &cache->slots[0], i * sizeof(externpy_slot_t));
+    Py_INCREF(interp_key);
+    Py_INCREF(infotuple);
+    cache->slots[0].interp_key = interp_key;
+    cache->slots[0].infotuple = infotuple;
+    externpy->reserved1 = interp_key;     /* borrowed from slots[0] */
+    Py_XDECREF(old.interp_key);
+    Py_XDECREF(old.infotuple);
+    return 0;
+}
+
+static PyObject *b_get_extern_python_cache_info(PyObject *self,
+                                                PyObject *noarg)
+{
+    return Py_BuildValue("{s:n,s:n,s:i}",
+                         "switches", externpy_cache_switches,
+                         "refreshes", externpy_cache_refreshes,
+                         "slots", EXTERNPY_CACHE_SLOTS);
+}
+
 static PyObject *_ffi_def_extern_decorator(PyObject *outer_args, PyObject *fn)
 {
     const char *s;
-    PyObject *error, *onerror, *infotuple, *old1;
+    PyObject *error, *onerror, *infotuple;
     int index, err;
     const struct _cffi_global_s *g;
     struct _cffi_externpy_s *externpy;
@@ -136,16 +201,17 @@ static PyObject *_ffi_def_extern_decorator(PyObject *outer_args, PyObject *fn)
 
     err = PyDict_SetItem(interpstate_dict, interpstate_key, infotuple);
     Py_DECREF(interpstate_key);
-    Py_DECREF(infotuple);    /* interpstate_dict owns the last ref */
-    if (err < 0)
+    if (err < 0) {
+        Py_DECREF(infotuple);
         return NULL;
+    }
 
-    /* force _update_cache_to_call_python() to be called the next time
-       the C function invokes cffi_call_python, to update the cache */
-    old1 = externpy->reserved1;
-    externpy->reserved1 = Py_None;   /* a non-NULL value */
-    Py_INCREF(Py_None);
-    Py_XDECREF(old1);
+    /* update the cache for the current interpreter; the entries of the
+       other interpreters are still valid */
+    err = _externpy_cache_put(externpy, _current_interp_key(), infotuple);
+    Py_DECREF(infotuple);    /* interpstate_dict owns the last ref */
+    if (err < 0)
+        return PyErr_NoMemory();
 
     /* return the function object unmodified */
     Py_INCREF(fn);
@@ -161,9 +227,28 @@ static PyObject *_ffi_def_extern_decorator(PyObject *outer_args, PyObject *fn)
 
 static int _update_cache_to_call_python(struct _cffi_externpy_s *externpy)
 {
-    PyObject *interpstate_dict, *interpstate_key, *infotuple, *old1, *new1;
-    PyObject *old2;
+    externpy_cache_t *cache = (externpy_cache_t *)externpy->reserved2;
+    PyObject *interpstate_dict, *interpstate_key, *interp_key, *infotuple;
+    int i;
+
+    interp_key = _current_interp_key();
+    if (interp_key == NULL)
+        return 4;    /* oops, shutdown issue? */
 
+    /* is it in one of the other slots of the cache? */
+    for (i = 1; i < EXTERNPY_CACHE_SLOTS; i++) {
+        if (cache->slots[i].interp_key == NULL)
+            break;
+        if (cache->slots[i].interp_key == interp_key) {
+            externpy_cache_switches++;
+            _externpy_cache_put(externpy, interp_key,
+                                cache->slots[i].infotuple);  /* can't fail */
+            return 0;
+        }
+    }
+
+    /* no, so look it up in the interpstate dict */
+    externpy_cache_refreshes++;
     interpstate_dict = _get_interpstate_dict();
     if (interpstate_dict == NULL)
         return 4;    /* oops, shutdown issue? */
@@ -177,16 +262,8 @@ static int _update_cache_to_call_python(struct _cffi_externpy_s *externpy)
     if (infotuple == NULL)
         return 3;    /* no ffi.def_extern() from this subinterpreter */
 
-    new1 = _current_interp_key();
-    Py_INCREF(new1);
-    Py_INCREF(infotuple);
-    old1 = (PyObject *)externpy->reserved1;
-    old2 = (PyObject *)externpy->reserved2;
-    externpy->reserved1 = new1;         /* holds a reference        */
-    externpy->reserved2 = infotuple;    /* holds a reference (issue #246) */
-    Py_XDECREF(old1);
-    Py_XDECREF(old2);
-
+    if (_externpy_cache_put(externpy, interp_key, infotuple) < 0)
+        return 2;
     return 0;   /* no error */
 
  error:
@@ -255,9 +332,10 @@ static void cffi_call_python(struct _cffi_externpy_s *externpy, char *args)
 
     /* We need the infotuple here.  We could always go through
        _update_cache_to_call_python(), but to avoid the extra dict
-       lookups, we cache in (reserved1, reserved2) the last seen pair
-       (interp->modules, infotuple).  The first item in this tuple is
-       a random PyObject that identifies the subinterpreter.
+       lookups, we cache the infotuples of the last few subinterpreters
+       in 'reserved2' (see _externpy_cache_put()).  'reserved1' is the
+       random PyObject that identifies the subinterpreter of the most
+       recently used one.
     */
     if (externpy->reserved1 == NULL) {
         /* Not initialized!  We didn't call @ffi.def_extern() on this
@@ -267,13 +345,14 @@ static void cffi_call_python(struct _cffi_externpy_s *externpy, char *args)
     else {
         PyGILState_STATE state = gil_ensure();
         if (externpy->reserved1 != _current_interp_key()) {
-            /* Update the (reserved1, reserved2) cache.  This will fail
-               if we didn't call @ffi.def_extern() in this particular
-               subinterpreter. */
+            /* Switch to the cache entry of this subinterpreter, or
+               refill it.  This will fail if we didn't call
+               @ffi.def_extern() in this particular subinterpreter. */
             err = _update_cache_to_call_python(externpy);
         }
         if (!err) {
-            general_invoke_callback(0, args, args, externpy->reserved2);
+            externpy_cache_t *cache = (externpy_cache_t *)externpy->reserved2;
+            general_invoke_callback(0, args, args, cache->slots[0].infotuple);
         }
         gil_release(state);
     }
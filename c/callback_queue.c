@@ -0,0 +1,523 @@
+/* A callback queue, returned by ffi.callback_queue(cdecl, size).  It
+   owns a callback <cdata> (queue.callback) that C code can call from
+   any thread without taking the GIL: the callback only copies the raw
+   bytes of its arguments into a bounded ring buffer of 'size' records.
+   Python code gets the events back in batches with queue.drain(),
+   decoded like the arguments of a regular callback, and can block in
+   queue.wait() until there is something to drain.  When the ring
+   buffer is full, new events are dropped and counted in queue.dropped.
+
+   The ring buffer is Dmitry Vyukov's bounded MPMC queue: every slot
+   starts with a sequence number which tells the producers whether the
+   slot is free for the current round, and the consumers whether it
+   has been filled.  Producers and consumers only synchronize with a
+   compare-and-swap on their own position counter.
+*/
+
+#ifdef _MSC_VER
+#  define cq_compare_and_swap(l,o,n)                                    \
+      (InterlockedCompareExchangePointer((void *volatile *)(l),         \
+                                         (void *)(n), (void *)(o))      \
+       == (void *)(o))
+#  define cq_barrier()                 MemoryBarrier()
+#else
+#  define cq_compare_and_swap(l,o,n)   __sync_bool_compare_and_swap(l,o,n)
+#  define cq_barrier()                 __sync_synchronize()
+#endif
+#ifdef __ATOMIC_ACQUIRE
+   /* GCC >= 4.7 or clang: cheaper than full barriers, e.g. on x86 */
+#  define cq_load_acquire(p)           __atomic_load_n(p, __ATOMIC_ACQUIRE)
+#  define cq_store_release(p, v)       __atomic_store_n(p, v, __ATOMIC_RELEASE)
+#else
+#  define cq_load_acquire(p)           cq_load_acquire_fallback(p)
+#  define cq_store_release(p, v)       do { cq_barrier(); *(p) = (v);    \
+                                            cq_barrier(); } while (0)
+static size_t cq_load_acquire_fallback(volatile size_t *p)
+{
+    size_t result = *p;
+    cq_barrier();
+    return result;
+}
+#endif
+
+/* every slot is 'cq_stride' bytes: the sequence number, then the record
+   with the arguments, both aligned to CQ_ALIGN */
+#define CQ_ALIGN        16
+#define CQ_MAX_SIZE     ((Py_ssize_t)1 << 30)
+
+typedef struct {
+    Py_ssize_t offset, size;
+    CTypeDescrObject *ct;          /* borrowed from the function type */
+} cq_arg_t;
+
+typedef struct {
+    PyObject_HEAD
+    CTypeDescrObject *cq_ct;        /* the function pointer type */
+    PyObject         *cq_callback;  /* the callback <cdata>, or NULL */
+    char             *cq_buffer;    /* 'cq_size' slots */
+    Py_ssize_t        cq_size;      /* a power of two */
+    size_t            cq_stride;
+    size_t            cq_recordsize;
+    Py_ssize_t        cq_nargs;
+    cq_arg_t         *cq_args;
+    volatile size_t   cq_enqueue_pos;
+    volatile size_t   cq_dequeue_pos;
+    volatile size_t   cq_dropped;
+    volatile size_t   cq_waiting;   /* 1 if wait() sleeps on cq_wakeup */
+    PyThread_type_lock cq_wakeup;   /* held except to wake up wait() */
+    int               cq_in_wait;   /* protected by the GIL */
+} CallbackQueueObject;
+
+static PyTypeObject CallbackQueue_Type;   /* forward */
+
+#define CQ_SLOT(q, pos)  ((q)->cq_buffer +                              \
+                          ((pos) & ((q)->cq_size - 1)) * (q)->cq_stride)
+#define CQ_SEQ(slot)     (*(volatile size_t *)(slot))
+#define CQ_RECORD(slot)  ((slot) + CQ_ALIGN)
+
+static void invoke_queued_callback(ffi_cif *cif, void *result, void **args,
+                                   void *userdata)
+{
+    /* Called from C, maybe from a non-Python thread: must not touch
+       any Python object. */
+    CallbackQueueObject *q = (CallbackQueueObject *)userdata;
+    char *slot;
+    size_t pos, seq, old;
+    Py_ssize_t i;
+
+    if (q == NULL)       /* the callback object was cleared by the GC */
+        return;
+
+    pos = q->cq_enqueue_pos;
+    while (1) {
+        slot = CQ_SLOT(q, pos);
+        seq = cq_load_acquire(&CQ_SEQ(slot));
+        if (seq == pos) {
+            if (cq_compare_and_swap(&q->cq_enqueue_pos, pos, pos + 1))
+                break;
+        }
+        else if ((Py_ssize_t)(seq - pos) < 0) {
+            /* the ring buffer is full: drop this event */
+            do {
+                old = q->cq_dropped;
+            } while (!cq_compare_and_swap(&q->cq_dropped, old, old + 1));
+            return;
+        }
+        pos = q->cq_enqueue_pos;
+    }
+
+    for (i = 0; i < q->cq_nargs; i++) {
+        memcpy(CQ_RECORD(slot) + q->cq_args[i].offset, args[i],
+               q->cq_args[i].size);
+    }
+    cq_store_release(&CQ_SEQ(slot), pos + 1);     /* publish the record */
+
+    /* full barrier: the store above must be visible before we read
+       'cq_waiting', which wait() sets before checking the queue */
+    cq_barrier();
+    if (q->cq_waiting && cq_compare_and_swap(&q->cq_waiting, 1, 0))
+        PyThread_release_lock(q->cq_wakeup);
+}
+
+static int cq_pop(CallbackQueueObject *q, char *record)
+{
+    /* Copy the oldest record into 'record' and free its slot.
+       Returns 0 if the queue is empty. */
+    char *slot;
+    size_t pos, seq;
+
+    pos = q->cq_dequeue_pos;
+    while (1) {
+        slot = CQ_SLOT(q, pos);
+        seq = cq_load_acquire(&CQ_SEQ(slot));
+        if (seq == pos + 1) {
+            if (cq_compare_and_swap(&q->cq_dequeue_pos, pos, pos + 1))
+                break;
+        }
+        else if ((Py_ssize_t)(seq - (pos + 1)) < 0) {
+            return 0;
+        }
+        pos = q->cq_dequeue_pos;
+    }
+    memcpy(record, CQ_RECORD(slot), q->cq_recordsize);
+    cq_store_release(&CQ_SEQ(slot), pos + q->cq_size);  /* next round */
+    return 1;
+}
+
+static int cq_ready(CallbackQueueObject *q)
+{
+    size_t pos = q->cq_dequeue_pos;
+    return cq_load_acquire(&CQ_SEQ(CQ_SLOT(q, pos))) == pos + 1;
+}
+
+static PyObject *cq_decode(CallbackQueueObject *q, char *record)
+{
+    cif_description_t *cif_descr = (cif_description_t *)q->cq_ct->ct_extra;
+    PyObject *result, *x;
+    Py_ssize_t i;
+
+    result = PyTuple_New(q->cq_nargs);
+    if (result == NULL)
+        return NULL;
+    for (i = 0; i < q->cq_nargs; i++) {
+        char *data = record + q->cq_args[i].offset;
+        CTypeDescrObject *a_ct = q->cq_args[i].ct;
+        /* the record is reused: structs need a copy that owns its data */
+        if (a_ct->ct_flags & (CT_STRUCT | CT_UNION))
+            x = convert_struct_to_owning_object(data, a_ct);
+        else
+            x = cif_descr->callback_plan[i](data, a_ct);
+        if (x == NULL) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        PyTuple_SET_ITEM(result, i, x);
+    }
+    return result;
+}
+
+static PyObject *callback_queue_new(CTypeDescrObject *ct, Py_ssize_t size)
+{
+    CallbackQueueObject *q;
+    CTypeDescrObject *ctresult;
+    PyObject *cd;
+    Py_ssize_t i, nargs, length, align;
+    size_t offset;
+
+    if (!(ct->ct_flags & CT_FUNCTIONPTR)) {
+        PyErr_Format(PyExc_TypeError, "expected a function ctype, got '%s'",
+                     ct->ct_name);
+        return NULL;
+    }
+    if (ct->ct_extra == NULL) {
+        PyErr_Format(PyExc_NotImplementedError,
+                     "%s: callback with unsupported argument or "
+                     "return type or with '...'", ct->ct_name);
+        return NULL;
+    }
+    ctresult = (CTypeDescrObject *)PyTuple_GET_ITEM(ct->ct_stuff, 1);
+    if (!(ctresult->ct_flags & CT_VOID)) {
+        PyErr_Format(PyExc_TypeError,
+                     "%s: a callback queue needs a function type "
+                     "returning void", ct->ct_name);
+        return NULL;
+    }
+    if (size <= 0 || size > CQ_MAX_SIZE) {
+        PyErr_Format(PyExc_ValueError,
+                     "callback queue size must be between 1 and %zd",
+                     CQ_MAX_SIZE);
+        return NULL;
+    }
+    length = 1;
+    while (length < size)
+        length <<= 1;
+
+    q = PyObject_GC_New(CallbackQueueObject, &CallbackQueue_Type);
+    if (q == NULL)
+        return NULL;
+    Py_INCREF(ct);
+    q->cq_ct = ct;
+    q->cq_callback = NULL;
+    q->cq_buffer = NULL;
+    q->cq_size = length;
+    q->cq_enqueue_pos = 0;
+    q->cq_dequeue_pos = 0;
+    q->cq_dropped = 0;
+    q->cq_waiting = 0;
+    q->cq_in_wait = 0;
+    q->cq_wakeup = NULL;
+
+    nargs = PyTuple_GET_SIZE(ct->ct_stuff) - 2;
+    q->cq_nargs = nargs;
+    q->cq_args = PyMem_Malloc(sizeof(cq_arg_t) * (nargs > 0 ? nargs : 1));
+    if (q->cq_args == NULL) {
+        PyErr_NoMemory();
+        goto error;
+    }
+    offset = 0;
+    for (i = 0; i < nargs; i++) {
+        CTypeDescrObject *a_ct;
+        a_ct = (CTypeDescrObject *)PyTuple_GET_ITEM(ct->ct_stuff, 2 + i);
+        align = get_alignment(a_ct);
+        if (align < 0)
+            goto error;
+        offset = (offset + align - 1) & ~(size_t)(align - 1);
+        q->cq_args[i].offset = offset;
+        q->cq_args[i].size = a_ct->ct_size;
+        q->cq_args[i].ct = a_ct;
+        offset += a_ct->ct_size;
+    }
+    q->cq_recordsize = offset;
+    q->cq_stride = CQ_ALIGN + ((offset + CQ_ALIGN - 1) & ~(CQ_ALIGN - 1));
+
+    if ((size_t)length > ((size_t)PY_SSIZE_T_MAX) / q->cq_stride) {
+        PyErr_NoMemory();
+        goto error;
+    }
+    q->cq_buffer = malloc(length * q->cq_stride);
+    if (q->cq_buffer == NULL) {
+        PyErr_NoMemory();
+        goto error;
+    }
+    for (i = 0; i < length; i++)
+        CQ_SEQ(CQ_SLOT(q, (size_t)i)) = i;
+
+    q->cq_wakeup = PyThread_allocate_lock();
+    if (q->cq_wakeup == NULL) {
+        PyErr_SetString(PyExc_SystemError, "can't allocate lock");
+        goto error;
+    }
+    PyThread_acquire_lock(q->cq_wakeup, WAIT_LOCK);
+
+    /* the callback owns a reference to the queue, and the queue owns
+       the callback: the cycle is broken by the GC */
+    Py_INCREF(q);
+    cd = new_closure_cdata(ct, invoke_queued_callback, (PyObject *)q);
+    if (cd == NULL)
+        goto error;
+    q->cq_callback = cd;
+    PyObject_GC_Track(q);
+    return (PyObject *)q;
+
+ error:
+    Py_DECREF(q);
+    return NULL;
+}
+
+static void callbackqueue_dealloc(CallbackQueueObject *q)
+{
+    PyObject_GC_UnTrack(q);
+    Py_XDECREF(q->cq_callback);
+    Py_DECREF(q->cq_ct);
+    if (q->cq_wakeup != NULL) {
+        PyThread_release_lock(q->cq_wakeup);
+        PyThread_free_lock(q->cq_wakeup);
+    }
+    free(q->cq_buffer);
+    PyMem_Free(q->cq_args);
+    PyObject_GC_Del(q);
+}
+
+static int callbackqueue_traverse(CallbackQueueObject *q, visitproc visit,
+                                  void *arg)
+{
+    Py_VISIT(q->cq_callback);
+    return 0;
+}
+
+static int callbackqueue_clear(CallbackQueueObject *q)
+{
+    Py_CLEAR(q->cq_callback);
+    return 0;
+}
+
+static PyObject *callbackqueue_repr(CallbackQueueObject *q)
+{
+    return PyText_FromFormat("<_cffi_backend.CallbackQueue for '%s'>",
+                             q->cq_ct->ct_name);
+}
+
+PyDoc_STRVAR(callbackqueue_drain_doc,
+"Remove up to 'maxcount' events from the queue (all of them if\n"
+"'maxcount' is negative) and return them as a list of tuples of\n"
+"arguments, oldest first.  Never blocks.");
+
+static PyObject *callbackqueue_drain(CallbackQueueObject *q, PyObject *args,
+                                     PyObject *kwds)
+{
+    Py_ssize_t maxcount = -1, count = 0;
+    PyObject *result, *x;
+    char *record;
+    static char *keywords[] = {"maxcount", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|n:drain", keywords,
+                                     &maxcount))
+        return NULL;
+
+    result = PyList_New(0);
+    if (result == NULL)
+        return NULL;
+    /* decoding can run arbitrary Python code (e.g. through the GC), so
+       each record is first copied out of the ring buffer */
+    record = PyMem_Malloc(q->cq_recordsize > 0 ? q->cq_recordsize : 1);
+    if (record == NULL) {
+        Py_DECREF(result);
+        return PyErr_NoMemory();
+    }
+    while (count != maxcount && cq_pop(q, record)) {
+        x = cq_decode(q, record);
+        if (x == NULL || PyList_Append(result, x) < 0) {
+            Py_XDECREF(x);
+            Py_CLEAR(result);
+            break;
+        }
+        Py_DECREF(x);
+        count++;
+    }
+    PyMem_Free(record);
+    return result;
+}
+
+PyDoc_STRVAR(callbackqueue_wait_doc,
+"Block until the queue is not empty, or until 'timeout' seconds have\n"
+"passed.  Returns True if there are events to drain.  Only one thread\n"
+"at a time can wait on a given queue.  From asyncio, use for example\n"
+"'await loop.run_in_executor(None, queue.wait, timeout)'.");
+
+static PyObject *callbackqueue_wait(CallbackQueueObject *q, PyObject *args,
+                                    PyObject *kwds)
+{
+    PyObject *timeout_ob = Py_None;
+    double timeout = -1.0;
+    int got;
+    static char *keywords[] = {"timeout", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|O:wait", keywords,
+                                     &timeout_ob))
+        return NULL;
+    if (timeout_ob != Py_None) {
+        timeout = PyFloat_AsDouble(timeout_ob);
+        if (timeout == -1.0 && PyErr_Occurred())
+            return NULL;
+        if (timeout < 0.0) {
+            PyErr_SetString(PyExc_ValueError, "negative timeout");
+            return NULL;
+        }
+    }
+    if (cq_ready(q))
+        Py_RETURN_TRUE;
+    if (timeout == 0.0)
+        Py_RETURN_FALSE;
+#if PY_MAJOR_VERSION < 3
+    if (timeout > 0.0) {
+        PyErr_SetString(PyExc_NotImplementedError,
+                        "wait() with a timeout requires Python 3");
+        return NULL;
+    }
+#endif
+    if (q->cq_in_wait) {
+        PyErr_SetString(PyExc_RuntimeError,
+                        "another thread is already waiting on this queue");
+        return NULL;
+    }
+
+    q->cq_in_wait = 1;
+    q->cq_waiting = 1;
+    cq_barrier();
+    got = 0;
+    if (!cq_ready(q)) {
+#if PY_MAJOR_VERSION >= 3
+        PY_TIMEOUT_T microseconds = -1;
+        if (timeout >= 0.0) {
+            if (timeout * 1e6 >= (double)PY_TIMEOUT_MAX)
+                microseconds = PY_TIMEOUT_MAX;
+            else
+                microseconds = (PY_TIMEOUT_T)(timeout * 1e6);
+        }
+        Py_BEGIN_ALLOW_THREADS
+        got = PyThread_acquire_lock_timed(q->cq_wakeup, microseconds, 0)
+                  == PY_LOCK_ACQUIRED;
+        Py_END_ALLOW_THREADS
+#else
+        Py_BEGIN_ALLOW_THREADS
+        got = PyThread_acquire_lock(q->cq_wakeup, WAIT_LOCK);
+        Py_END_ALLOW_THREADS
+#endif
+    }
+    if (!got && !cq_compare_and_swap(&q->cq_waiting, 1, 0)) {
+        /* a producer cleared 'cq_waiting' and is about to release the
+           lock: wait for that, to leave it in the acquired state */
+        Py_BEGIN_ALLOW_THREADS
+        PyThread_acquire_lock(q->cq_wakeup, WAIT_LOCK);
+        Py_END_ALLOW_THREADS
+    }
+    q->cq_in_wait = 0;
+    return PyBool_FromLong(cq_ready(q));
+}
+
+static PyObject *callbackqueue_get_pending(CallbackQueueObject *q,
+                                           void *context)
+{
+    size_t pending = q->cq_enqueue_pos - q->cq_dequeue_pos;
+    if ((Py_ssize_t)pending < 0)
+        pending = 0;
+    return PyInt_FromSsize_t((Py_ssize_t)pending);
+}
+
+static PyObject *callbackqueue_get_dropped(CallbackQueueObject *q,
+                                           void *context)
+{
+    return PyLong_FromSize_t(q->cq_dropped);
+}
+
+static PyMethodDef callbackqueue_methods[] = {
+    {"drain", (PyCFunction)callbackqueue_drain, METH_VARARGS | METH_KEYWORDS,
+                                                callbackqueue_drain_doc},
+    {"wait",  (PyCFunction)callbackqueue_wait,  METH_VARARGS | METH_KEYWORDS,
+                                                callbackqueue_wait_doc},
+    {NULL,    NULL}           /* sentinel */
+};
+
+static PyMemberDef callbackqueue_members[] = {
+    {"callback", T_OBJECT, offsetof(CallbackQueueObject, cq_callback),
+     READONLY, "the callback <cdata> to give to the C code"},
+    {"size", T_PYSSIZET, offsetof(CallbackQueueObject, cq_size), READONLY,
+     "maximum number of events in the queue"},
+    {NULL}
+};
+
+static PyGetSetDef callbackqueue_getsets[] = {
+    {"pending", (getter)callbackqueue_get_pending, NULL,
+     "approximate number of events waiting to be drained"},
+    {"dropped", (getter)callbackqueue_get_dropped, NULL,
+     "number of events dropped so far because the queue was full"},
+    {NULL}
+};
+
+static PyTypeObject CallbackQueue_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_backend.CallbackQueue",
+    sizeof(CallbackQueueObject),
+    0,
+    (destructor)callbackqueue_dealloc,          /* tp_dealloc */
+    0,                                          /* tp_print */
+    0,                                          /* tp_getattr */
+    0,                                          /* tp_setattr */
+    0,                                          /* tp_compare */
+    (reprfunc)callbackqueue_repr,               /* tp_repr */
+    0,                                          /* tp_as_number */
+    0,                                          /* tp_as_sequence */
+    0,                                          /* tp_as_mapping */
+    0,                                          /* tp_hash */
+    0,                                          /* tp_call */
+    0,                                          /* tp_str */
+    PyObject_GenericGetAttr,                    /* tp_getattro */
+    0,                                          /* tp_setattro */
+    0,                                          /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,    /* tp_flags */
+    0,                                          /* tp_doc */
+    (traverseproc)callbackqueue_traverse,       /* tp_traverse */
+    (inquiry)callbackqueue_clear,               /* tp_clear */
+    0,                                          /* tp_richcompare */
+    0,                                          /* tp_weaklistoffset */
+    0,                                          /* tp_iter */
+    0,                                          /* tp_iternext */
+    callbackqueue_methods,                      /* tp_methods */
+    callbackqueue_members,                      /* tp_members */
+    callbackqueue_getsets,                      /* tp_getset */
+};
+
+static PyObject *b_callback_queue(PyObject *self, PyObject *args)
+{
+    CTypeDescrObject *ct;
+    Py_ssize_t size;
+
+    if (!PyArg_ParseTuple(args, "O!n:callback_queue", &CTypeDescr_Type, &ct,
+                          &size))
+        return NULL;
+    return callback_queue_new(ct, size);
+}
+
+#undef CQ_SLOT
+#undef CQ_SEQ
+#undef CQ_RECORD
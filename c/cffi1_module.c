@@ -4,7 +4,8 @@
 
 #define CFFI_VERSION_MIN            0x2601
 #define CFFI_VERSION_CHAR16CHAR32   0x2801
-#define CFFI_VERSION_MAX            0x28FF
+#define CFFI_VERSION_FASTCALL       0x2901
+#define CFFI_VERSION_MAX            0x29FF
 
 typedef struct FFIObject_s FFIObject;
 typedef struct LibObject_s LibObject;
@@ -13,6 +14,8 @@ static PyTypeObject FFI_Type;   /* forward */
 static PyTypeObject Lib_Type;   /* forward */
 
 #include "ffi_obj.c"
+#include "arena.c"
+#include "callback_queue.c"
 #include "cglob.c"
 #include "lib_obj.c"
 #include "cdlopen.c"
@@ -164,6 +167,14 @@ static PyObject *b_init_cffi_1_0_external_module(PyObject *self, PyObject *arg)
                 module_name, (void *)version, CFFI_VERSION);
         return NULL;
     }
+#if PY_VERSION_HEX < 0x03070000
+    if (version >= CFFI_VERSION_FASTCALL) {
+        PyErr_Format(PyExc_ImportError,
+            "cffi extension module '%s' uses METH_FASTCALL functions, "
+            "which require CPython >= 3.7", module_name);
+        return NULL;
+    }
+#endif
 
     /* initialize the exports array */
     num_exports = 25;
@@ -171,6 +182,8 @@ static PyObject *b_init_cffi_1_0_external_module(PyObject *self, PyObject *arg)
         num_exports = 26;
     if (version >= CFFI_VERSION_CHAR16CHAR32)
         num_exports = 28;
+    if (ctx->flags & 2)    /* set to mean that there is room for 30 */
+        num_exports = 30;
     memcpy(exports, (char *)cffi_exports, num_exports * sizeof(void *));
 
     /* make the module object */
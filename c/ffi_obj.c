@@ -364,6 +364,7 @@ static PyObject *_ffi_new_with_allocator(PyObject *allocator, PyObject *args,
     alloc1.ca_alloc = (my_alloc == Py_None ? NULL : my_alloc);
     alloc1.ca_free  = (my_free  == Py_None ? NULL : my_free);
     alloc1.ca_dont_clear = (PyTuple_GET_ITEM(allocator, 3) == Py_False);
+    allocator_find_c_functions(&alloc1);
 
     return _ffi_new((FFIObject *)PyTuple_GET_ITEM(allocator, 0),
                     args, kwds, &alloc1);
@@ -377,6 +378,8 @@ PyDoc_STRVAR(ffi_new_allocator_doc,
 "MemoryError is raised.  'free' is called with the result of 'alloc'\n"
 "as argument.  Both can be either Python functions or directly C\n"
 "functions.  If 'free' is None, then no free function is called.\n"
+"C functions of type 'void *(size_t)' and 'void(void *)' are called\n"
+"directly, without going through Python.\n"
 "If both 'alloc' and 'free' are None, the default is used.\n"
 "\n"
 "If 'should_clear_after_alloc' is set to False, then the memory\n"
@@ -419,6 +422,55 @@ static PyObject *ffi_new_allocator(FFIObject *self, PyObject *args,
     return result;
 }
 
+static PyObject *arena_new_object(FFIObject *ffi, Py_ssize_t size);
+                                                    /* forward, arena.c */
+
+PyDoc_STRVAR(ffi_arena_doc,
+"Return a new arena of 'size' bytes.  'arena.new(cdecl, init=None)'\n"
+"behaves like ffi.new(), but allocates the memory inside the arena's\n"
+"single block, and the result does not own its memory.  All this memory\n"
+"is released together by 'with arena:' or 'arena.release()', after\n"
+"which the cdata objects from 'arena.new()' must not be used any more.");
+
+static PyObject *ffi_arena(FFIObject *self, PyObject *args, PyObject *kwds)
+{
+    Py_ssize_t size;
+    static char *keywords[] = {"size", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "n:arena", keywords, &size))
+        return NULL;
+    return arena_new_object(self, size);
+}
+
+static PyObject *callback_queue_new(CTypeDescrObject *ct, Py_ssize_t size);
+                                           /* forward, callback_queue.c */
+
+PyDoc_STRVAR(ffi_callback_queue_doc,
+"Return a queue of up to 'size' events, with a callback object\n"
+"'queue.callback' of the C function pointer type 'cdecl', which must\n"
+"return void.  Calling the callback from C does not take the GIL: it\n"
+"only records a copy of the arguments.  'queue.drain()' returns the\n"
+"recorded calls as a list of tuples of arguments, and 'queue.wait()'\n"
+"blocks until there is something to drain.  The queue must be kept\n"
+"alive for as long as the callback may be invoked from the C code.");
+
+static PyObject *ffi_callback_queue(FFIObject *self, PyObject *args,
+                                    PyObject *kwds)
+{
+    PyObject *c_decl;
+    Py_ssize_t size = 1024;
+    static char *keywords[] = {"cdecl", "size", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|n:callback_queue",
+                                     keywords, &c_decl, &size))
+        return NULL;
+
+    c_decl = (PyObject *)_ffi_type(self, c_decl, ACCEPT_STRING | ACCEPT_CTYPE |
+                                                 CONSIDER_FN_AS_FNPTR);
+    if (c_decl == NULL)
+        return NULL;
+    return callback_queue_new((CTypeDescrObject *)c_decl, size);
+}
+
 PyDoc_STRVAR(ffi_cast_doc,
 "Similar to a C cast: returns an instance of the named C\n"
 "type initialized with the given 'source'.  The source is\n"
@@ -475,6 +527,47 @@ PyDoc_STRVAR(ffi_unpack_doc,
 #define ffi_unpack  b_unpack     /* ffi_unpack() => b_unpack()
                                     from _cffi_backend.c */
 
+PyDoc_STRVAR(ffi_unpack_fields_doc,
+"Unpack some fields of an array of structs of the given length,\n"
+"returning one list per field name.  'cdata' must be a pointer or\n"
+"array of struct or union.  This is a faster equivalent to:\n"
+"[[cdata[i].name for i in range(length)] for name in fieldnames]");
+
+#define ffi_unpack_fields  b_unpack_fields  /* ffi_unpack_fields() =>
+                                               b_unpack_fields()
+                                               from _cffi_backend.c */
+
+PyDoc_STRVAR(ffi_pack_into_doc,
+"Fill the array of structs 'cdata' from Python data, in a single loop.\n"
+"If 'fieldnames' is None, 'data' is a sequence of records, each being a\n"
+"list, tuple or dict as accepted by ffi.new() for one struct.  This is\n"
+"equivalent to: for i, record in enumerate(data): cdata[i] = record\n"
+"\n"
+"Otherwise, 'data' is a sequence of columns, one per name in\n"
+"'fieldnames', all of the same length; only these fields are written.\n"
+"A column can be a cdata array of exactly the field's type, which is\n"
+"then copied without conversion.");
+
+#define ffi_pack_into  b_pack_into     /* ffi_pack_into() => b_pack_into()
+                                          from _cffi_backend.c */
+
+
+PyDoc_STRVAR(ffi_call_many_doc,
+"Call the C function 'func' once per row of arguments, in a loop\n"
+"written in C.  Takes one sequence per argument of 'func', all of the\n"
+"same length N.  Returns a list of the N results, or None if 'func'\n"
+"returns void.\n"
+"\n"
+"A sequence that is a cdata array of exactly the argument's type is\n"
+"read directly, without converting its items to and from Python.  If\n"
+"'out' is given, it must be an array or pointer to the result type of\n"
+"'func'; the results are written there and 'out' is returned.  If all\n"
+"sequences are such arrays and the results go to 'out' (or 'func'\n"
+"returns void), the whole loop runs without the GIL.");
+
+#define ffi_call_many  b_call_many     /* ffi_call_many() => b_call_many()
+                                          from _cffi_backend.c */
+
 
 PyDoc_STRVAR(ffi_offsetof_doc,
 "Return the offset of the named field inside the given structure or\n"
@@ -805,22 +898,32 @@ static PyObject *ffi_callback(FFIObject *self, PyObject *args, PyObject *kwds)
     if (c_decl == NULL)
         return NULL;
 
-    args = Py_BuildValue("(OOOO)", c_decl, python_callable, error, onerror);
-    if (args == NULL)
-        return NULL;
-
     if (python_callable != Py_None) {
-        res = b_callback(NULL, args);
+        return new_callback((CTypeDescrObject *)c_decl, python_callable,
+                            error, onerror);
     }
     else {
         static PyMethodDef md = {"callback_decorator",
                                  (PyCFunction)_ffi_callback_decorator, METH_O};
+        args = Py_BuildValue("(OOOO)", c_decl, python_callable, error, onerror);
+        if (args == NULL)
+            return NULL;
         res = PyCFunction_New(&md, args);
+        Py_DECREF(args);
+        return res;
     }
-    Py_DECREF(args);
-    return res;
 }
 
+PyDoc_STRVAR(ffi_reserve_callbacks_doc,
+"Make sure that at least 'n' more callbacks can be created without\n"
+"allocating more executable memory, and keep at least that many free\n"
+"slots allocated afterwards.  ffi.reserve_callbacks(0) lets the unused\n"
+"memory be released again.");
+
+#define ffi_reserve_callbacks  b_reserve_callbacks  /* ffi_reserve_callbacks()
+                                      => b_reserve_callbacks()
+                                      from _cffi_backend.c */
+
 #ifdef MS_WIN32
 PyDoc_STRVAR(ffi_getwinerror_doc,
 "Return either the GetLastError() or the error number given by the\n"
@@ -1102,8 +1205,12 @@ PyDoc_STRVAR(ffi_release_doc,
 static PyMethodDef ffi_methods[] = {
  {"addressof",  (PyCFunction)ffi_addressof,  METH_VARARGS, ffi_addressof_doc},
  {"alignof",    (PyCFunction)ffi_alignof,    METH_O,       ffi_alignof_doc},
+ {"arena",      (PyCFunction)ffi_arena,      METH_VKW,     ffi_arena_doc},
  {"def_extern", (PyCFunction)ffi_def_extern, METH_VKW,     ffi_def_extern_doc},
  {"callback",   (PyCFunction)ffi_callback,   METH_VKW,     ffi_callback_doc},
+ {"callback_queue", (PyCFunction)ffi_callback_queue, METH_VKW,
+                    ffi_callback_queue_doc},
+ {"call_many",  (PyCFunction)ffi_call_many,  METH_VKW,     ffi_call_many_doc},
  {"cast",       (PyCFunction)ffi_cast,       METH_VARARGS, ffi_cast_doc},
  {"dlclose",    (PyCFunction)ffi_dlclose,    METH_VARARGS, ffi_dlclose_doc},
  {"dlopen",     (PyCFunction)ffi_dlopen,     METH_VARARGS, ffi_dlopen_doc},
@@ -1122,11 +1229,15 @@ static PyMethodDef ffi_methods[] = {
 {"new_allocator",(PyCFunction)ffi_new_allocator,METH_VKW,ffi_new_allocator_doc},
  {"new_handle", (PyCFunction)ffi_new_handle, METH_O,       ffi_new_handle_doc},
  {"offsetof",   (PyCFunction)ffi_offsetof,   METH_VARARGS, ffi_offsetof_doc},
+ {"pack_into",  (PyCFunction)ffi_pack_into,  METH_VKW,     ffi_pack_into_doc},
  {"release",    (PyCFunction)ffi_release,    METH_O,       ffi_release_doc},
+ {"reserve_callbacks", (PyCFunction)ffi_reserve_callbacks, METH_O,
+                       ffi_reserve_callbacks_doc},
  {"sizeof",     (PyCFunction)ffi_sizeof,     METH_O,       ffi_sizeof_doc},
  {"string",     (PyCFunction)ffi_string,     METH_VKW,     ffi_string_doc},
  {"typeof",     (PyCFunction)ffi_typeof,     METH_O,       ffi_typeof_doc},
  {"unpack",     (PyCFunction)ffi_unpack,     METH_VKW,     ffi_unpack_doc},
+{"unpack_fields",(PyCFunction)ffi_unpack_fields,METH_VKW,ffi_unpack_fields_doc},
  {NULL}
 };
 
@@ -288,6 +288,12 @@ static PyObject *lib_build_and_cache_attr(LibObject *lib, PyObject *name,
         x = lib_build_cpython_func(lib, g, s, METH_O);
         break;
 
+#if PY_VERSION_HEX >= 0x03070000
+    case _CFFI_OP_CPYTHON_BLTN_F:
+        x = lib_build_cpython_func(lib, g, s, METH_FASTCALL);
+        break;
+#endif
+
     case _CFFI_OP_CONSTANT_INT:
     case _CFFI_OP_ENUM:
     {
@@ -62,17 +62,23 @@ emutramp_enabled_check (void)
 #endif
 
 
-/* 'allocate_num_pages' is dynamically adjusted starting from one
-   page.  It grows by a factor of PAGE_ALLOCATION_GROWTH_RATE.  This is
-   meant to handle both the common case of not needing a lot of pages,
-   and the rare case of needing many of them.  Systems in general have a
-   limit of how many mmap'd blocks can be open.
+/* The number of pages to allocate is dynamically adjusted starting
+   from one page.  The total grows by a factor of
+   PAGE_ALLOCATION_GROWTH_RATE.  This is meant to handle both the common
+   case of not needing a lot of pages, and the rare case of needing many
+   of them.  Systems in general have a limit of how many mmap'd blocks
+   can be open.
+
+   Each mmap'd block is a "chunk" with its own free list.  The chunks are
+   kept in an array sorted by address, so that cffi_closure_free() can
+   find the chunk of an item.  When all the items of a chunk are free
+   again, the chunk is unmapped if there are enough other free items:
+   at least one, and at least 'closure_reserved' (see
+   cffi_closure_reserve()).
 */
 
 #define PAGE_ALLOCATION_GROWTH_RATE  1.3
 
-static Py_ssize_t allocate_num_pages = 0;
-
 /* #define MALLOC_CLOSURE_DEBUG */ /* enable for some debugging output */
 
 /******************************************************************/
@@ -82,13 +88,28 @@ union mmaped_block {
     union mmaped_block *next;
 };
 
-static union mmaped_block *free_list = 0;
+struct closure_chunk_s {
+    union mmaped_block *items;      /* start of the mmap'd block */
+    union mmaped_block *free_list;
+    Py_ssize_t count, num_free;
+    Py_ssize_t num_pages;
+};
+
+static struct closure_chunk_s *closure_chunks = NULL;   /* sorted array */
+static Py_ssize_t closure_num_chunks = 0, closure_chunks_allocated = 0;
 static Py_ssize_t _pagesize = 0;
 
-static void more_core(void)
+/* statistics */
+static Py_ssize_t closure_num_free = 0;     /* in all chunks */
+static Py_ssize_t closure_in_use = 0, closure_peak = 0;
+static Py_ssize_t closure_pages_mapped = 0;
+static Py_ssize_t closure_reserved = 0;
+
+static int more_core(void)
 {
     union mmaped_block *item;
-    Py_ssize_t count, i;
+    struct closure_chunk_s *chunk;
+    Py_ssize_t allocate_num_pages, count, i;
 
 /* determine the pagesize */
 #ifdef MS_WIN32
@@ -109,9 +130,18 @@ static void more_core(void)
     if (_pagesize <= 0)
         _pagesize = 4096;
 
-    /* bump 'allocate_num_pages' */
-    allocate_num_pages = 1 + (
-        (Py_ssize_t)(allocate_num_pages * PAGE_ALLOCATION_GROWTH_RATE));
+    if (closure_num_chunks == closure_chunks_allocated) {
+        Py_ssize_t newsize = closure_chunks_allocated * 2 + 8;
+        chunk = realloc(closure_chunks, newsize * sizeof(*chunk));
+        if (chunk == NULL)
+            return -1;
+        closure_chunks = chunk;
+        closure_chunks_allocated = newsize;
+    }
+
+    /* grow the total number of pages by PAGE_ALLOCATION_GROWTH_RATE */
+    allocate_num_pages = 1 + (Py_ssize_t)(
+        closure_pages_mapped * (PAGE_ALLOCATION_GROWTH_RATE - 1.0));
 
     /* calculate the number of mmaped_blocks to allocate */
     count = (allocate_num_pages * _pagesize) / sizeof(union mmaped_block);
@@ -123,7 +153,7 @@ static void more_core(void)
                                            MEM_COMMIT,
                                            PAGE_EXECUTE_READWRITE);
     if (item == NULL)
-        return;
+        return -1;
 #else
     {
     int prot = PROT_READ | PROT_WRITE | PROT_EXEC;
@@ -136,7 +166,7 @@ static void more_core(void)
                         -1,
                         0);
     if (item == (void *)MAP_FAILED)
-        return;
+        return -1;
     }
 #endif
 
@@ -144,33 +174,125 @@ static void more_core(void)
     printf("block at %p allocated (%ld bytes), %ld mmaped_blocks\n",
            item, (long)(allocate_num_pages * _pagesize), (long)count);
 #endif
+    /* insert the new chunk, keeping the array sorted */
+    for (i = closure_num_chunks; i > 0; i--) {
+        if (closure_chunks[i - 1].items < item)
+            break;
+        closure_chunks[i] = closure_chunks[i - 1];
+    }
+    chunk = &closure_chunks[i];
+    closure_num_chunks++;
+    chunk->items = item;
+    chunk->free_list = NULL;
+    chunk->count = count;
+    chunk->num_free = count;
+    chunk->num_pages = allocate_num_pages;
+    closure_num_free += count;
+    closure_pages_mapped += allocate_num_pages;
+
     /* put them into the free list */
     for (i = 0; i < count; ++i) {
-        item->next = free_list;
-        free_list = item;
+        item->next = chunk->free_list;
+        chunk->free_list = item;
         ++item;
     }
+    return 0;
+}
+
+static void release_chunk(Py_ssize_t index)
+{
+    struct closure_chunk_s *chunk = &closure_chunks[index];
+
+#ifdef MALLOC_CLOSURE_DEBUG
+    printf("block at %p released\n", chunk->items);
+#endif
+#ifdef MS_WIN32
+    VirtualFree(chunk->items, 0, MEM_RELEASE);
+#else
+    munmap(chunk->items, chunk->num_pages * _pagesize);
+#endif
+    closure_num_free -= chunk->count;
+    closure_pages_mapped -= chunk->num_pages;
+    closure_num_chunks--;
+    memmove(chunk, chunk + 1,
+            (closure_num_chunks - index) * sizeof(struct closure_chunk_s));
 }
 
 /******************************************************************/
 
-/* put the item back into the free list */
+/* put the item back into the free list of its chunk */
 static void cffi_closure_free(ffi_closure *p)
 {
     union mmaped_block *item = (union mmaped_block *)p;
-    item->next = free_list;
-    free_list = item;
+    struct closure_chunk_s *chunk;
+    Py_ssize_t lo = 0, hi = closure_num_chunks;
+
+    /* find the last chunk that starts at or before 'item' */
+    while (hi - lo > 1) {
+        Py_ssize_t mid = (lo + hi) / 2;
+        if (closure_chunks[mid].items <= item)
+            lo = mid;
+        else
+            hi = mid;
+    }
+    chunk = &closure_chunks[lo];
+    assert(chunk->items <= item && item < chunk->items + chunk->count);
+
+    item->next = chunk->free_list;
+    chunk->free_list = item;
+    chunk->num_free++;
+    closure_num_free++;
+    closure_in_use--;
+
+    if (chunk->num_free == chunk->count &&
+            closure_num_free - chunk->count > 0 &&
+            closure_num_free - chunk->count >= closure_reserved)
+        release_chunk(lo);
 }
 
 /* return one item from the free list, allocating more if needed */
 static ffi_closure *cffi_closure_alloc(void)
 {
     union mmaped_block *item;
-    if (!free_list)
-        more_core();
-    if (!free_list)
+    struct closure_chunk_s *chunk;
+    Py_ssize_t i;
+
+    if (closure_num_free == 0 && more_core() < 0)
         return NULL;
-    item = free_list;
-    free_list = item->next;
+
+    /* take from the chunk with the lowest address, so that the chunks
+       at higher addresses have a chance to become completely free */
+    for (i = 0; closure_chunks[i].num_free == 0; i++)
+        ;
+    chunk = &closure_chunks[i];
+    item = chunk->free_list;
+    chunk->free_list = item->next;
+    chunk->num_free--;
+    closure_num_free--;
+    closure_in_use++;
+    if (closure_in_use > closure_peak)
+        closure_peak = closure_in_use;
     return &item->closure;
 }
+
+/* make sure that at least 'n' items are free, and keep at least that
+   many of them mapped in the future; release the completely free chunks
+   that are not needed for that */
+static int cffi_closure_reserve(Py_ssize_t n)
+{
+    Py_ssize_t i;
+
+    closure_reserved = n;
+    while (closure_num_free < n) {
+        if (more_core() < 0)
+            return -1;
+    }
+    for (i = closure_num_chunks - 1; i >= 0; i--) {
+        struct closure_chunk_s *chunk = &closure_chunks[i];
+        if (chunk->num_free == chunk->count &&
+                closure_num_free - chunk->count > 0 &&
+                closure_num_free - chunk->count >= closure_reserved)
+            release_chunk(i);
+    }
+    return 0;
+}
@@ -11,6 +11,10 @@ typedef struct {
     Py_ssize_t mb_size;
     PyObject  *mb_keepalive;
     PyObject  *mb_weakreflist;    /* weakref support */
+    CTypeDescrObject *mb_itemtype;  /* for typed exports, or NULL */
+    Py_ssize_t mb_nitems;           /* mb_size / mb_itemtype->ct_size */
+    Py_ssize_t mb_itemsize;         /* mb_itemtype->ct_size, for 'strides' */
+    PyObject  *mb_format;           /* lazily: PEP 3118 format, or None */
 } MiniBufferObj;
 
 static Py_ssize_t mb_length(MiniBufferObj *self)
@@ -108,8 +112,37 @@ static PyObject *mb_str(MiniBufferObj *self)
 }
 #endif
 
+/* forward: from _cffi_backend.c */
+static PyObject *_ctype_buffer_format(CTypeDescrObject *ct);
+
 static int mb_getbuf(MiniBufferObj *self, Py_buffer *view, int flags)
 {
+    /* For a buffer made with 'typed=True', if the consumer asks for the
+       format and shape, we describe the items of the array, e.g. as
+       'nitems' items of format 'd'.  Otherwise, or if the items have no
+       PEP 3118 format (e.g. chars), we export 'mb_size' unsigned bytes. */
+    if ((flags & PyBUF_FORMAT) && (flags & PyBUF_ND) == PyBUF_ND &&
+            self->mb_itemtype != NULL) {
+        if (self->mb_format == NULL) {
+            self->mb_format = _ctype_buffer_format(self->mb_itemtype);
+            if (self->mb_format == NULL)
+                return -1;
+        }
+        if (self->mb_format != Py_None) {
+            if (PyBuffer_FillInfo(view, (PyObject *)self,
+                                  self->mb_data, self->mb_size,
+                                  /*readonly=*/0, flags) < 0)
+                return -1;
+            view->format = PyBytes_AS_STRING(self->mb_format);
+            view->itemsize = self->mb_itemsize;
+            /* 'shape' and 'strides' must not point inside 'view',
+               which the consumer may copy */
+            view->shape = &self->mb_nitems;
+            if ((flags & PyBUF_STRIDES) == PyBUF_STRIDES)
+                view->strides = &self->mb_itemsize;
+            return 0;
+        }
+    }
     return PyBuffer_FillInfo(view, (PyObject *)self,
                              self->mb_data, self->mb_size,
                              /*readonly=*/0, flags);
@@ -143,6 +176,8 @@ mb_dealloc(MiniBufferObj *ob)
     if (ob->mb_weakreflist != NULL)
         PyObject_ClearWeakRefs((PyObject *)ob);
     Py_XDECREF(ob->mb_keepalive);
+    Py_XDECREF(ob->mb_itemtype);
+    Py_XDECREF(ob->mb_format);
     Py_TYPE(ob)->tp_free((PyObject *)ob);
 }
 
@@ -150,6 +185,7 @@ static int
 mb_traverse(MiniBufferObj *ob, visitproc visit, void *arg)
 {
     Py_VISIT(ob->mb_keepalive);
+    Py_VISIT(ob->mb_itemtype);
     return 0;
 }
 
@@ -157,6 +193,7 @@ static int
 mb_clear(MiniBufferObj *ob)
 {
     Py_CLEAR(ob->mb_keepalive);
+    Py_CLEAR(ob->mb_itemtype);
     return 0;
 }
 
@@ -327,7 +364,7 @@ static PyMappingMethods mb_as_mapping = {
 #endif
 
 PyDoc_STRVAR(ffi_buffer_doc,
-"ffi.buffer(cdata[, byte_size]):\n"
+"ffi.buffer(cdata[, byte_size][, typed=False]):\n"
 "Return a read-write buffer object that references the raw C data\n"
 "pointed to by the given 'cdata'.  The 'cdata' must be a pointer or an\n"
 "array.  Can be passed to functions expecting a buffer, or directly\n"
@@ -336,7 +373,12 @@ PyDoc_STRVAR(ffi_buffer_doc,
 "    buf[:]          get a copy of it in a regular string, or\n"
 "    buf[idx]        as a single character\n"
 "    buf[:] = ...\n"
-"    buf[idx] = ...  change the content");
+"    buf[idx] = ...  change the content\n"
+"\n"
+"With 'typed=True', consumers of the buffer protocol that ask for a\n"
+"format, like memoryview() or numpy.asarray(), see the items of the C\n"
+"array with their PEP 3118 format, e.g. 'd' for an array of doubles,\n"
+"instead of bytes.");
 
 static PyObject *            /* forward, implemented in _cffi_backend.c */
 b_buffer_new(PyTypeObject *type, PyObject *args, PyObject *kwds);
@@ -394,7 +436,8 @@ static PyTypeObject MiniBuffer_Type = {
 };
 
 static PyObject *minibuffer_new(char *data, Py_ssize_t size,
-                                PyObject *keepalive)
+                                PyObject *keepalive,
+                                CTypeDescrObject *itemtype)
 {
     MiniBufferObj *ob = PyObject_GC_New(MiniBufferObj, &MiniBuffer_Type);
     if (ob != NULL) {
@@ -402,6 +445,19 @@ static PyObject *minibuffer_new(char *data, Py_ssize_t size,
         ob->mb_size = size;
         ob->mb_keepalive = keepalive; Py_INCREF(keepalive);
         ob->mb_weakreflist = NULL;
+        /* only whole arrays of items can be exported as typed buffers */
+        if (itemtype != NULL && itemtype->ct_size > 0 &&
+                size % itemtype->ct_size == 0) {
+            ob->mb_itemtype = itemtype; Py_INCREF(itemtype);
+            ob->mb_nitems = size / itemtype->ct_size;
+            ob->mb_itemsize = itemtype->ct_size;
+        }
+        else {
+            ob->mb_itemtype = NULL;
+            ob->mb_nitems = 0;
+            ob->mb_itemsize = 0;
+        }
+        ob->mb_format = NULL;
         PyObject_GC_Track(ob);
     }
     return (PyObject *)ob;
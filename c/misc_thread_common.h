@@ -10,6 +10,13 @@ struct cffi_tls_s {
        thread had already a thread state provided by CPython. */
     struct thread_canary_s *local_thread_canary;
 
+    /* The PyThreadState bound to this thread by cffi_thread_attach(),
+       or NULL.  While it is set, callbacks in this thread only need to
+       acquire the GIL with it.  'attach_count' counts the nested calls
+       to cffi_thread_attach(). */
+    PyThreadState *attached_tstate;
+    int attach_count;
+
 #ifndef USE__THREAD
     /* The saved errno.  If the C compiler supports '__thread', then
        we use that instead. */
@@ -24,6 +31,8 @@ struct cffi_tls_s {
 
 static struct cffi_tls_s *get_cffi_tls(void);   /* in misc_thread_posix.h 
                                                    or misc_win32.h */
+static struct cffi_tls_s *peek_cffi_tls(void);  /* same, but doesn't create
+                                                   it if not there yet */
 
 
 /* We try to keep the PyThreadState around in a thread not started by
@@ -115,6 +124,8 @@ thread_canary_dealloc(ThreadCanaryObj *ob)
         //fprintf(stderr, "thread_canary_dealloc(%p): was local_thread_canary\n", ob);
         assert(ob->tls->local_thread_canary == ob);
         ob->tls->local_thread_canary = NULL;
+        /* the tstate is going away: it can't stay attached */
+        ob->tls->attached_tstate = NULL;
     }
     TLS_ZOM_UNLOCK();
 
@@ -327,14 +338,35 @@ static PyThreadState *get_current_ts(void)
 #endif
 }
 
+/* Values returned by gil_ensure() in addition to the two values of
+   PyGILState_STATE, when it used the thread state of a thread attached
+   with cffi_thread_attach() */
+#define CFFI_GILSTATE_ATTACHED_LOCKED    ((PyGILState_STATE)0x10)
+#define CFFI_GILSTATE_ATTACHED_UNLOCKED  ((PyGILState_STATE)0x11)
+
 static PyGILState_STATE gil_ensure(void)
 {
     /* Called at the start of a callback.  Replacement for
        PyGILState_Ensure().
     */
     PyGILState_STATE result;
-    PyThreadState *ts = PyGILState_GetThisThreadState();
+    PyThreadState *ts;
+    struct cffi_tls_s *tls = peek_cffi_tls();
+
+    if (tls != NULL && tls->attached_tstate != NULL) {
+        /* fast path: this thread was attached with cffi_thread_attach(),
+           so we know its thread state and that it is kept alive */
+        ts = tls->attached_tstate;
+        if (ts != get_current_ts()) {
+            PyEval_RestoreThread(ts);
+            return CFFI_GILSTATE_ATTACHED_UNLOCKED;
+        }
+        else {
+            return CFFI_GILSTATE_ATTACHED_LOCKED;
+        }
+    }
 
+    ts = PyGILState_GetThisThreadState();
     if (ts != NULL) {
         ts->gilstate_counter++;
         if (ts != get_current_ts()) {
@@ -367,5 +399,64 @@ static PyGILState_STATE gil_ensure(void)
 
 static void gil_release(PyGILState_STATE oldstate)
 {
+    if (oldstate == CFFI_GILSTATE_ATTACHED_UNLOCKED) {
+        PyEval_SaveThread();
+        return;
+    }
+    if (oldstate == CFFI_GILSTATE_ATTACHED_LOCKED)
+        return;
     PyGILState_Release(oldstate);
 }
+
+static int cffi_thread_attach(void)
+{
+    /* Exported to the C code of embedded modules.  Called without the
+       GIL.  Binds a PyThreadState to the current thread until the
+       matching cffi_thread_detach(), so that the callbacks invoked in
+       the meantime skip the lookups done by gil_ensure() and only
+       need to acquire the GIL.  Returns 0 or -1 (out of memory). */
+    struct cffi_tls_s *tls = get_cffi_tls();
+    PyGILState_STATE state;
+    PyThreadState *ts;
+
+    if (tls == NULL)
+        return -1;
+    if (tls->attach_count++ > 0)
+        return 0;
+
+    state = gil_ensure();
+    ts = get_current_ts();
+    ts->gilstate_counter++;    /* keep 'ts' alive while it is attached */
+    gil_release(state);
+
+    TLS_ZOM_LOCK();
+    tls->attached_tstate = ts;
+    TLS_ZOM_UNLOCK();
+    return 0;
+}
+
+static void cffi_thread_detach(void)
+{
+    /* Exported to the C code of embedded modules.  Called without the
+       GIL.  Undoes cffi_thread_attach(). */
+    struct cffi_tls_s *tls = peek_cffi_tls();
+    PyGILState_STATE state;
+    PyThreadState *ts;
+
+    if (tls == NULL || tls->attach_count == 0)
+        return;
+    if (--tls->attach_count > 0)
+        return;
+
+    TLS_ZOM_LOCK();
+    ts = tls->attached_tstate;
+    tls->attached_tstate = NULL;
+    TLS_ZOM_UNLOCK();
+    if (ts == NULL)
+        return;     /* the tstate was freed by Py_Finalize() meanwhile */
+
+    state = gil_ensure();
+    assert(ts == get_current_ts());
+    ts->gilstate_counter--;
+    gil_release(state);
+}
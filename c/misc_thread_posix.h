@@ -45,5 +45,10 @@ static struct cffi_tls_s *get_cffi_tls(void)
     return (struct cffi_tls_s *)p;
 }
 
+static struct cffi_tls_s *peek_cffi_tls(void)
+{
+    return (struct cffi_tls_s *)pthread_getspecific(cffi_tls_key);
+}
+
 #define save_errno      save_errno_only
 #define restore_errno   restore_errno_only
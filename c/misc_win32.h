@@ -55,6 +55,11 @@ static struct cffi_tls_s *get_cffi_tls(void)
     return (struct cffi_tls_s *)p;
 }
 
+static struct cffi_tls_s *peek_cffi_tls(void)
+{
+    return (struct cffi_tls_s *)TlsGetValue(cffi_tls_index);
+}
+
 #ifdef USE__THREAD
 # error "unexpected USE__THREAD on Windows"
 #endif
@@ -1088,6 +1088,31 @@ def test_call_function_7():
     res = f(x[0])
     assert res == -4042 + ord(b'A')
 
+def test_call_function_keep_gil():
+    BChar = new_primitive_type("char")
+    BCharP = new_pointer_type(BChar)
+    BLong = new_primitive_type("long")
+    BFunc = new_function_type((BCharP,), BLong, False)
+    ll = find_and_load_library('c')
+    strlen = ll.load_function(BFunc, "strlen", False)
+    # the choice is on the function object, not on its ctype
+    assert typeof(strlen) is BFunc
+    assert repr(strlen).startswith("<cdata 'long(*)(char *)' 0x")
+    assert isinstance(strlen, type(cast(BFunc, 0)))
+    assert strlen(b"foobar") == 6
+    assert call_many(strlen, [b"a", b"bc"]) == [1, 2]
+    assert strlen == ll.load_function(BFunc, "strlen")
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [('fn', BFunc, -1)])
+    s = newp(new_pointer_type(BStruct), [strlen])
+    assert typeof(s.fn) is BFunc
+    assert s.fn(b"foo") == 3
+    # only function pointers are affected
+    BVoidP = new_pointer_type(new_void_type())
+    p = ll.load_function(BVoidP, "strlen", False)
+    assert type(p) is type(cast(BVoidP, 0))
+    assert p == cast(BVoidP, strlen)
+
 def test_call_function_20():
     BChar = new_primitive_type("char")
     BShort = new_primitive_type("short")
@@ -1195,6 +1220,132 @@ def test_call_function_9():
     BSShort = new_primitive_type("short")
     assert f(3, cast(BSChar, -3), cast(BUChar, 200), cast(BSShort, -5)) == 192
 
+def test_call_function_9_variadic_cache():
+    BInt = new_primitive_type("int")
+    BFunc9 = new_function_type((BInt,), BInt, True)    # vararg
+    f = cast(BFunc9, _testfunc(9))
+    old_maxsize = get_variadic_cache_info()['maxsize']
+    try:
+        set_variadic_cache_size(2)
+        info0 = get_variadic_cache_info()
+        assert info0['maxsize'] == 2
+        assert f(1, cast(BInt, 42)) == 42
+        info1 = get_variadic_cache_info()
+        assert info1['misses'] == info0['misses'] + 1
+        for i in range(10):
+            assert f(2, cast(BInt, i + 1), cast(BInt, 2)) == i + 3
+        info2 = get_variadic_cache_info()
+        assert info2['misses'] == info1['misses'] + 1
+        assert info2['hits'] == info1['hits'] + 9
+        assert info2['size'] == 2
+        assert f(1, cast(BInt, 43)) == 43     # still cached
+        assert get_variadic_cache_info()['hits'] == info2['hits'] + 1
+        f(3, cast(BInt, 1), cast(BInt, 2), cast(BInt, 3))   # evicts one
+        assert f(2, cast(BInt, 5), cast(BInt, 2)) == 7      # evicted
+        assert get_variadic_cache_info()['misses'] == info2['misses'] + 2
+        set_variadic_cache_size(0)
+        assert get_variadic_cache_info()['size'] == 0
+        assert f(1, cast(BInt, 44)) == 44
+        assert get_variadic_cache_info()['size'] == 0
+        py.test.raises(ValueError, set_variadic_cache_size, -1)
+    finally:
+        set_variadic_cache_size(old_maxsize)
+
+def test_call_many():
+    BInt = new_primitive_type("int")
+    BLong = new_primitive_type("long")
+    BLongArray = new_array_type(new_pointer_type(BLong), None)
+    BIntArray = new_array_type(new_pointer_type(BInt), None)
+    BFunc1 = new_function_type((BInt, BLong), BLong, False)
+    f = cast(BFunc1, _testfunc(1))
+    assert call_many(f, [1, 2, 3], [10, 20, 30]) == [11, 22, 33]
+    assert call_many(f, (), ()) == []
+    # C arrays of the exact argument type are read directly
+    a = newp(BIntArray, [1, 2, 3, 4])
+    b = newp(BLongArray, [100, 200, 300, 400])
+    assert call_many(f, a, b) == [101, 202, 303, 404]
+    assert call_many(f, a, [5, 6, 7, 8]) == [6, 8, 10, 12]
+    out = newp(BLongArray, 4)
+    assert call_many(f, a, b, out=out) is out
+    assert list(out) == [101, 202, 303, 404]
+    out = newp(BLongArray, 5)
+    call_many(f, [7, 8], b[0:2], out=out)
+    assert list(out) == [107, 208, 0, 0, 0]
+    # errors
+    py.test.raises(ValueError, call_many, f, [1, 2], [3])
+    py.test.raises(TypeError, call_many, f, [1, 2])
+    py.test.raises(TypeError, call_many, f, [1, "x"], [3, 4])
+    py.test.raises(TypeError, call_many, f, 5, [3, 4])
+    py.test.raises(IndexError, call_many, f, a, b, out=newp(BLongArray, 3))
+    py.test.raises(TypeError, call_many, f, a, b, out=newp(BIntArray, 4))
+    py.test.raises(TypeError, call_many, f, a, b, foo=42)
+    py.test.raises(TypeError, call_many, cast(BInt, 42), [])
+    BFunc9 = new_function_type((BInt,), BInt, True)    # vararg
+    py.test.raises(TypeError, call_many, cast(BFunc9, _testfunc(9)), [0])
+
+def test_call_many_column_mutated():
+    BInt = new_primitive_type("int")
+    BLong = new_primitive_type("long")
+    BFunc1 = new_function_type((BInt, BLong), BLong, False)
+    f = cast(BFunc1, _testfunc(1))
+    class Mutator(object):
+        def __init__(self, value):
+            self.value = value
+        def __index__(self):
+            del column[:]
+            column.extend([0] * 1000)
+            return self.value
+        __int__ = __index__
+    column = [Mutator(1), Mutator(2), Mutator(3)]
+    assert call_many(f, column, [10, 20, 30]) == [11, 22, 33]
+    assert len(column) == 1000
+
+def test_call_many_unsupported_signature():
+    BInt = new_primitive_type("int")
+    BStruct = new_struct_type("struct s")
+    complete_struct_or_union(BStruct, [('a', BInt, 3)])
+    BFunc = new_function_type((BStruct,), BInt, False)
+    f = cast(BFunc, 123)
+    s = newp(new_pointer_type(BStruct))
+    e1 = py.test.raises(NotImplementedError, f, s[0])
+    e2 = py.test.raises(NotImplementedError, call_many, f, [])
+    assert str(e2.value) == str(e1.value)
+    assert "bit fields" in str(e2.value)
+
+def test_call_many_struct_and_pointer():
+    BChar = new_primitive_type("char")
+    BShort = new_primitive_type("short")
+    BInt = new_primitive_type("int")
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [('a1', BChar, -1),
+                                       ('a2', BShort, -1)])
+    BStructArray = new_array_type(new_pointer_type(BStruct), None)
+    BFunc7 = new_function_type((BStruct,), BShort, False)
+    f = cast(BFunc7, _testfunc(7))
+    structs = newp(BStructArray, [(b'A', -202), (b'B', 5), (b'C', 10)])
+    assert call_many(f, structs) == [65 - 202, 66 + 5, 67 + 10]
+    assert call_many(f, [structs[1]]) == [66 + 5]
+    BIntPtr = new_pointer_type(BInt)
+    BFunc6 = new_function_type((BIntPtr,), BIntPtr, False)
+    f = cast(BFunc6, _testfunc(6))
+    res = call_many(f, [[1242], newp(BIntPtr, 1300)])
+    assert len(res) == 2 and res[0][0] == 1300 - 1000   # static result
+    assert typeof(res[0]) is BIntPtr
+    # declaring _testfunc5 as void(int): the extra argument is ignored
+    BVoid = new_void_type()
+    BIntArray = new_array_type(BIntPtr, None)
+    BFunc5 = new_function_type((BInt,), BVoid, False)
+    f = cast(BFunc5, _testfunc(5))
+    set_errno(2)
+    assert call_many(f, [1, 2, 3]) is None
+    assert get_errno() == 2 + 3 * 15
+    assert call_many(f, newp(BIntArray, [1, 2, 3])) is None
+    assert get_errno() == 2 + 6 * 15
+    for out in [newp(BIntArray, 3), cast(new_pointer_type(BVoid), 0)]:
+        e = py.test.raises(TypeError, call_many, f, [1, 2, 3], out=out)
+        assert str(e.value) == ("'out' cannot be given for the function "
+                                "'void(*)(int)' returning void")
+
 def test_call_function_24():
     BFloat = new_primitive_type("float")
     BFloatComplex = new_primitive_type("float _Complex")
@@ -1223,6 +1374,62 @@ def test_call_function_25():
         f = cast(BFunc3, _testfunc(9))
         py.test.raises(NotImplementedError, f, 12.3, 34.5)
 
+def test_call_function_integer_arguments():
+    for name, size in [("signed char", 1), ("short", 2), ("int", 4),
+                       ("long long", 8)]:
+        BType = new_primitive_type(name)
+        BFunc = new_function_type((BType,), BType, False)
+        f = callback(BFunc, lambda n: n)
+        lo, hi = -(1 << (8*size-1)), (1 << (8*size-1)) - 1
+        assert f(lo) == lo
+        assert f(hi) == hi
+        assert f(True) == 1
+        assert f(cast(BType, 42)) == 42
+        py.test.raises(OverflowError, f, lo - 1)
+        py.test.raises(OverflowError, f, hi + 1)
+        py.test.raises(TypeError, f, 1.5)
+    for name, size in [("unsigned char", 1), ("unsigned short", 2),
+                       ("unsigned int", 4), ("unsigned long long", 8)]:
+        BType = new_primitive_type(name)
+        BFunc = new_function_type((BType,), BType, False)
+        f = callback(BFunc, lambda n: n)
+        hi = (1 << (8*size)) - 1
+        assert f(0) == 0
+        assert f(hi) == hi
+        py.test.raises(OverflowError, f, -1)
+        py.test.raises(OverflowError, f, hi + 1)
+
+def test_call_function_float_arguments():
+    BFloat = new_primitive_type("float")
+    BDouble = new_primitive_type("double")
+    BFunc = new_function_type((BFloat, BDouble), BDouble, False)
+    f = callback(BFunc, lambda x, y: x + y)
+    assert f(1.5, 2.25) == 3.75
+    assert f(1, 2) == 3.0
+    assert f(cast(BFloat, 0.5), cast(BDouble, 0.25)) == 0.75
+    py.test.raises(TypeError, f, "x", 0.0)
+
+def test_call_function_keywords():
+    BInt = new_primitive_type("int")
+    BFunc = new_function_type((BInt, BInt), BInt, False)
+    f = callback(BFunc, lambda x, y: x - y)
+    assert f(*[10, 3]) == 7
+    e = py.test.raises(TypeError, f, 10, y=3)
+    assert str(e.value) == (
+        "a cdata function cannot be called with keyword arguments")
+    assert f(10, 3, **{}) == 7
+
+def test_call_function_reentrant():
+    BInt = new_primitive_type("int")
+    BFunc = new_function_type((BInt, BInt), BInt, False)
+    def cb(n, m):
+        if n == 0:
+            return m
+        return f(n - 1, m + 1) + 1000
+    f = callback(BFunc, cb)
+    assert f(5, 10) == 5015
+    assert f(0, 7) == 7
+
 def test_cannot_call_with_a_autocompleted_struct():
     BSChar = new_primitive_type("signed char")
     BDouble = new_primitive_type("double")
@@ -1325,6 +1532,176 @@ def test_callback():
     e = py.test.raises(TypeError, f)
     assert str(e.value) == "'int(*)(int)' expects 1 arguments, got 0"
 
+def test_callback_pool():
+    import sys
+    if sys.platform == 'darwin' or sys.platform.startswith('netbsd'):
+        py.test.skip("may use libffi's own closure allocator")
+    BInt = new_primitive_type("int")
+    BFunc = new_function_type((BInt,), BInt, False)
+    import gc; gc.collect()
+    info0 = get_callback_pool_info()
+    lst = [callback(BFunc, lambda n, i=i: n + i) for i in range(3000)]
+    assert lst[2999](1) == 3000
+    info1 = get_callback_pool_info()
+    assert info1['in_use'] == info0['in_use'] + 3000
+    assert info1['peak'] >= info1['in_use']
+    assert info1['pages_mapped'] > info0['pages_mapped']
+    del lst
+    info2 = get_callback_pool_info()
+    assert info2['in_use'] == info0['in_use']
+    assert info2['peak'] == info1['peak']
+    # the completely free pages are unmapped, apart from a few
+    assert info2['pages_mapped'] < info1['pages_mapped']
+    assert info2['free'] > 0
+    try:
+        reserve_callbacks(5000)
+        info3 = get_callback_pool_info()
+        assert info3['reserved'] == 5000
+        assert info3['free'] >= 5000
+        f = callback(BFunc, lambda n: n)
+        del f
+        assert get_callback_pool_info()['free'] >= 5000
+    finally:
+        reserve_callbacks(0)
+    info4 = get_callback_pool_info()
+    assert info4['reserved'] == 0
+    assert info4['pages_mapped'] < info3['pages_mapped']
+    py.test.raises(ValueError, reserve_callbacks, -1)
+
+def test_callback_decode_primitive_args():
+    names = ["signed char", "short", "int", "long long",
+             "unsigned char", "unsigned short", "unsigned int",
+             "unsigned long long", "float", "double", "_Bool", "char"]
+    BTypes = [new_primitive_type(name) for name in names]
+    BVoidP = new_pointer_type(new_void_type())
+    BTypes.append(BVoidP)
+    values = [-128, -32768, -2**31, -2**63, 255, 65535, 2**32-1, 2**64-1,
+              1.5, -2.25, True, b'x', None]
+    seen = []
+    def cb(*args):
+        seen.append(args)
+    BVoid = new_void_type()
+    for BArg, value in zip(BTypes, values):
+        BFunc = new_function_type((BArg,), BVoid, False)
+        f = callback(BFunc, cb)
+        if BArg is BVoidP:
+            value = cast(BVoidP, 12345)
+        f(value)
+        got = seen.pop()
+        assert len(got) == 1
+        if BArg is BVoidP:
+            assert typeof(got[0]) is BVoidP
+            assert int(cast(new_primitive_type("intptr_t"), got[0])) == 12345
+        else:
+            assert got[0] == value
+            assert type(got[0]) is type(value)
+    # more arguments than what fits on the stack in the C code
+    BInt = new_primitive_type("int")
+    BFunc = new_function_type((BInt,) * 12, BInt, False)
+    f = callback(BFunc, lambda *args: sum(args))
+    assert f(*range(12)) == 66
+    BFunc = new_function_type((BInt,) * 8, BInt, False)
+    f = callback(BFunc, lambda *args: sum(args))
+    assert f(*range(8)) == 28
+    BFunc = new_function_type((), BInt, False)
+    f = callback(BFunc, lambda: 42)
+    assert f() == 42
+
+def test_callback_same_type_error_values():
+    BLong = new_primitive_type("long")
+    BFunc = new_function_type((BLong,), BLong, False)
+    def f(n):
+        if n < 0:
+            raise ValueError
+        return n * 2
+    def ignore(*args):
+        return None
+    # the default zero error value is shared between the callbacks of
+    # the same type, but an explicit 'error' must not leak into it
+    c0 = callback(BFunc, f, None, ignore)
+    c1 = callback(BFunc, f, 42, ignore)
+    c2 = callback(BFunc, f, None, ignore)
+    c3 = callback(BFunc, f, -7, ignore)
+    assert [c(5) for c in (c0, c1, c2, c3)] == [10, 10, 10, 10]
+    assert [c(-1) for c in (c0, c1, c2, c3)] == [0, 42, 0, -7]
+
+def test_callback_queue():
+    BInt = new_primitive_type("int")
+    BDouble = new_primitive_type("double")
+    BVoid = new_void_type()
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [('a', BInt, -1), ('b', BDouble, -1)])
+    BFunc = new_function_type((BInt, BStruct, BDouble), BVoid, False)
+    q = callback_queue(BFunc, 5)
+    assert q.size == 8        # rounded up to a power of two
+    assert repr(q.callback) == (
+        "<cdata 'void(*)(int, struct foo, double)' queueing into "
+        "<_cffi_backend.CallbackQueue for "
+        "'void(*)(int, struct foo, double)'>>")
+    assert q.drain() == []
+    assert q.wait(0) is False
+    s = newp(new_pointer_type(BStruct), [5, 6.5])
+    for i in range(10):
+        s.a = i
+        assert q.callback(i, s[0], i * 0.5) is None
+    assert q.pending == 8
+    assert q.dropped == 2
+    assert q.wait() is True
+    events = q.drain(3)
+    assert [(x, y.a, y.b, z) for (x, y, z) in events] == [
+        (0, 0, 6.5, 0.0), (1, 1, 6.5, 0.5), (2, 2, 6.5, 1.0)]
+    s.a = 42           # the structs are copies
+    assert events[0][1].a == 0
+    events = q.drain()
+    assert [x for (x, y, z) in events] == [3, 4, 5, 6, 7]
+    assert q.pending == 0
+    q.callback(-1, s[0], 0.0)
+    assert q.drain(0) == []
+    assert q.drain(-1)[0][0] == -1
+
+def test_callback_queue_errors():
+    BInt = new_primitive_type("int")
+    BVoid = new_void_type()
+    py.test.raises(TypeError, callback_queue,
+                   new_function_type((BInt,), BInt, False), 10)
+    py.test.raises(TypeError, callback_queue, BInt, 10)
+    BFunc = new_function_type((BInt,), BVoid, False)
+    py.test.raises(ValueError, callback_queue, BFunc, 0)
+    q = callback_queue(BFunc, 10)
+    py.test.raises(ValueError, q.wait, -1.0)
+
+def test_callback_queue_threads():
+    import threading
+    BLong = new_primitive_type("long")
+    BFunc = new_function_type((BLong,), new_void_type(), False)
+    N = 5000
+    q = callback_queue(BFunc, 4 * N)
+    def producer(k):
+        for i in range(N):
+            q.callback(k * N + i)
+    threads = [threading.Thread(target=producer, args=(k,))
+               for k in range(4)]
+    for t in threads:
+        t.start()
+    seen = []
+    while len(seen) < 4 * N:
+        if q.wait(5.0):
+            seen.extend([x for (x,) in q.drain()])
+        else:
+            assert 0, "timed out"
+    for t in threads:
+        t.join()
+    assert sorted(seen) == list(range(4 * N))
+    assert q.dropped == 0
+    # wait() is woken up by a later event
+    def late():
+        import time
+        time.sleep(0.1)
+        q.callback(-5)
+    threading.Thread(target=late).start()
+    assert q.wait() is True
+    assert q.drain() == [(-5,)]
+
 def test_callback_exception():
     try:
         import cStringIO
@@ -3233,6 +3610,54 @@ def test_cannot_convert_unicode_to_charp():
     BCharArray = new_array_type(BCharP, None)
     py.test.raises(TypeError, newp, BCharArray, u+'foobar')
 
+def test_new_pool():
+    BInt = new_primitive_type("int")
+    BIntP = new_pointer_type(BInt)
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [('a', BInt, -1), ('b', BInt, -1)])
+    BStructPtr = new_pointer_type(BStruct)
+    BIntArray = new_array_type(BIntP, None)
+    old = get_new_pool_info()
+    try:
+        set_new_pool_size(256, 4096)
+        info0 = get_new_pool_info()
+        assert info0['maxsize'] == 256
+        assert info0['maxbytes'] == 4096
+        assert info0['resident_bytes'] == 0
+        p = newp(BIntP, 42)
+        del p
+        info1 = get_new_pool_info()
+        assert info1['misses'] == info0['misses'] + 1
+        assert info1['resident_bytes'] > 0
+        for i in range(10):
+            p = newp(BIntP, None)
+            assert p[0] == 0          # reused memory is cleared
+            p[0] = 123
+            del p
+        info2 = get_new_pool_info()
+        assert info2['hits'] == info1['hits'] + 10
+        assert info2['resident_bytes'] == info1['resident_bytes']
+        # ffi.new("struct foo *") allocates two objects
+        s = newp(BStructPtr, [5, 6])
+        assert (s.a, s.b) == (5, 6)
+        del s
+        # var-sized arrays are not put back into the pool
+        a = newp(BIntArray, 3)
+        resident = get_new_pool_info()['resident_bytes']
+        del a
+        assert get_new_pool_info()['resident_bytes'] == resident
+        # 'maxbytes' bounds the memory kept
+        lst = [newp(BIntP, i) for i in range(1000)]
+        del lst
+        assert get_new_pool_info()['resident_bytes'] <= 4096
+        set_new_pool_size(0)
+        assert get_new_pool_info()['resident_bytes'] == 0
+        py.test.raises(ValueError, set_new_pool_size, -1)
+        py.test.raises(ValueError, set_new_pool_size, 100000)
+        py.test.raises(ValueError, set_new_pool_size, 16, -1)
+    finally:
+        set_new_pool_size(old['maxsize'], old['maxbytes'])
+
 def test_buffer_keepalive():
     BCharP = new_pointer_type(new_primitive_type("char"))
     BCharArray = new_array_type(BCharP, None)
@@ -3245,6 +3670,183 @@ def test_buffer_keepalive():
         buf = buflist[i]
         assert buf[:] == str2bytes("hi there %d\x00" % i)
 
+def test_buffer_typed_export():
+    BInt = new_primitive_type("int")
+    BIntP = new_pointer_type(BInt)
+    BIntArray = new_array_type(BIntP, None)
+    c = newp(BIntArray, [10, 20, 30, 40, 50])
+    buf = buffer(c, typed=True)
+    assert len(buf) == 5 * size_of_int()
+    m = memoryview(buf)
+    assert m.format == 'i'
+    assert m.itemsize == size_of_int()
+    assert m.shape == (5,)
+    assert m.strides == (size_of_int(),)
+    assert m.tolist() == [10, 20, 30, 40, 50]
+    m[2] = -3
+    assert c[2] == -3
+    assert m.cast('B').nbytes == 5 * size_of_int()
+    # only a whole number of items gives a typed view
+    m = memoryview(buffer(c, 6, typed=True))
+    assert m.format == 'B'
+    assert m.shape == (6,)
+    #
+    BDouble = new_primitive_type("double")
+    d = newp(new_array_type(new_pointer_type(BDouble), 3), [1.5, 2.5, 3.5])
+    assert memoryview(buffer(d, typed=True)).tolist() == [1.5, 2.5, 3.5]
+    BCharArray = new_array_type(new_pointer_type(new_primitive_type("char")),
+                                None)
+    m = memoryview(buffer(newp(BCharArray, b"abc"), typed=True))
+    assert m.format == 'B'
+    assert m.shape == (4,)
+    BIntArray3 = new_array_type(BIntP, 3)
+    m = memoryview(buffer(newp(new_array_type(
+        new_pointer_type(BIntArray3), 2)), typed=True))
+    assert m.format == '(3)i'
+    assert m.shape == (2,)
+
+def test_buffer_typed_export_copied_view():
+    # 'shape' and 'strides' must stay valid in a by-value copy of the
+    # Py_buffer, after the original struct is gone
+    if sys.version_info < (3,) or '__pypy__' in sys.builtin_module_names:
+        py.test.skip("CPython 3 only")
+    import ctypes
+    class Py_buffer(ctypes.Structure):
+        _fields_ = [('buf', ctypes.c_void_p), ('obj', ctypes.py_object),
+                    ('len', ctypes.c_ssize_t),
+                    ('itemsize', ctypes.c_ssize_t),
+                    ('readonly', ctypes.c_int), ('ndim', ctypes.c_int),
+                    ('format', ctypes.c_char_p),
+                    ('shape', ctypes.POINTER(ctypes.c_ssize_t)),
+                    ('strides', ctypes.POINTER(ctypes.c_ssize_t)),
+                    ('suboffsets', ctypes.POINTER(ctypes.c_ssize_t)),
+                    ('internal', ctypes.c_void_p)]
+    PyBUF_RECORDS_RO = 0x001c
+    BDouble = new_primitive_type("double")
+    d = newp(new_array_type(new_pointer_type(BDouble), 3), [1.5, 2.5, 3.5])
+    buf = buffer(d, typed=True)
+    view = Py_buffer()
+    ctypes.pythonapi.PyObject_GetBuffer(ctypes.py_object(buf),
+                                        ctypes.byref(view), PyBUF_RECORDS_RO)
+    copy = Py_buffer.from_buffer_copy(view)
+    ctypes.pythonapi.PyBuffer_Release(ctypes.byref(view))
+    ctypes.memset(ctypes.addressof(view), 0x55, ctypes.sizeof(view))
+    assert copy.format == b'd'
+    assert copy.shape[0] == 3
+    assert copy.strides[0] == sizeof(BDouble)
+
+def test_buffer_typed_export_struct():
+    BInt = new_primitive_type("int")
+    BDouble = new_primitive_type("double")
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [('x', BInt, -1),
+                                       ('y', BDouble, -1)])
+    BStructArray = new_array_type(new_pointer_type(BStruct), 2)
+    m = memoryview(buffer(newp(BStructArray, None), typed=True))
+    pad = sizeof(BDouble) - size_of_int()
+    assert m.format == '^T{i:x:%sd:y:}' % ('%dx' % pad if pad else '')
+    assert m.itemsize == sizeof(BStruct)
+    assert m.shape == (2,)
+    # bitfields have no PEP 3118 format: fall back to bytes
+    BBits = new_struct_type("struct bits")
+    complete_struct_or_union(BBits, [('a', BInt, 3)])
+    BBitsArray = new_array_type(new_pointer_type(BBits), 2)
+    m = memoryview(buffer(newp(BBitsArray, None), typed=True))
+    assert m.format == 'B'
+    assert m.shape == (2 * sizeof(BBits),)
+
+def test_array_interface():
+    import sys
+    order = '<' if sys.byteorder == 'little' else '>'
+    BInt = new_primitive_type("int")
+    BIntP = new_pointer_type(BInt)
+    BIntArray = new_array_type(BIntP, None)
+    c = newp(BIntArray, [10, 20, 30])
+    d = c.__array_interface__
+    assert d['version'] == 3
+    assert d['shape'] == (3,)
+    assert d['typestr'] == '%si%d' % (order, size_of_int())
+    assert d['descr'] == [('', d['typestr'])]
+    assert d['data'] == (int(cast(new_primitive_type("intptr_t"), c)), False)
+    assert d['strides'] is None
+    assert c[0:2].__array_interface__['shape'] == (2,)
+    #
+    BArray23 = new_array_type(new_pointer_type(
+        new_array_type(BIntP, 3)), 2)
+    assert newp(BArray23, None).__array_interface__['shape'] == (2, 3)
+    p = newp(BIntP, 42)
+    assert p.__array_interface__['shape'] == ()
+    BChar = new_primitive_type("char")
+    BCharArray = new_array_type(new_pointer_type(BChar), None)
+    assert newp(BCharArray, b"ab").__array_interface__['typestr'] == '|S1'
+    BBool = new_primitive_type("_Bool")
+    BBoolArray = new_array_type(new_pointer_type(BBool), 1)
+    assert newp(BBoolArray, None).__array_interface__['typestr'] == '|b1'
+    # pointers that don't own their memory have no known length
+    py.test.raises(AttributeError, getattr, cast(BIntP, c),
+                   '__array_interface__')
+    py.test.raises(AttributeError, getattr, cast(BInt, 42),
+                   '__array_interface__')
+    BVoidP = new_pointer_type(new_void_type())
+    d = newp(new_pointer_type(BVoidP), None).__array_interface__
+    assert d['typestr'] == '%su%d' % (order, sizeof(BVoidP))
+
+def test_array_interface_struct():
+    import sys
+    order = '<' if sys.byteorder == 'little' else '>'
+    BInt = new_primitive_type("int")
+    BShort = new_primitive_type("short")
+    BDouble = new_primitive_type("double")
+    BInner = new_struct_type("struct inner")
+    complete_struct_or_union(BInner, [('a', BShort, -1)])
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [
+        ('x', BInt, -1),
+        ('y', BDouble, -1),
+        ('', BInner, -1),
+        ('v', new_array_type(new_pointer_type(BInt), 2), -1),
+        ('sub', BInner, -1)])
+    BStructArray = new_array_type(new_pointer_type(BStruct), 3)
+    d = newp(BStructArray, None).__array_interface__
+    assert d['shape'] == (3,)
+    assert d['typestr'] == '|V%d' % sizeof(BStruct)
+    i = '%si%d' % (order, size_of_int())
+    h = '%si2' % (order,)
+    pad1 = sizeof(BDouble) - size_of_int()
+    expected = [('x', i)]
+    if pad1:
+        expected.append(('', '|V%d' % pad1))
+    expected += [('y', '%sf8' % order), ('a', h), ('', '|V2'),
+                 ('v', i, (2,)), ('sub', [('a', h)])]
+    tail = sizeof(BStruct) - (typeoffsetof(BStruct, 'sub')[1] + 2)
+    if tail:
+        expected.append(('', '|V%d' % tail))
+    assert d['descr'] == expected
+    # bitfields cannot be described: the items are opaque blobs
+    BBits = new_struct_type("struct bits")
+    complete_struct_or_union(BBits, [('a', BInt, 3)])
+    BBitsArray = new_array_type(new_pointer_type(BBits), 2)
+    d = newp(BBitsArray, None).__array_interface__
+    assert d['typestr'] == '|V%d' % sizeof(BBits)
+    assert d['descr'] == [('', d['typestr'])]
+
+def test_buffer_untyped_export_by_default():
+    BInt = new_primitive_type("int")
+    BIntArray = new_array_type(new_pointer_type(BInt), 4)
+    buf = buffer(newp(BIntArray, [1, 2, 3, 4]))
+    m = memoryview(buf)
+    assert m.format == 'B'
+    assert len(m) == 4 * size_of_int()
+    assert m == bytes(buf)
+    m[:4] = b'abcd'
+    assert buf[:4] == b'abcd'
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [('x', BInt, -1)])
+    BStructArray = new_array_type(new_pointer_type(BStruct), 2)
+    m = memoryview(buffer(newp(BStructArray, [[5], [6]])))
+    assert m.format == 'B'
+    assert m[0] in (0, 5)
+
 def test_slice():
     BIntP = new_pointer_type(new_primitive_type("int"))
     BIntArray = new_array_type(BIntP, None)
@@ -3785,6 +4387,46 @@ def test_packed():
     assert sizeof(BStruct2) == 2 + sizeof(BLong)
     assert alignof(BStruct2) == 2
 
+def test_struct_field_types_read_and_write():
+    # exercises the per-type field cache and its specialized readers
+    types = ["signed char", "short", "int", "long", "long long",
+             "unsigned char", "unsigned short", "unsigned int",
+             "unsigned long", "unsigned long long", "float", "double",
+             "_Bool", "char", "long double"]
+    fields = [(name.replace(' ', '_'), new_primitive_type(name), -1)
+              for name in types]
+    BStruct = new_struct_type("struct foo")
+    BStructPtr = new_pointer_type(BStruct)
+    BIntPtr = new_pointer_type(new_primitive_type("int"))
+    fields.append(('ptr', BIntPtr, -1))
+    fields.append(('bits', new_primitive_type("int"), 3))
+    for extra_args in [(), (None, -1, -1, SF_PACKED)]:
+        complete_struct_or_union(BStruct, fields, *extra_args)
+        p = newp(BStructPtr)
+        s = p[0]
+        long_bits = 8 * sizeof(new_primitive_type("long"))
+        values = [-128, -32768, -2**31, -2**(long_bits - 1), -2**63,
+                  255, 65535, 2**32 - 1, 2**long_bits - 1, 2**64 - 1,
+                  1.5, -2.25, True, b'x']
+        for repeat in range(3):
+            for (name, _, _), value in zip(fields, values):
+                setattr(p, name, value)
+                assert getattr(s, name) == value
+                assert type(getattr(p, name)) is type(value)
+                # a non-interned attribute name works too
+                assert getattr(s, ''.join(list(name))) == value
+        p.long_double = 2.5
+        assert float(s.long_double) == 2.5
+        q = newp(BIntPtr, 42)
+        s.ptr = q
+        assert s.ptr == q and s.ptr[0] == 42 and typeof(s.ptr) is BIntPtr
+        s.bits = -3
+        assert s.bits == -3
+        with pytest.raises(AttributeError):
+            s.foo
+        BStruct = new_struct_type("struct foo")
+        BStructPtr = new_pointer_type(BStruct)
+
 def test_packed_with_bitfields():
     if sys.platform == "win32":
         py.test.skip("testing gcc behavior")
@@ -4275,6 +4917,138 @@ def test_unpack():
     py.test.raises(ValueError, unpack, p0, -1)
     py.test.raises(ValueError, unpack, p, -1)
 
+def test_unpack_fields():
+    BChar = new_primitive_type("char")
+    BShort = new_primitive_type("short")
+    BInt = new_primitive_type("int")
+    BDouble = new_primitive_type("double")
+    BIntPtr = new_pointer_type(BInt)
+    BStruct = new_struct_type("struct foo")
+    BStructPtr = new_pointer_type(BStruct)
+    complete_struct_or_union(BStruct, [('c', BChar, -1),
+                                       ('s', BShort, -1),
+                                       ('d', BDouble, -1),
+                                       ('p', BIntPtr, -1),
+                                       ('b', BInt, 4),
+                                       ('a', new_array_type(BIntPtr, 2), -1)])
+    BArray = new_array_type(BStructPtr, None)
+    q = newp(BIntPtr, 42)
+    NULL = cast(BIntPtr, 0)
+    p = newp(BArray, [(b'x', -5, 1.5, q, 7, [1, 2]),
+                      (b'y', 6, -2.5, NULL, -8, [3, 4]),
+                      (b'z', 7, 0.25, q, 0, [5, 6])])
+    c, s, d, ptr, b, a = unpack_fields(p, 3, ['c', 's', 'd', 'p', 'b', 'a'])
+    assert c == [b'x', b'y', b'z']
+    assert s == [-5, 6, 7]
+    assert d == [1.5, -2.5, 0.25]
+    assert ptr == [q, NULL, q] and typeof(ptr[1]) is BIntPtr
+    assert b == [7, -8, 0]
+    assert [list(x) for x in a] == [[1, 2], [3, 4], [5, 6]]
+    assert unpack_fields(p + 1, 2, ('d',)) == [[-2.5, 0.25]]
+    assert unpack_fields(p, 0, ['s', 'd']) == [[], []]
+    assert unpack_fields(p, 3, []) == []
+    #
+    e = py.test.raises(KeyError, unpack_fields, p, 3, ['s', 'foo'])
+    assert str(e.value) == "\"'struct foo' has no field 'foo'\""
+    py.test.raises(TypeError, unpack_fields, p, 3, [42])
+    py.test.raises(TypeError, unpack_fields, p, 3, 42)
+    py.test.raises(TypeError, unpack_fields, newp(BIntPtr), 1, ['a'])
+    py.test.raises(TypeError, unpack_fields,
+                   cast(new_pointer_type(new_struct_type("bar")), 42), 1, [])
+    py.test.raises(ValueError, unpack_fields, p, -1, ['s'])
+    py.test.raises(RuntimeError, unpack_fields, cast(BStructPtr, 0), 1, ['s'])
+
+def test_pack_into():
+    BChar = new_primitive_type("char")
+    BShort = new_primitive_type("short")
+    BInt = new_primitive_type("int")
+    BDouble = new_primitive_type("double")
+    BStruct = new_struct_type("struct foo")
+    BStructPtr = new_pointer_type(BStruct)
+    complete_struct_or_union(BStruct, [('c', BChar, -1),
+                                       ('s', BShort, -1),
+                                       ('d', BDouble, -1),
+                                       ('b', BInt, 4)])
+    BArray = new_array_type(BStructPtr, 4)
+    p = newp(BArray)
+    assert pack_into(p, [(b'x', -5, 1.5, 7),
+                         [b'y', 6],
+                         {'d': 0.25, 'b': -8},
+                         p[0]]) is None
+    assert unpack_fields(p, 4, ['c', 's', 'd', 'b']) == [
+        [b'x', b'y', b'\x00', b'x'], [-5, 6, 0, -5],
+        [1.5, 0.0, 0.25, 1.5], [7, 0, -8, 7]]
+    # only the given fields are written, in the given rows
+    pack_into(p + 1, [[10, 20, 30], [0.5, 1.5, 2.5]], ['s', 'd'])
+    assert unpack_fields(p, 4, ['s', 'd', 'b']) == [
+        [-5, 10, 20, 30], [1.5, 0.5, 1.5, 2.5], [7, 0, -8, 7]]
+    # a C array of the field's type is copied directly
+    BShortArray = new_array_type(new_pointer_type(BShort), None)
+    pack_into(p, [newp(BShortArray, [1, 2, 3, 4])], ['s'])
+    assert unpack_fields(p, 4, ['s']) == [[1, 2, 3, 4]]
+    pack_into(p, ([3, 2, 1, 0], (1, 2, 3, 4)), ('b', 's'))
+    assert unpack_fields(p, 4, ['b', 's']) == [[3, 2, 1, 0], [1, 2, 3, 4]]
+    #
+    py.test.raises(IndexError, pack_into, p, [()] * 5)
+    py.test.raises(IndexError, pack_into, p, [[0] * 5], ['s'])
+    py.test.raises(ValueError, pack_into, p, [(b'x', 2, 3.0, 4, 5)])
+    py.test.raises(KeyError, pack_into, p, [{'foo': 1}])
+    py.test.raises(TypeError, pack_into, p, [42])
+    py.test.raises(OverflowError, pack_into, p, [(b'x', 2**15)])
+    py.test.raises(KeyError, pack_into, p, [[1]], ['foo'])
+    py.test.raises(ValueError, pack_into, p, [[1, 2], [3]], ['s', 'b'])
+    py.test.raises(ValueError, pack_into, p, [[1]], ['s', 'b'])
+    py.test.raises(TypeError, pack_into, newp(new_pointer_type(BInt)), [])
+    py.test.raises(RuntimeError, pack_into, cast(BStructPtr, 0), [])
+
+def test_pack_into_mutated_lists():
+    BInt = new_primitive_type("int")
+    BStruct = new_struct_type("struct foo")
+    BStructPtr = new_pointer_type(BStruct)
+    complete_struct_or_union(BStruct, [('a', BInt, -1),
+                                       ('b', BInt, -1)])
+    p = newp(new_array_type(BStructPtr, 2))
+    class Mutator(object):
+        def __init__(self, value, lst, replacement):
+            self.value = value
+            self.lst = lst
+            self.replacement = replacement
+        def __index__(self):
+            self.lst[:] = self.replacement
+            return self.value
+        __int__ = __index__
+    # the list of records, and a column, are read from a snapshot
+    rows = [None, [3, 4]]
+    rows[0] = [Mutator(1, rows, [None] * 1000), 2]
+    pack_into(p, rows)
+    assert unpack_fields(p, 2, ['a', 'b']) == [[1, 3], [2, 4]]
+    column = [5, 6]
+    column[0] = Mutator(5, column, [None] * 1000)
+    pack_into(p, [column], ['a'])
+    assert unpack_fields(p, 2, ['a']) == [[5, 6]]
+    # a list row is read again after each item
+    row = [None, 8]
+    row[0] = Mutator(7, row, [0])
+    pack_into(p, [row])
+    assert unpack_fields(p, 1, ['a', 'b']) == [[7], [2]]
+
+def test_pack_into_packed():
+    BChar = new_primitive_type("char")
+    BInt = new_primitive_type("int")
+    BDouble = new_primitive_type("double")
+    BStruct = new_struct_type("struct foo")
+    BStructPtr = new_pointer_type(BStruct)
+    complete_struct_or_union(BStruct, [('c', BChar, -1),
+                                       ('i', BInt, -1),
+                                       ('d', BDouble, -1)],
+                             None, -1, -1, SF_PACKED)
+    assert sizeof(BStruct) == 13
+    p = newp(new_array_type(BStructPtr, None), 3)
+    pack_into(p, [(b'a', -1, 0.5), (b'b', 2**31 - 1, 1.5)])
+    pack_into(p + 2, [[b'c'], [-2**31], [2.5]], ['c', 'i', 'd'])
+    assert unpack_fields(p, 3, ['c', 'i', 'd']) == [
+        [b'a', b'b', b'c'], [-1, 2**31 - 1, -2**31], [0.5, 1.5, 2.5]]
+
 def test_cdata_dir():
     BInt = new_primitive_type("int")
     p = cast(BInt, 42)
@@ -1,7 +1,7 @@
 __all__ = ['FFI', 'VerificationError', 'VerificationMissing', 'CDefError',
-           'FFIError']
+           'FFIError', 'parse_many']
 
-from .api import FFI
+from .api import FFI, parse_many
 from .error import CDefError, FFIError, VerificationError, VerificationMissing
 from .error import PkgConfigError
 
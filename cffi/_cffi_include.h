@@ -218,7 +218,11 @@ extern "C" {
     ((int(*)(PyObject *))_cffi_exports[26])
 #define _cffi_from_c_wchar3216_t                                         \
     ((PyObject *(*)(int))_cffi_exports[27])
-#define _CFFI_NUM_EXPORTS 28
+#define _cffi_thread_attach                                              \
+    ((int(*)(void))_cffi_exports[28])
+#define _cffi_thread_detach                                              \
+    ((void(*)(void))_cffi_exports[29])
+#define _CFFI_NUM_EXPORTS 30
 
 struct _cffi_ctypedescr;
 
@@ -347,6 +351,16 @@ _cffi_free_array_arguments(struct _cffi_freeme_s *freeme)
     } while (freeme != NULL);
 }
 
+_CFFI_UNUSED_FN static int
+_cffi_check_nargs(const char *name, Py_ssize_t expected, Py_ssize_t nargs)
+{
+    if (nargs == expected)
+        return 0;
+    PyErr_Format(PyExc_TypeError, "%.200s expected %zd arguments, got %zd",
+                 name, expected, nargs);
+    return -1;
+}
+
 /**********  end CPython-specific section  **********/
 #else
 _CFFI_UNUSED_FN
@@ -354,6 +368,17 @@ static void (*_cffi_call_python_org)(struct _cffi_externpy_s *, char *);
 # define _cffi_call_python  _cffi_call_python_org
 #endif
 
+/* functions with several arguments use METH_FASTCALL on CPython >= 3.7,
+   which requires a module version of at least 0x2901 */
+#if !defined(PYPY_VERSION) && PY_VERSION_HEX >= 0x03070000
+# define _CFFI_USE_FASTCALL
+# define _CFFI_CPYTHON_BLTN_MANY  _CFFI_OP_CPYTHON_BLTN_F
+# define _cffi_version_fastcall(v)  ((v) > 0x2901 ? (v) : 0x2901)
+#else
+# define _CFFI_CPYTHON_BLTN_MANY  _CFFI_OP_CPYTHON_BLTN_V
+# define _cffi_version_fastcall(v)  (v)
+#endif
+
 
 #define _cffi_array_len(array)   (sizeof(array) / sizeof((array)[0]))
 
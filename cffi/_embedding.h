@@ -519,6 +519,55 @@ static int cffi_start_python(void)
     return 0;
 }
 
+/* cffi_thread_attach() binds a Python thread state to the calling C
+   thread, until cffi_thread_detach() is called from the same thread.
+   In between, the calls from this thread to ``extern "Python"``
+   functions only need to acquire the GIL, which is cheaper.  This is
+   meant for C threads that call Python many times.  It also makes
+   sure Python is initialized, like cffi_start_python(), and returns
+   -1 if that failed, 0 if all is OK.  Both functions must be called
+   without the GIL and can be nested.  With a _cffi_backend that is
+   too old, or on PyPy, they don't do anything more.  Like
+   cffi_start_python(), they are static. */
+_CFFI_UNUSED_FN
+static int cffi_thread_attach(void)
+{
+    if (cffi_start_python() < 0)
+        return -1;
+#ifndef PYPY_VERSION
+    if (_cffi_exports[28] != NULL)
+        return _cffi_thread_attach();
+#endif
+    return 0;
+}
+
+_CFFI_UNUSED_FN
+static void cffi_thread_detach(void)
+{
+#ifndef PYPY_VERSION
+    if (_cffi_exports[29] != NULL)
+        _cffi_thread_detach();
+#endif
+}
+
+#if defined(_CFFI_EMBEDDING_EAGER_INIT) && defined(__GNUC__) && \
+    !defined(PYPY_VERSION)
+/* With ffibuilder.embedding_init_code(..., eager=True), Python is
+   initialized and the initialization-time Python code is run when the
+   DLL is loaded, instead of at the first call to an ``extern "Python"``
+   function.  This moves the start-up cost out of the first call, and
+   the threads of the host program don't wait for each other there.
+   If the DLL is loaded into an already-running Python (e.g. imported
+   as a module for testing), we do nothing here and initialization
+   stays lazy. */
+__attribute__((constructor))
+static void _cffi_eager_start_python(void)
+{
+    if (!Py_IsInitialized())
+        (void)cffi_start_python();
+}
+#endif
+
 #undef cffi_compare_and_swap
 #undef cffi_write_barrier
 #undef cffi_read_barrier
@@ -77,6 +77,7 @@ class FFI(object):
         self._init_once_cache = {}
         self._cdef_version = None
         self._embedding = None
+        self._embedding_eager = False
         self._typecache = model.get_typecache(backend)
         if hasattr(backend, 'set_ffi'):
             backend.set_ffi(self)
@@ -98,7 +99,8 @@ class FFI(object):
             self.CData, self.CType = backend._get_types()
         self.buffer = backend.buffer
 
-    def cdef(self, csource, override=False, packed=False, pack=None):
+    def cdef(self, csource, override=False, packed=False, pack=None,
+             lazy=False):
         """Parse the given C source.  This registers all declared functions,
         types, and global variables.  The functions and global variables can
         then be accessed via either 'ffi.dlopen()' or 'ffi.verify()'.
@@ -108,8 +110,26 @@ class FFI(object):
         Alternatively, 'pack' can be a small integer, and requests for
         alignment greater than that are ignored (pack=1 is equivalent to
         packed=True).
+        If 'lazy' is True, each declaration is only parsed the first time
+        it is needed, e.g. by 'lib.name' or 'ffi.typeof("name")'.  This
+        is meant for large headers in ABI mode, of which only a small
+        part is used.  Errors are reported when the declaration is parsed.
         """
-        self._cdef(csource, override=override, packed=packed, pack=pack)
+        self._cdef(csource, override=override, packed=packed, pack=pack,
+                   lazy=lazy)
+
+    def set_cdef_cache_dir(self, dirname):
+        """Cache the result of the following cdef() calls in the given
+        directory, so that running cdef() again with the same sources
+        in another process does not need to parse them.  The default
+        is the environment variable CFFI_CDEF_CACHE_DIR; None disables
+        the cache.  The cache contains pickles: the directory must not
+        be writable by untrusted users.  Call this before the first
+        cdef(): there is no caching on an ffi where cdef() was already
+        called without a cache directory.
+        """
+        with self._lock:
+            self._parser._cdef_cache_dir = dirname
 
     def embedding_api(self, csource, packed=False, pack=None):
         self._cdef(csource, packed=packed, pack=pack, dllexport=True)
@@ -117,10 +137,7 @@ class FFI(object):
             self._embedding = ''
 
     def _cdef(self, csource, override=False, **options):
-        if not isinstance(csource, str):    # unicode, on Python 2
-            if not isinstance(csource, basestring):
-                raise TypeError("cdef() argument must be a string")
-            csource = csource.encode('ascii')
+        csource = _cdef_source(csource)
         with self._lock:
             self._cdef_version = object()
             self._parser.parse(csource, override=override, **options)
@@ -128,26 +145,70 @@ class FFI(object):
             if override:
                 for cache in self._function_caches:
                     cache.clear()
-            finishlist = self._parser._recomplete
-            if finishlist:
-                self._parser._recomplete = []
-                for tp in finishlist:
-                    tp.finish_backend_type(self, finishlist)
+            self._recomplete_types()
+
+    def _recomplete_types(self):
+        finishlist = self._parser._recomplete
+        if finishlist:
+            self._parser._recomplete = []
+            for tp in finishlist:
+                tp.finish_backend_type(self, finishlist)
+
+    def _realize_lazy(self, keys=None):
+        # call me with the lock!  Parses the declarations of the
+        # cdef(..., lazy=True) that declare these keys, or all of them.
+        # This doesn't change _cdef_version: the libraries look at
+        # _parser._lazy_declared for the new declarations.
+        if self._parser._realize_lazy(keys):
+            self._recomplete_types()
+
+    def _cdef_from_worker(self, csources, result):
+        # see parse_many()
+        with self._lock:
+            self._cdef_version = object()
+            self._parser._load_from_worker(result)
+            self._cdefsources.extend(csources)
 
-    def dlopen(self, name, flags=0):
+    def dlopen(self, name, flags=0, release_gil=True):
         """Load and return a dynamic library identified by 'name'.
         The standard C library can be loaded by passing None.
         Note that functions and types declared by 'ffi.cdef()' are not
         linked to a particular library, just like C headers; in the
         library we only look for the actual (untyped) symbols.
+
+        By default, calls to the library's functions release the GIL.
+        Pass release_gil=False to keep it for all functions, or a dict
+        {function_name: bool} to choose per function (functions not in
+        the dict release the GIL).  The names in the dict must be
+        declared functions.
         """
         if not (isinstance(name, basestring) or
                 name is None or
                 isinstance(name, self.CData)):
             raise TypeError("dlopen(name): name must be a file name, None, "
                             "or an already-opened 'void *' handle")
+        if isinstance(release_gil, dict):
+            keep_gil = not all(release_gil.values())
+        elif isinstance(release_gil, bool):
+            keep_gil = not release_gil
+        else:
+            raise TypeError("dlopen(): release_gil must be a bool or a dict "
+                            "{function_name: bool}")
+        if keep_gil and not isinstance(self._backend, types.ModuleType):
+            raise NotImplementedError("dlopen(): release_gil=False is not "
+                                      "supported by the ctypes backend")
         with self._lock:
-            lib, function_cache = _make_ffi_library(self, name, flags)
+            if isinstance(release_gil, dict):
+                self._realize_lazy(list(release_gil))
+                unknown = [funcname for funcname in release_gil
+                           if 'function ' + funcname not in
+                               self._parser._declarations]
+                if unknown:
+                    raise ValueError("dlopen(): release_gil names unknown "
+                                     "functions: %s" % (
+                                         ', '.join(sorted(unknown)),))
+            lib, function_cache = _make_ffi_library(self, name, flags,
+                                                    release_gil)
             self._function_caches.append(function_cache)
             self._libraries.append(lib)
         return lib
@@ -168,7 +229,16 @@ class FFI(object):
         if not isinstance(cdecl, str):    # unicode, on Python 2
             cdecl = cdecl.encode('ascii')
         #
-        type = self._parser.parse_type(cdecl)
+        if self._parser._lazy_chunks:
+            self._realize_lazy(self._parser._lazy_keys_used_by(cdecl))
+            try:
+                type = self._parser.parse_type(cdecl)
+            except CDefError:
+                # maybe a name that the index of the lazy chunks missed
+                self._realize_lazy()
+                type = self._parser.parse_type(cdecl)
+        else:
+            type = self._parser.parse_type(cdecl)
         really_a_function_type = type.is_raw_function
         if really_a_function_type:
             type = type.as_function_pointer()
@@ -290,6 +360,16 @@ class FFI(object):
             return allocator(cdecl, init)
         return allocate
 
+    def arena(self, size):
+        """Return a new arena of 'size' bytes.  'arena.new(cdecl, init)'
+        behaves like ffi.new(), but allocates the memory inside the
+        arena's single block, and the result does not own its memory.
+        All this memory is released together at the end of 'with arena:'
+        or by 'arena.release()'; the cdata objects from 'arena.new()'
+        must not be used afterwards.
+        """
+        return _Arena(self, self._backend.arena(size))
+
     def cast(self, cdecl, source):
         """Similar to a C cast: returns an instance of the named C
         type initialized with the given 'source'.  The source is
@@ -334,6 +414,43 @@ class FFI(object):
         """
         return self._backend.unpack(cdata, length)
 
+    def unpack_fields(self, cdata, length, fieldnames):
+        """Unpack some fields of an array of structs of the given length,
+        returning one list per field name.  'cdata' must be a pointer or
+        array of struct or union.  This is a faster equivalent to:
+        [[cdata[i].name for i in range(length)] for name in fieldnames]
+        """
+        return self._backend.unpack_fields(cdata, length, fieldnames)
+
+    def pack_into(self, cdata, data, fieldnames=None):
+        """Fill the array of structs 'cdata' from Python data, in a single
+        loop.  If 'fieldnames' is None, 'data' is a sequence of records,
+        each being a list, tuple or dict as accepted by ffi.new() for one
+        struct.  This is equivalent to:
+        for i, record in enumerate(data): cdata[i] = record
+
+        Otherwise, 'data' is a sequence of columns, one per name in
+        'fieldnames', all of the same length; only these fields are
+        written.  A column can be a cdata array of exactly the field's
+        type, which is then copied without conversion.
+        """
+        return self._backend.pack_into(cdata, data, fieldnames)
+
+    def call_many(self, func, *arg_sequences, **kwds):
+        """Call the C function 'func' once per row of arguments, in a loop
+        written in C.  Takes one sequence per argument of 'func', all of
+        the same length N.  Returns a list of the N results, or None if
+        'func' returns void.
+
+        A sequence that is a cdata array of exactly the argument's type is
+        read directly, without converting its items to and from Python.
+        If 'out' is given, it must be an array or pointer to the result
+        type of 'func'; the results are written there and 'out' is
+        returned.  If all sequences are such arrays and the results go to
+        'out' (or 'func' returns void), the whole loop runs without the GIL.
+        """
+        return self._backend.call_many(func, *arg_sequences, **kwds)
+
    #def buffer(self, cdata, size=-1):
    #    """Return a read-write buffer object that references the raw C data
    #    pointed to by the given 'cdata'.  The 'cdata' must be a pointer or
@@ -389,18 +506,43 @@ class FFI(object):
         callback object must be manually kept alive for as long as the
         callback may be invoked from the C level.
         """
-        def callback_decorator_wrap(python_callable):
+        if isinstance(cdecl, basestring):
+            cdecl = self._typeof(cdecl, consider_function_as_funcptr=True)
+        if python_callable is not None:                   # direct mode
+            if not callable(python_callable):
+                raise TypeError("the 'python_callable' argument "
+                                "is not callable")
+            return self._backend.callback(cdecl, python_callable,
+                                          error, onerror)
+        def callback_decorator_wrap(python_callable):     # decorator mode
             if not callable(python_callable):
                 raise TypeError("the 'python_callable' argument "
                                 "is not callable")
             return self._backend.callback(cdecl, python_callable,
                                           error, onerror)
+        return callback_decorator_wrap
+
+    def callback_queue(self, cdecl, size=1024):
+        """Return a queue of up to 'size' events, with a callback object
+        'queue.callback' of the C function pointer type 'cdecl', which
+        must return void.  Calling the callback from C does not take the
+        GIL: it only records a copy of the arguments.  'queue.drain()'
+        returns the recorded calls as a list of tuples of arguments, and
+        'queue.wait()' blocks until there is something to drain.  The
+        queue must be kept alive for as long as the callback may be
+        invoked from the C code.
+        """
         if isinstance(cdecl, basestring):
             cdecl = self._typeof(cdecl, consider_function_as_funcptr=True)
-        if python_callable is None:
-            return callback_decorator_wrap                # decorator mode
-        else:
-            return callback_decorator_wrap(python_callable)  # direct mode
+        return self._backend.callback_queue(cdecl, size)
+
+    def reserve_callbacks(self, n):
+        """Make sure that at least 'n' more callbacks can be created
+        without allocating more executable memory, and keep at least that
+        many free slots allocated afterwards.  ffi.reserve_callbacks(0)
+        lets the unused memory be released again.
+        """
+        self._backend.reserve_callbacks(n)
 
     def getctype(self, cdecl, replace_with=''):
         """Return a string giving the C type 'cdecl', which may be itself
@@ -530,6 +672,7 @@ class FFI(object):
         if ffi_to_include is self:
             raise ValueError("self.include(self)")
         with ffi_to_include._lock:
+            ffi_to_include._realize_lazy()
             with self._lock:
                 self._parser.include(ffi_to_include._parser)
                 self._cdefsources.append('[')
@@ -750,7 +893,7 @@ class FFI(object):
             self._init_once_cache[tag] = (True, result)
         return result
 
-    def embedding_init_code(self, pysource):
+    def embedding_init_code(self, pysource, eager=False):
         if self._embedding:
             raise ValueError("embedding_init_code() can only be called once")
         # fix 'pysource' before it gets dumped into the C file:
@@ -775,6 +918,7 @@ class FFI(object):
         compile(pysource, "cffi_init", "exec")
         #
         self._embedding = pysource
+        self._embedding_eager = eager
 
     def def_extern(self, *args, **kwds):
         raise ValueError("ffi.def_extern() is only available on API-mode FFI "
@@ -788,6 +932,8 @@ class FFI(object):
         typedefs = []
         structs = []
         unions = []
+        with self._lock:
+            self._realize_lazy()
         for key in self._parser._declarations:
             if key.startswith('typedef '):
                 typedefs.append(key[8:])
@@ -801,6 +947,95 @@ class FFI(object):
         return (typedefs, structs, unions)
 
 
+class _Arena(object):
+    """Wrapper around the arena of the backend, which converts the C
+    declarations of this FFI into ctypes.  See FFI.arena()."""
+
+    def __init__(self, ffi, arena):
+        self._ffi = ffi
+        self._arena = arena
+
+    def new(self, cdecl, init=None):
+        if isinstance(cdecl, basestring):
+            cdecl = self._ffi._typeof(cdecl)
+        return self._arena.new(cdecl, init)
+
+    def release(self):
+        self._arena.release()
+
+    @property
+    def size(self):
+        return self._arena.size
+
+    @property
+    def used(self):
+        return self._arena.used
+
+    def __enter__(self):
+        self._arena.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self._arena.release()
+
+
+def _cdef_source(csource):
+    if not isinstance(csource, str):    # unicode, on Python 2
+        if not isinstance(csource, basestring):
+            raise TypeError("cdef() argument must be a string")
+        csource = csource.encode('ascii')
+    return csource
+
+
+def parse_many(sources, processes=None, backend=None, **options):
+    """Make one new FFI instance for each item of 'sources', and call
+    its cdef() with this item, or with each string in turn if the item
+    is a list of strings.  The keyword arguments are passed to all the
+    cdef() calls.  Returns the list of FFI instances.
+
+    The items are independent, so they are parsed in parallel by
+    'processes' worker processes (by default, one per CPU).  If it is
+    0 or 1, or if there is only one item, or with lazy=True, they are
+    parsed in this process.  The resulting FFIs can be combined with ffi.include().
+    """
+    from . import cparser
+    jobs = []
+    for source in sources:
+        if isinstance(source, basestring):
+            source = [source]
+        jobs.append(([_cdef_source(csource) for csource in source],
+                     options))
+    if options.get('lazy'):
+        processes = 1     # nothing is parsed now, so don't start workers
+    elif processes is None:
+        import multiprocessing
+        try:
+            processes = multiprocessing.cpu_count()
+        except NotImplementedError:
+            processes = 1
+    processes = min(processes, len(jobs))
+    result = []
+    if processes <= 1:
+        for csources, options in jobs:
+            ffi = FFI(backend)
+            for csource in csources:
+                ffi.cdef(csource, **options)
+            result.append(ffi)
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(processes)
+        try:
+            parsed = pool.map(cparser._parse_in_worker, jobs)
+        finally:
+            pool.terminate()
+            pool.join()
+        for (csources, options), worker_result in zip(jobs, parsed):
+            ffi = FFI(backend)
+            ffi._cdef_from_worker(csources, worker_result)
+            result.append(ffi)
+    return result
+
+
 def _load_backend_lib(backend, name, flags):
     import os
     if not isinstance(name, basestring):
@@ -827,7 +1062,7 @@ def _load_backend_lib(backend, name, flags):
         raise OSError(msg)
     return backend.load_library(path, flags)
 
-def _make_ffi_library(ffi, libname, flags):
+def _make_ffi_library(ffi, libname, flags, release_gil=True):
     backend = ffi._backend
     backendlib = _load_backend_lib(backend, libname, flags)
     #
@@ -835,7 +1070,15 @@ def _make_ffi_library(ffi, libname, flags):
         key = 'function ' + name
         tp, _ = ffi._parser._declarations[key]
         BType = ffi._get_cached_btype(tp)
-        value = backendlib.load_function(BType, name)
+        if isinstance(release_gil, dict):
+            release = release_gil.get(name, True)
+        else:
+            release = release_gil
+        if release:
+            value = backendlib.load_function(BType, name)
+        else:
+            # same function type, but calls don't release the GIL
+            value = backendlib.load_function(BType, name, False)
         library.__dict__[name] = value
     #
     def accessor_variable(name):
@@ -871,38 +1114,55 @@ def _make_ffi_library(ffi, libname, flags):
         library.__dict__[name] = ffi._parser._int_constants[name]
     #
     accessors = {}
-    accessors_version = [False]
+    accessors_version = [False, 0]
     addr_variables = {}
     #
+    def add_accessors(key, tp):
+        if not isinstance(tp, model.EnumType):
+            tag, name = key.split(' ', 1)
+            if tag == 'function':
+                accessors[name] = accessor_function
+            elif tag == 'variable':
+                accessors[name] = accessor_variable
+            elif tag == 'constant':
+                accessors[name] = accessor_constant
+            elif tag == 'macro' and name in ffi._parser._int_constants:
+                accessors.setdefault(name, accessor_int_constant)
+        else:
+            for i, enumname in enumerate(tp.enumerators):
+                def accessor_enum(name, tp=tp, i=i):
+                    tp.check_not_partial()
+                    library.__dict__[name] = tp.enumvalues[i]
+                accessors[enumname] = accessor_enum
+    #
     def update_accessors():
-        if accessors_version[0] is ffi._cdef_version:
-            return
-        #
-        for key, (tp, _) in ffi._parser._declarations.items():
-            if not isinstance(tp, model.EnumType):
-                tag, name = key.split(' ', 1)
-                if tag == 'function':
-                    accessors[name] = accessor_function
-                elif tag == 'variable':
-                    accessors[name] = accessor_variable
-                elif tag == 'constant':
-                    accessors[name] = accessor_constant
-            else:
-                for i, enumname in enumerate(tp.enumerators):
-                    def accessor_enum(name, tp=tp, i=i):
-                        tp.check_not_partial()
-                        library.__dict__[name] = tp.enumvalues[i]
-                    accessors[enumname] = accessor_enum
-        for name in ffi._parser._int_constants:
-            accessors.setdefault(name, accessor_int_constant)
-        accessors_version[0] = ffi._cdef_version
+        declarations = ffi._parser._declarations
+        lazy_declared = ffi._parser._lazy_declared
+        if accessors_version[0] is not ffi._cdef_version:
+            for key, (tp, _) in declarations.items():
+                add_accessors(key, tp)
+            for name in ffi._parser._int_constants:
+                accessors.setdefault(name, accessor_int_constant)
+            accessors_version[0] = ffi._cdef_version
+        else:
+            # only the declarations of cdef(..., lazy=True) parsed since
+            for key in lazy_declared[accessors_version[1]:]:
+                if key in declarations:
+                    add_accessors(key, declarations[key][0])
+        accessors_version[1] = len(lazy_declared)
     #
     def make_accessor(name):
         with ffi._lock:
             if name in library.__dict__ or name in FFILibrary.__dict__:
                 return    # added by another thread while waiting for the lock
             if name not in accessors:
+                ffi._realize_lazy([name])
                 update_accessors()
+                if (name not in accessors and ffi._parser._lazy_chunks and
+                        not name.startswith('__')):
+                    # maybe a name that the index of the lazy chunks missed
+                    ffi._realize_lazy()
+                    update_accessors()
                 if name not in accessors:
                     raise AttributeError(name)
             accessors[name](name)
@@ -921,6 +1181,7 @@ def _make_ffi_library(ffi, libname, flags):
                 property.__set__(self, value)
         def __dir__(self):
             with ffi._lock:
+                ffi._realize_lazy()
                 update_accessors()
                 return accessors.keys()
         def __addressof__(self, name):
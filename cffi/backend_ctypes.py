@@ -984,6 +984,9 @@ class CTypesBackend(object):
     def buffer(self, bptr, size=-1):
         raise NotImplementedError("buffer() with ctypes backend")
 
+    def arena(self, size):
+        raise NotImplementedError("arena() with ctypes backend")
+
     def sizeof(self, cdata_or_BType):
         if isinstance(cdata_or_BType, CTypesData):
             return cdata_or_BType._get_size_of_instance()
@@ -5,16 +5,12 @@ try:
     from . import _pycparser as pycparser
 except ImportError:
     import pycparser
-import weakref, re, sys
+import weakref, re, sys, os, bisect, tempfile
 
 try:
-    if sys.version_info < (3,):
-        import thread as _thread
-    else:
-        import _thread
-    lock = _thread.allocate_lock()
-except ImportError:
-    lock = None
+    import threading
+except ImportError:     # Python 2 built without thread support
+    import dummy_threading as threading
 
 def _workaround_for_static_import_finders():
     # Issue #392: packaging tools like cx_Freeze can not find these
@@ -34,7 +30,7 @@ _r_partial_enum = re.compile(r"=\s*\.\.\.\s*[,}]|\.\.\.\s*\}")
 _r_enum_dotdotdot = re.compile(r"__dotdotdot\d+__$")
 _r_partial_array = re.compile(r"\[\s*\.\.\.\s*\]")
 _r_words = re.compile(r"\w+|\S")
-_parser_cache = None
+_parser_cache = threading.local()
 _r_int_literal = re.compile(r"-?0?x?[0-9a-f]+[lu]*$", re.IGNORECASE)
 _r_stdcall1 = re.compile(r"\b(__stdcall|WINAPI)\b")
 _r_stdcall2 = re.compile(r"[(]\s*(__stdcall|WINAPI)\b")
@@ -47,11 +43,67 @@ _r_int_dotdotdot = re.compile(r"(\b(int|long|short|signed|unsigned|char)\s*)+"
                               r"\.\.\.")
 _r_float_dotdotdot = re.compile(r"\b(double|float)\s*\.\.\.")
 
+class _FileScope(dict):
+    """The file scope of pycparser, preloaded with the typedef names of
+    the previous cdef() calls, which are in 'self.typedef_names'."""
+
+    def __init__(self, typedef_names):
+        dict.__init__(self)
+        self.typedef_names = typedef_names
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name) or name in self.typedef_names
+
+    def __missing__(self, name):
+        return self.typedef_names[name]
+
+    def get(self, name, default=None):
+        if dict.__contains__(self, name):
+            return dict.__getitem__(self, name)
+        return self.typedef_names.get(name, default)
+
+
+class _CParser(pycparser.CParser):
+    # When 'typedef_names' is set, parse() starts with a _FileScope
+    # instead of an empty dict as the file scope, so that we don't need
+    # to give a 'typedef int foo_t;' line for every typedef name already
+    # known.  This relies on parse() doing 'self._scope_stack = [{}]'.
+    typedef_names = None
+
+    def _get_scope_stack(self):
+        # pycparser 2.x runs 'yacc.yacc(module=self)' from __init__,
+        # which does getattr() on every attribute before the first
+        # '_scope_stack' assignment
+        return self.__dict__.get('_cffi_scope_stack')
+
+    def _set_scope_stack(self, stack):
+        if (self.typedef_names is not None and len(stack) == 1 and
+                not stack[0]):
+            stack = [_FileScope(self.typedef_names)]
+        self._cffi_scope_stack = stack
+
+    _scope_stack = property(_get_scope_stack, _set_scope_stack)
+
+    def check_typedef_names_support(self):
+        # in case some version of pycparser doesn't work like that
+        self.typedef_names = {'__cffi_check_t': True}
+        try:
+            self.parse('__cffi_check_t *__cffi_check;')
+            return True
+        except pycparser.c_parser.ParseError:
+            return False
+        finally:
+            self.typedef_names = None
+
 def _get_parser():
-    global _parser_cache
-    if _parser_cache is None:
-        _parser_cache = pycparser.CParser()
-    return _parser_cache
+    # pycparser is not thread-safe, so every thread gets its own CParser.
+    # Only the first one is slow to make: the tables are shared.
+    parser = getattr(_parser_cache, 'parser', None)
+    if parser is None:
+        parser = _CParser()
+        parser.supports_typedef_names = parser.check_typedef_names_support()
+        _parser_cache.parser = parser
+    return parser
 
 def _workaround_for_old_pycparser(csource):
     # Workaround for a pycparser issue (fixed between pycparser 2.10 and
@@ -145,24 +197,28 @@ def _preprocess_extern_python(csource):
     parts.append(csource)
     return ''.join(parts)
 
-def _warn_for_string_literal(csource):
+def _warn(message, emitted=None):
+    import warnings
+    warnings.warn(message)
+    if emitted is not None:
+        emitted.append(message)
+
+def _warn_for_string_literal(csource, emitted=None):
     if '"' not in csource:
         return
     for line in csource.splitlines():
         if '"' in line and not line.lstrip().startswith('#'):
-            import warnings
-            warnings.warn("String literal found in cdef() or type source. "
-                          "String literals are ignored here, but you should "
-                          "remove them anyway because some character sequences "
-                          "confuse pre-parsing.")
+            _warn("String literal found in cdef() or type source. "
+                  "String literals are ignored here, but you should "
+                  "remove them anyway because some character sequences "
+                  "confuse pre-parsing.", emitted)
             break
 
-def _warn_for_non_extern_non_static_global_variable(decl):
+def _warn_for_non_extern_non_static_global_variable(decl, emitted=None):
     if not decl.storage:
-        import warnings
-        warnings.warn("Global variable '%s' in cdef(): for consistency "
-                      "with C it should have a storage class specifier "
-                      "(usually 'extern')" % (decl.name,))
+        _warn("Global variable '%s' in cdef(): for consistency "
+              "with C it should have a storage class specifier "
+              "(usually 'extern')" % (decl.name,), emitted)
 
 def _remove_line_directives(csource):
     # _r_line_directive matches whole lines, without the final \n, if they
@@ -174,7 +230,8 @@ def _remove_line_directives(csource):
         i = len(line_directives)
         line_directives.append(m.group())
         return '#line@%d' % i
-    csource = _r_line_directive.sub(replace, csource)
+    if '#' in csource:
+        csource = _r_line_directive.sub(replace, csource)
     return csource, line_directives
 
 def _put_back_line_directives(csource, line_directives):
@@ -184,9 +241,11 @@ def _put_back_line_directives(csource, line_directives):
             raise AssertionError("unexpected #line directive "
                                  "(should have been processed and removed")
         return line_directives[int(s[6:])]
+    if '#' not in csource:
+        return csource
     return _r_line_directive.sub(replace, csource)
 
-def _preprocess(csource):
+def _preprocess(csource, emitted=None):
     # First, remove the lines of the form '#line N "filename"' because
     # the "filename" part could confuse the rest
     csource, line_directives = _remove_line_directives(csource)
@@ -197,11 +256,12 @@ def _preprocess(csource):
     csource = _r_comment.sub(replace_keeping_newlines, csource)
     # Remove the "#define FOO x" lines
     macros = {}
-    for match in _r_define.finditer(csource):
-        macroname, macrovalue = match.groups()
-        macrovalue = macrovalue.replace('\\\n', '').strip()
-        macros[macroname] = macrovalue
-    csource = _r_define.sub('', csource)
+    if '#' in csource:
+        for match in _r_define.finditer(csource):
+            macroname, macrovalue = match.groups()
+            macrovalue = macrovalue.replace('\\\n', '').strip()
+            macros[macroname] = macrovalue
+        csource = _r_define.sub('', csource)
     #
     if pycparser.__version__ < '2.14':
         csource = _workaround_for_old_pycparser(csource)
@@ -211,15 +271,19 @@ def _preprocess(csource):
     # "volatile volatile const", so we abuse it to detect __stdcall...
     # Hack number 2 is that "int(volatile *fptr)();" is not valid C
     # syntax, so we place the "volatile" before the opening parenthesis.
-    csource = _r_stdcall2.sub(' volatile volatile const(', csource)
-    csource = _r_stdcall1.sub(' volatile volatile const ', csource)
-    csource = _r_cdecl.sub(' ', csource)
+    # (The regexps are slow on large sources: first look for the words.)
+    if '__stdcall' in csource or 'WINAPI' in csource:
+        csource = _r_stdcall2.sub(' volatile volatile const(', csource)
+        csource = _r_stdcall1.sub(' volatile volatile const ', csource)
+    if '__cdecl' in csource:
+        csource = _r_cdecl.sub(' ', csource)
     #
     # Replace `extern "Python"` with start/end markers
-    csource = _preprocess_extern_python(csource)
+    if '"' in csource:
+        csource = _preprocess_extern_python(csource)
     #
     # Now there should not be any string literal left; warn if we get one
-    _warn_for_string_literal(csource)
+    _warn_for_string_literal(csource, emitted)
     #
     # Replace "[...]" with "[__dotdotdotarray__]"
     csource = _r_partial_array.sub('[__dotdotdotarray__]', csource)
@@ -241,10 +305,11 @@ def _preprocess(csource):
             assert csource[p:p+3] == '...'
             csource = '%s __dotdotdot%d__ %s' % (csource[:p], number,
                                                  csource[p+3:])
-    # Replace "int ..." or "unsigned long int..." with "__dotdotdotint__"
-    csource = _r_int_dotdotdot.sub(' __dotdotdotint__ ', csource)
-    # Replace "float ..." or "double..." with "__dotdotdotfloat__"
-    csource = _r_float_dotdotdot.sub(' __dotdotdotfloat__ ', csource)
+    if '...' in csource:
+        # Replace "int ..." or "unsigned long int..." with "__dotdotdotint__"
+        csource = _r_int_dotdotdot.sub(' __dotdotdotint__ ', csource)
+        # Replace "float ..." or "double..." with "__dotdotdotfloat__"
+        csource = _r_float_dotdotdot.sub(' __dotdotdotfloat__ ', csource)
     # Replace all remaining "..." with the same name, "__dotdotdot__",
     # which is declared with a typedef for the purpose of C parsing.
     csource = csource.replace('...', ' __dotdotdot__ ')
@@ -291,11 +356,795 @@ def _common_type_names(csource):
         previous_word = word
     return words_used
 
+# ____________________________________________________________
+# Fast path for the simple declarations that make up most cdefs:
+# function prototypes, variables, typedefs, and structs, unions or
+# enums with simple fields and values.  They are recognized here by
+# hand, producing the same AST nodes that pycparser would produce, but
+# much faster.  Any statement that is not recognized is given to
+# pycparser instead, in order.
+
+# only with the AST nodes of pycparser >= 2.21
+_Coord = getattr(pycparser.c_parser, 'Coord', None)
+if _Coord is None:
+    try:
+        from pycparser.plyparser import Coord as _Coord   # pycparser 2.x
+    except ImportError:
+        pass
+_FAST_PATH = (_Coord is not None and
+              'align' in getattr(pycparser.c_ast.Decl, '__slots__', ()))
+
+_r_fast_token = re.compile(r"[A-Za-z_]\w*|\d\w*|\S")
+_r_fast_int_literal = re.compile(r"(?:0[xX][0-9a-fA-F]+|0[0-7]*|[1-9][0-9]*)"
+                                 r"(?:[uU](?:ll|LL|[lL])?|(?:ll|LL|[lL])[uU]?)?$")
+_FAST_QUALS = frozenset(['const', 'volatile', 'restrict'])
+_FAST_TYPE_WORDS = frozenset(['void', 'char', 'short', 'int', 'long',
+                              'float', 'double', 'signed', 'unsigned',
+                              '_Bool'])
+_C_KEYWORDS = frozenset("""auto break case char const continue default do
+    double else enum extern float for goto if inline int long register
+    offsetof restrict return short signed sizeof static struct switch
+    typedef union unsigned void volatile while __int128 _Bool _Complex
+    _Noreturn _Thread_local _Static_assert _Atomic _Alignof _Alignas
+    _Pragma""".split())
+_DOTDOTDOT_TYPES = frozenset(['__dotdotdotint__', '__dotdotdotfloat__',
+                              '__dotdotdot__'])
+
+
+class _NotSimple(Exception):
+    pass
+
+
+class _NameChain(object):
+    """Read-only view of the dict 'first' {name: is_typedef}, falling
+    back to the dict 'second'."""
+
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+
+    def __contains__(self, name):
+        return name in self.first or name in self.second
+
+    def __getitem__(self, name):
+        if name in self.first:
+            return self.first[name]
+        return self.second[name]
+
+    def get(self, name, default=None):
+        if name in self.first:
+            return self.first[name]
+        return self.second.get(name, default)
+
+
+def _user_declarations(ast):
+    # find the first "__dotdotdot__" and use that as a separator
+    # between the repeated typedefs and the real csource
+    for i, decl in enumerate(ast.ext):
+        if decl.name == '__dotdotdot__':
+            return ast.ext[i + 1:]
+    assert 0
+
+def _declared_names(node, names):
+    # record in 'names' the file-scope names declared by the node
+    if isinstance(node, pycparser.c_ast.Typedef):
+        names[node.name] = True
+    elif isinstance(node, pycparser.c_ast.Decl) and node.name:
+        names[node.name] = False
+    type = getattr(node, 'type', None)
+    while isinstance(type, (pycparser.c_ast.TypeDecl,
+                            pycparser.c_ast.PtrDecl,
+                            pycparser.c_ast.ArrayDecl)):
+        type = type.type
+    if isinstance(type, pycparser.c_ast.Enum) and type.values is not None:
+        for enumerator in type.values.enumerators:
+            names[enumerator.name] = False
+
+
+class _FastParser(object):
+
+    def __init__(self, parser, csource, ctn, firstline=1, fullcsource=None):
+        self.parser = parser            # the cffi Parser
+        self.csource = csource
+        self.ctn = ctn
+        # 'csource' may be a piece of 'fullcsource' starting at 'firstline'
+        self.firstline = firstline
+        self.fullcsource = fullcsource or csource
+        self.local_names = {}           # {name: is_typedef} from this cdef
+        # tokenize line by line, which is faster than getting the
+        # position of every token; 'line_ends[n]' is the number of
+        # tokens in the lines 1 to n+1
+        self.lines = csource.split('\n')
+        self.tokens = tokens = []
+        self.line_ends = line_ends = []
+        for line in self.lines:
+            tokens += _r_fast_token.findall(line)
+            line_ends.append(len(tokens))
+        self.ntokens = len(tokens)
+        tokens.append('\x00')           # end marker, never matches
+        self.line_starts = None
+        self.coords = {}
+
+    def parse(self):
+        # Returns the list of top-level AST nodes of the whole source
+        tokens = self.tokens
+        result = []
+        slow_start = None
+        self.index = 0
+        while self.index < self.ntokens:
+            start = self.index
+            self.new_names = {}
+            try:
+                nodes = self.parse_statement()
+            except _NotSimple:
+                self.index = self.skip_statement(start)
+                if slow_start is None:
+                    slow_start = start
+                continue
+            if slow_start is not None:
+                slow_names = self.parse_slow(slow_start, start, result)
+                slow_start = None
+                # if the statement uses a name that the slow part just
+                # declared, the statement must be parsed again
+                for name in tokens[start:self.index]:
+                    if name in slow_names:
+                        self.index = start
+                        break
+                else:
+                    self.commit(nodes, result)
+                continue
+            self.commit(nodes, result)
+        if slow_start is not None:
+            self.parse_slow(slow_start, self.ntokens, result)
+        return result
+
+    def commit(self, nodes, result):
+        result.extend(nodes)
+        self.local_names.update(self.new_names)
+
+    def skip_statement(self, index):
+        tokens = self.tokens
+        depth = 0
+        while index < self.ntokens:
+            token = tokens[index]
+            index += 1
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth -= 1
+            elif token == ';' and depth <= 0:
+                break
+        return index
+
+    def parse_slow(self, start, stop, result):
+        startpos = self.position(start)
+        if stop < self.ntokens:
+            stoppos = self.position(stop)
+        else:
+            stoppos = len(self.csource)
+        slow_names = {}
+        typedef_names = _NameChain(self.local_names,
+                                   self.parser._typedef_names)
+        # pad with spaces to get the same column numbers in errors
+        linestart = self.csource.rfind('\n', 0, startpos) + 1
+        ast = self.parser._parse_with_pycparser(
+            ' ' * (startpos - linestart) + self.csource[startpos:stoppos],
+            self.ctn, typedef_names, self.line(start), self.fullcsource)
+        for node in _user_declarations(ast):
+            _declared_names(node, slow_names)
+            result.append(node)
+        self.local_names.update(slow_names)
+        return slow_names
+
+    def line(self, index):
+        return bisect.bisect_right(self.line_ends, index) + self.firstline
+
+    def position(self, index):
+        # the position of the token 'index' in the source
+        line = bisect.bisect_right(self.line_ends, index) + 1
+        first = self.line_ends[line - 2] if line > 1 else 0
+        matches = _r_fast_token.finditer(self.lines[line - 1])
+        for i in range(index - first + 1):
+            match = next(matches)
+        if self.line_starts is None:
+            self.line_starts = [0]
+            for s in self.lines:
+                self.line_starts.append(self.line_starts[-1] + len(s) + 1)
+        return self.line_starts[line - 1] + match.start()
+
+    def coord(self, index):
+        line = self.line(index)
+        try:
+            return self.coords[line]
+        except KeyError:
+            coord = self.coords[line] = _Coord(CDEF_SOURCE_STRING, line)
+            return coord
+
+    def next(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def expect(self, token):
+        if self.next() != token:
+            raise _NotSimple
+
+    def is_type_name(self, name):
+        is_typedef = self.new_names.get(name)
+        if is_typedef is None:
+            is_typedef = self.local_names.get(name)
+            if is_typedef is None:
+                return (name in self.parser._typedef_names or
+                        name in self.ctn or name in _DOTDOTDOT_TYPES)
+        return is_typedef
+
+    def is_identifier(self, token):
+        return ((token[0].isalpha() or token[0] == '_') and
+                token not in _C_KEYWORDS)
+
+    def declare_name(self, name, is_typedef):
+        # like pycparser, refuse to turn a typedef into a non-typedef
+        # name or vice-versa; unlike pycparser, leave the error message
+        # to it
+        previous = self.new_names.get(name)
+        if previous is None:
+            previous = self.local_names.get(name)
+            if previous is None and (name in self.parser._typedef_names or
+                                     name in self.ctn):
+                previous = True
+        if previous is not None and previous != is_typedef:
+            raise _NotSimple
+        self.new_names[name] = is_typedef
+
+    def parse_statement(self):
+        c_ast = pycparser.c_ast
+        is_typedef = self.tokens[self.index] == 'typedef'
+        if is_typedef:
+            self.index += 1
+        spec, quals, storage, funcspec = self.parse_specifiers(
+            allow_storage=not is_typedef)
+        if self.tokens[self.index] == ';':
+            # 'struct foo { ... };' or 'enum foo { ... };'
+            if is_typedef or not isinstance(spec, (c_ast.Struct, c_ast.Union,
+                                                   c_ast.Enum)):
+                raise _NotSimple
+            coord = spec.coord
+            self.index += 1
+            return [c_ast.Decl(None, quals, [], storage, funcspec, spec,
+                               None, None, coord)]
+        nodes = []
+        while True:
+            name, mods, name_index = self.parse_declarator(abstract=False)
+            coord = self.coord(name_index)
+            type = self.build_type(name, mods, quals, spec, coord)
+            if is_typedef:
+                self.declare_name(name, True)
+                nodes.append(c_ast.Typedef(name, quals, ['typedef'], type,
+                                           coord))
+            else:
+                self.declare_name(name, False)
+                init = None
+                if self.tokens[self.index] == '=':
+                    self.index += 1
+                    init = self.parse_int_value()
+                nodes.append(c_ast.Decl(name, quals, [], storage, funcspec,
+                                        type, init, None, coord))
+            token = self.next()
+            if token == ';':
+                return nodes
+            if token != ',':
+                raise _NotSimple
+
+    def parse_specifiers(self, allow_storage=False):
+        tokens = self.tokens
+        index = self.index
+        quals = []
+        storage = []
+        funcspec = []
+        names = []
+        spec = None
+        while True:
+            token = tokens[index]
+            if token in _FAST_TYPE_WORDS:
+                if spec is not None:
+                    raise _NotSimple
+                names.append(token)
+            elif token in _FAST_QUALS:
+                quals.append(token)
+            elif token in _C_KEYWORDS:
+                if token == 'struct' or token == 'union' or token == 'enum':
+                    if spec is not None or names:
+                        raise _NotSimple
+                    self.index = index
+                    spec = self.parse_struct_union_enum()
+                    index = self.index
+                    continue
+                elif allow_storage and (token == 'extern' or
+                                        token == 'static'):
+                    storage.append(token)
+                elif allow_storage and token == 'inline':
+                    funcspec.append(token)
+                else:
+                    raise _NotSimple
+            elif (spec is None and not names and self.is_identifier(token)
+                    and self.is_type_name(token)):
+                spec = pycparser.c_ast.IdentifierType([token])
+            else:
+                break
+            index += 1
+        self.index = index
+        if names:
+            spec = pycparser.c_ast.IdentifierType(names)
+        if spec is None:
+            raise _NotSimple
+        return spec, quals, storage, funcspec
+
+    def parse_struct_union_enum(self):
+        c_ast = pycparser.c_ast
+        kind = self.next()
+        name = None
+        coord = self.coord(self.index)
+        if self.is_identifier(self.tokens[self.index]):
+            name = self.next()
+        if self.tokens[self.index] != '{':
+            if name is None:
+                raise _NotSimple
+            if kind == 'enum':
+                return c_ast.Enum(name, None, coord)
+            return self.make_struct_or_union(kind, name, None, coord)
+        self.index += 1
+        if kind == 'enum':
+            return c_ast.Enum(name, self.parse_enumerators(), coord)
+        decls = []
+        while self.tokens[self.index] != '}':
+            decls.extend(self.parse_field())
+        self.index += 1
+        if not decls:
+            raise _NotSimple
+        return self.make_struct_or_union(kind, name, decls, coord)
+
+    def make_struct_or_union(self, kind, name, decls, coord):
+        if kind == 'struct':
+            return pycparser.c_ast.Struct(name, decls, coord)
+        else:
+            return pycparser.c_ast.Union(name, decls, coord)
+
+    def parse_field(self):
+        c_ast = pycparser.c_ast
+        if self.tokens[self.index] == '__dotdotdot__':
+            coord = self.coord(self.index)
+            self.index += 1
+            self.expect(';')
+            return [c_ast.Decl(None, [], [], [], [],
+                               c_ast.IdentifierType(['__dotdotdot__']),
+                               None, None, coord)]
+        spec, quals, _, _ = self.parse_specifiers()
+        if self.tokens[self.index] == ';':
+            # anonymous nested struct or union
+            if (not isinstance(spec, (c_ast.Struct, c_ast.Union)) or
+                    spec.decls is None):
+                raise _NotSimple
+            self.index += 1
+            return [c_ast.Decl(None, quals, [], [], [], spec, None, None,
+                               spec.coord)]
+        decls = []
+        while True:
+            name, mods, name_index = self.parse_declarator(abstract=False)
+            coord = self.coord(name_index)
+            type = self.build_type(name, mods, quals, spec, coord)
+            decls.append(c_ast.Decl(name, quals, [], [], [], type, None, None,
+                                    coord))
+            token = self.next()
+            if token == ';':
+                return decls
+            if token != ',':
+                raise _NotSimple
+
+    def parse_enumerators(self):
+        c_ast = pycparser.c_ast
+        enumerators = []
+        while self.tokens[self.index] != '}':
+            name = self.next()
+            if not self.is_identifier(name):
+                raise _NotSimple
+            self.declare_name(name, False)
+            value = None
+            if self.tokens[self.index] == '=':
+                self.index += 1
+                value = self.parse_int_value(allow_name=True)
+            enumerators.append(c_ast.Enumerator(name, value))
+            if self.tokens[self.index] == ',':
+                self.index += 1
+            elif self.tokens[self.index] != '}':
+                raise _NotSimple
+        self.index += 1
+        if not enumerators:
+            raise _NotSimple
+        return c_ast.EnumeratorList(enumerators)
+
+    def parse_int_value(self, allow_name=False):
+        c_ast = pycparser.c_ast
+        coord = self.coord(self.index)
+        token = self.next()
+        if token == '-':
+            return c_ast.UnaryOp('-', self.parse_int_value(), coord)
+        if _r_fast_int_literal.match(token):
+            suffix = token[-3:].lower()
+            type = ('unsigned ' * suffix.count('u') +
+                    'long ' * suffix.count('l') + 'int')
+            return c_ast.Constant(type, token, coord)
+        if (allow_name and self.is_identifier(token) and
+                not self.is_type_name(token)):
+            return c_ast.ID(token, coord)
+        raise _NotSimple
+
+    def parse_declarator(self, abstract):
+        # Returns (name, mods, name_index).  'mods' is a list of
+        # ('*', quals), ('[', dim) or ('(', params), starting from the
+        # outermost one.  'name' is None in abstract declarators.
+        pointers = []
+        while self.tokens[self.index] == '*':
+            self.index += 1
+            quals = []
+            while self.tokens[self.index] in _FAST_QUALS:
+                quals.append(self.next())
+            pointers.append(('*', quals))
+        token = self.tokens[self.index]
+        name = None
+        name_index = self.index
+        mods = []
+        if token == '(' and self.tokens[self.index + 1] == '*':
+            self.index += 1
+            name, mods, name_index = self.parse_declarator(abstract)
+            self.expect(')')
+        elif self.is_identifier(token):
+            if self.is_type_name(token):
+                raise _NotSimple
+            name = token
+            self.index += 1
+        elif not abstract:
+            raise _NotSimple
+        while True:
+            token = self.tokens[self.index]
+            if token == '[':
+                self.index += 1
+                dim = None
+                if self.tokens[self.index] != ']':
+                    dim = self.parse_int_value(allow_name=True)
+                self.expect(']')
+                mods.append(('[', dim))
+            elif token == '(':
+                self.index += 1
+                mods.append(('(', self.parse_params()))
+            else:
+                break
+        pointers.reverse()
+        mods.extend(pointers)
+        return name, mods, name_index
+
+    def parse_params(self):
+        c_ast = pycparser.c_ast
+        if self.tokens[self.index] == ')':
+            self.index += 1
+            return None
+        params = []
+        while True:
+            spec, quals, _, _ = self.parse_specifiers()
+            name, mods, name_index = self.parse_declarator(abstract=True)
+            if name is None:
+                type = self.build_type(None, mods, quals, spec, None)
+                params.append(c_ast.Typename(None, quals, None, type))
+            else:
+                param_coord = self.coord(name_index)
+                type = self.build_type(name, mods, quals, spec, param_coord)
+                params.append(c_ast.Decl(name, quals, [], [], [], type, None,
+                                         None, param_coord))
+            token = self.next()
+            if token == ')':
+                return c_ast.ParamList(params)
+            if token != ',':
+                raise _NotSimple
+
+    def build_type(self, name, mods, quals, spec, coord):
+        c_ast = pycparser.c_ast
+        type = c_ast.TypeDecl(name, quals, None, spec, coord)
+        for kind, arg in reversed(mods):
+            if kind == '*':
+                type = c_ast.PtrDecl(arg, type, coord)
+            elif kind == '[':
+                type = c_ast.ArrayDecl(type, arg, [], coord)
+            else:
+                type = c_ast.FuncDecl(arg, type, coord)
+        return type
+
+
+# ____________________________________________________________
+# On-disk cache of the result of cdef(), enabled by giving a directory
+# with the CFFI_CDEF_CACHE_DIR environment variable or with
+# ffi.set_cdef_cache_dir().  An entry records what one parse() call
+# added or changed in the Parser, and its key is the hash of the source
+# and options of this call and of all the previous ones on the same
+# Parser, chained, so that it only applies on top of the same state.
+
+_CDEF_CACHE_FORMAT = 1
+
+def _cdef_cache_key(previous_key, csource, options):
+    from . import __version__
+    import hashlib
+    h = hashlib.sha256()
+    for part in ['cdef cache format %d' % _CDEF_CACHE_FORMAT,
+                 __version__, pycparser.__version__,
+                 '%d.%d' % sys.version_info[:2],
+                 previous_key, repr(sorted(options.items())), csource]:
+        if not isinstance(part, bytes):
+            part = part.encode('utf-8')
+        h.update(part)
+        h.update(b'\x00')
+    return h.hexdigest()
+
+def _cdef_cache_path(cache_dir, key):
+    return os.path.join(cache_dir, 'cdef-%s.pickle' % (key,))
+
+def _cdef_cache_globals():
+    # types that must be stored by reference because they are compared
+    # with 'is' or used as keys by identity
+    result = {}
+    for name in ['void_type', 'voidp_type', 'const_voidp_type',
+                 'char_array_type']:
+        result[('model', name)] = getattr(model, name)
+    for name, tp in COMMON_TYPES.items():
+        if isinstance(tp, model.BaseTypeByIdentity):
+            result[('common', name)] = tp
+    return result
+
+def _load_cache_entry(f, declarations):
+    # Struct, union and enum types that existed before the parse() call
+    # are referenced by the name under which they are declared.
+    import pickle
+    global_types = _cdef_cache_globals()
+    def persistent_load(pid):
+        try:
+            if isinstance(pid, tuple):
+                return global_types[pid]
+            return declarations[pid][0]
+        except KeyError:
+            raise pickle.UnpicklingError("unknown type %r" % (pid,))
+    unpickler = pickle.Unpickler(f)
+    unpickler.persistent_load = persistent_load
+    return unpickler.load()
+
+def _dump_cache_entry(f, entry, known):
+    # 'known' maps id(type) to the name of its declaration, and is
+    # updated with the types of _cdef_cache_globals().
+    import pickle
+    for pid, tp in _cdef_cache_globals().items():
+        known[id(tp)] = pid
+    def persistent_id(obj):
+        if isinstance(obj, model.BaseTypeByIdentity):
+            return known.get(id(obj))
+        return None
+    pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = persistent_id
+    pickler.dump(entry)
+
+def _cdef_cache_load(cache_dir, key, declarations):
+    # Returns the entry, or None if it is missing or unusable.
+    try:
+        with open(_cdef_cache_path(cache_dir, key), 'rb') as f:
+            return _load_cache_entry(f, declarations)
+    except Exception:
+        return None
+
+def _cdef_cache_store(cache_dir, key, entry, known):
+    # Errors are ignored: the cache is only an optimization.
+    # Every call writes its own temporary file, as several threads or
+    # processes may store the same key at the same time.
+    path = _cdef_cache_path(cache_dir, key)
+    tmppath = None
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0o700)
+        fd, tmppath = tempfile.mkstemp(
+            prefix=os.path.basename(path) + '.', suffix='.tmp',
+            dir=cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            _dump_cache_entry(f, entry, known)
+        if sys.version_info >= (3, 3):
+            os.replace(tmppath, path)
+        else:
+            os.rename(tmppath, path)
+    except Exception:
+        if tmppath is not None:
+            try:
+                os.unlink(tmppath)
+            except OSError:
+                pass
+
+# ____________________________________________________________
+# cffi.parse_many() sends every list of sources to a worker process,
+# which parses them in a new Parser and returns the result in the same
+# format as the entries of the cdef cache, pickled.
+
+def _parse_in_worker(job):
+    import io, warnings
+    csources, options = job
+    parser = Parser()
+    with warnings.catch_warnings(record=True) as log:
+        warnings.simplefilter("always")
+        for csource in csources:
+            parser.parse(csource, **options)
+    entry = parser._make_cache_entry({}, {}, {})
+    entry['warnings'] = [str(w.message) for w in log]
+    f = io.BytesIO()
+    _dump_cache_entry(f, entry, {})
+    return f.getvalue(), parser._cdef_cache_key
+
+# ____________________________________________________________
+# cdef(..., lazy=True) only splits the source into chunks of complete
+# lines, and indexes every chunk by the names that it declares.  A chunk
+# is parsed the first time that one of these names is needed, together
+# with the chunks declaring the names that it uses, in the order of the
+# source.  The keys of the index are 'typedef NAME', 'struct NAME',
+# 'union NAME', 'enum NAME', and just 'NAME' for the functions,
+# variables, constants and enum values.  They are found by looking at
+# the tokens only: a name that is missed here is found by parsing all
+# the chunks, the first time it is not found otherwise.
+
+_LAZY_TAGS = frozenset(['struct', 'union', 'enum'])
+_LAZY_TYPE_WORDS = _FAST_TYPE_WORDS | frozenset(['__int128'])
+_IDENTIFIER_START = frozenset('_abcdefghijklmnopqrstuvwxyz'
+                              'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+
+def _split_lazy_chunks(csource):
+    # returns a list of (firstline, text): the chunks end on the lines
+    # that end with ';' outside braces
+    lines = csource.split('\n')
+    chunks = []
+    first = None
+    depth = 0
+    for i, line in enumerate(lines):
+        if first is None:
+            if not line or line.isspace():
+                continue
+            first = i
+        if '{' in line or '}' in line:
+            depth += line.count('{') - line.count('}')
+        if depth <= 0 and line.rstrip().endswith(';'):
+            chunks.append((first + 1, '\n'.join(lines[first:i + 1])))
+            first = None
+            depth = 0
+    if first is not None:
+        chunks.append((first + 1, '\n'.join(lines[first:])))
+    return chunks
+
+def _lazy_keys_declared(tokens):
+    # the keys of the names declared by the statements in 'tokens'.
+    # This only needs to recognize valid declarations: the errors are
+    # reported when the chunk is parsed.
+    keys = []
+    tokens.append(';')
+    tokens.append('\x00')        # end marker
+    end = len(tokens) - 1
+    i = 0
+    while i < end:
+        # the specifiers: at most one name that is not a keyword, if no
+        # other type has been seen yet, is a typedef name
+        is_typedef = False
+        seen_type = False
+        while True:
+            token = tokens[i]
+            if token in _C_KEYWORDS:
+                i += 1
+                if token in _LAZY_TAGS:
+                    seen_type = True
+                    name = tokens[i]
+                    if name != '{' and name[0] in _IDENTIFIER_START:
+                        i += 1
+                        # 'struct foo {...}' or just 'struct foo;'
+                        if tokens[i] == '{' or tokens[i] == ';':
+                            keys.append('%s %s' % (token, name))
+                    if tokens[i] == '{':
+                        i = _lazy_scan_body(tokens, i, token, keys)
+                elif token == 'typedef':
+                    is_typedef = True
+                elif token in _LAZY_TYPE_WORDS:
+                    seen_type = True
+            elif token[0] in _IDENTIFIER_START and not seen_type:
+                seen_type = True
+                i += 1
+            else:
+                break
+        # the declarators, separated by commas outside parentheses:
+        # each one declares the first name that is not a keyword
+        depth = 0
+        name = None
+        while True:
+            token = tokens[i]
+            i += 1
+            if token[0] in _IDENTIFIER_START:
+                if (name is None and token not in _C_KEYWORDS and
+                        not token.startswith('__dotdotdot')):
+                    name = token
+                    if is_typedef:
+                        keys.append('typedef ' + name)
+                    else:
+                        keys.append(name)
+                    semicolon = tokens.index(';', i)
+                    if ',' not in tokens[i:semicolon]:
+                        i = semicolon + 1
+                        break
+            elif token == '(' or token == '[':
+                depth += 1
+            elif token == ')' or token == ']':
+                depth -= 1
+            elif token == ',':
+                if depth == 0:
+                    name = None
+            elif token == ';' or token == '\x00':
+                break
+    return keys
+
+def _lazy_scan_body(tokens, i, kind, keys):
+    # 'tokens[i]' is the '{' of a struct, union or enum: add the keys of
+    # the nested definitions or of the enum values, and return the index
+    # after the matching '}'
+    if kind == 'enum':
+        expect_name = True
+        while True:
+            i += 1
+            token = tokens[i]
+            if token == '}':
+                return i + 1
+            if token == '\x00':
+                return i
+            if (expect_name and token[0] in _IDENTIFIER_START and
+                    not token.startswith('__dotdotdot')):
+                keys.append(token)
+            expect_name = token == ','
+    while True:
+        i += 1
+        token = tokens[i]
+        if token == '}':
+            return i + 1
+        if token == '\x00':
+            return i
+        if token in _LAZY_TAGS:
+            name = tokens[i + 1]
+            if name == '{':
+                i = _lazy_scan_body(tokens, i + 1, token, keys) - 1
+            elif tokens[i + 2] == '{':
+                keys.append('%s %s' % (token, name))
+                i = _lazy_scan_body(tokens, i + 2, token, keys) - 1
+
+def _lazy_keys_used(tokens):
+    # the keys of the names that 'tokens' may refer to: typedef names,
+    # 'struct NAME' and similar, and the constants that appear in
+    # '[...]' or after '='
+    keys = []
+    tag = None
+    in_expr = False
+    for token in tokens:
+        if tag is not None:
+            keys.append('%s %s' % (tag, token))
+            tag = None
+        elif token in _LAZY_TAGS:
+            tag = token
+        elif token[0] in _IDENTIFIER_START:
+            keys.append('typedef ' + token)
+            if in_expr:
+                keys.append(token)
+        elif token == '[' or token == '=':
+            in_expr = True
+        elif token in (']', ',', '}', ';'):
+            in_expr = False
+    return keys
+
 
 class Parser(object):
 
     def __init__(self):
         self._declarations = {}
+        self._typedef_names = {}       # {name: True} for each typedef
         self._included_declarations = set()
         self._anonymous_counter = 0
         self._structnode2type = weakref.WeakKeyDictionary()
@@ -303,21 +1152,39 @@ class Parser(object):
         self._int_constants = {}
         self._recomplete = []
         self._uses_new_feature = None
+        self._warnings_emitted = None
+        self._cdef_cache_dir = os.environ.get('CFFI_CDEF_CACHE_DIR') or None
+        self._cdef_cache_key = ''     # None if we can't use the cache
+        self._lazy_chunks = {}        # {number: chunk} not parsed yet
+        self._lazy_index = {}         # {key: [chunk numbers]}
+        self._lazy_count = 0
+        self._lazy_declared = []      # the keys declared by lazy chunks
 
     def _parse(self, csource):
-        csource, macros = _preprocess(csource)
+        csource, macros = _preprocess(csource, self._warnings_emitted)
+        ast = self._parse_with_pycparser(csource, _common_type_names(csource))
+        # csource will be used to find buggy source text
+        return ast, macros, csource
+
+    def _parse_with_pycparser(self, csource, ctn, typedef_names=None,
+                              firstline=1, fullcsource=None):
         # XXX: for more efficiency we would need to poke into the
         # internals of CParser...  the following registers the
         # typedefs, because their presence or absence influences the
         # parsing itself (but what they are typedef'ed to plays no role)
-        ctn = _common_type_names(csource)
+        # Normally, the typedef names of the previous cdef() calls are
+        # given to the CParser directly, which is faster.
+        parser = _get_parser()
+        if typedef_names is None:
+            typedef_names = self._typedef_names
+        known_names = typedef_names
         typenames = []
-        for name in sorted(self._declarations):
-            if name.startswith('typedef '):
-                name = name[8:]
+        if not getattr(parser, 'supports_typedef_names', False):
+            typenames += sorted(typedef_names)
+            typedef_names = None
+        for name in sorted(ctn):
+            if name not in known_names:
                 typenames.append(name)
-                ctn.discard(name)
-        typenames += sorted(ctn)
         #
         csourcelines = []
         csourcelines.append('# 1 "<cdef automatic initialization code>"')
@@ -326,21 +1193,17 @@ class Parser(object):
         csourcelines.append('typedef int __dotdotdotint__, __dotdotdotfloat__,'
                             ' __dotdotdot__;')
         # this forces pycparser to consider the following in the file
-        # called <cdef source string> from line 1
-        csourcelines.append('# 1 "%s"' % (CDEF_SOURCE_STRING,))
+        # called <cdef source string> from line 'firstline'
+        csourcelines.append('# %d "%s"' % (firstline, CDEF_SOURCE_STRING))
         csourcelines.append(csource)
-        fullcsource = '\n'.join(csourcelines)
-        if lock is not None:
-            lock.acquire()     # pycparser is not thread-safe...
+        fullcsource_with_prologue = '\n'.join(csourcelines)
+        parser.typedef_names = typedef_names
         try:
-            ast = _get_parser().parse(fullcsource)
+            return parser.parse(fullcsource_with_prologue)
         except pycparser.c_parser.ParseError as e:
-            self.convert_pycparser_error(e, csource)
+            self.convert_pycparser_error(e, fullcsource or csource)
         finally:
-            if lock is not None:
-                lock.release()
-        # csource will be used to find buggy source text
-        return ast, macros, csource
+            parser.typedef_names = None
 
     def _convert_pycparser_error(self, e, csource):
         # xxx look for "<cdef source string>:NUM:" at the start of str(e)
@@ -367,7 +1230,7 @@ class Parser(object):
         raise CDefError(msg)
 
     def parse(self, csource, override=False, packed=False, pack=None,
-                    dllexport=False):
+                    dllexport=False, lazy=False):
         if packed:
             if packed != True:
                 raise ValueError("'packed' should be False or True; use "
@@ -386,27 +1249,216 @@ class Parser(object):
             self._options = {'override': override,
                              'packed': pack,
                              'dllexport': dllexport}
-            self._internal_parse(csource)
+            if lazy:
+                # the cache can't record the chunks parsed later
+                self._cdef_cache_key = None
+                self._internal_parse(csource, lazy=True)
+            elif (self._cdef_cache_dir is not None and
+                    self._cdef_cache_key is not None):
+                self._cached_parse(csource)
+            else:
+                self._cdef_cache_key = None
+                self._internal_parse(csource)
         finally:
             self._options = prev_options
 
-    def _internal_parse(self, csource):
-        ast, macros, csource = self._parse(csource)
+    def _cached_parse(self, csource):
+        key = _cdef_cache_key(self._cdef_cache_key, csource, self._options)
+        self._cdef_cache_key = None     # until we know that we succeeded
+        entry = _cdef_cache_load(self._cdef_cache_dir, key,
+                                 self._declarations)
+        if entry is not None:
+            self._apply_cache_entry(entry)
+        else:
+            old_declarations = self._declarations.copy()
+            old_states = {}
+            for name, (tp, quals) in old_declarations.items():
+                if isinstance(tp, model.StructOrUnionOrEnum):
+                    old_states[name] = tp.__dict__.copy()
+            old_int_constants = self._int_constants.copy()
+            self._warnings_emitted = []
+            try:
+                self._internal_parse(csource)
+                entry = self._make_cache_entry(old_declarations, old_states,
+                                               old_int_constants)
+            finally:
+                self._warnings_emitted = None
+            known = {}
+            for name in old_states:
+                known[id(old_declarations[name][0])] = name
+            _cdef_cache_store(self._cdef_cache_dir, key, entry, known)
+        self._cdef_cache_key = key
+
+    def _make_cache_entry(self, old_declarations, old_states,
+                          old_int_constants):
+        declarations = {}
+        for name, (tp, quals) in self._declarations.items():
+            old = old_declarations.get(name)
+            if old is None or old[0] is not tp or old[1] != quals:
+                declarations[name] = (tp, quals)
+        # changes done to the struct, union and enum types that existed
+        # before, like an opaque struct that receives its fields now
+        changes = {}
+        for name, state in old_states.items():
+            tp = old_declarations[name][0]
+            diff = {}
+            for attr, value in tp.__dict__.items():
+                if attr != 'completed' and (attr not in state or
+                                            state[attr] is not value):
+                    diff[attr] = value
+            if diff:
+                changes[name] = diff
+        int_constants = {}
+        for name, value in self._int_constants.items():
+            if name not in old_int_constants:
+                int_constants[name] = value
+        return {'declarations': declarations,
+                'changes': changes,
+                'int_constants': int_constants,
+                'anonymous_counter': self._anonymous_counter,
+                'uses_new_feature': self._uses_new_feature,
+                'warnings': self._warnings_emitted}
+
+    def _load_from_worker(self, result):
+        # 'self' must be a new Parser
+        import io
+        data, key = result
+        entry = _load_cache_entry(io.BytesIO(data), self._declarations)
+        self._apply_cache_entry(entry)
+        if self._cdef_cache_dir is not None:
+            self._cdef_cache_key = key
+        else:
+            self._cdef_cache_key = None
+
+    def _apply_cache_entry(self, entry):
+        for message in entry['warnings']:
+            _warn(message)
+        for name, diff in entry['changes'].items():
+            tp = self._declarations[name][0]
+            tp.__dict__.update(diff)
+            if 'fldnames' in diff and tp.completed:
+                # must be re-completed, like in _get_struct_union_enum_type
+                tp.completed = 0
+                self._recomplete.append(tp)
+        self._declarations.update(entry['declarations'])
+        for name in entry['declarations']:
+            if name.startswith('typedef '):
+                self._typedef_names[name[8:]] = True
+        self._int_constants.update(entry['int_constants'])
+        self._anonymous_counter = entry['anonymous_counter']
+        if entry['uses_new_feature']:
+            self._uses_new_feature = entry['uses_new_feature']
+
+    def _internal_parse(self, csource, lazy=False):
+        csource, macros = _preprocess(csource, self._warnings_emitted)
+        if (lazy and '#' not in csource and
+                '__cffi_extern_python_' not in csource):
+            self._process_macros(macros)
+            self._add_lazy_chunks(csource)
+            return
+        if self._lazy_chunks:
+            # parse first the lazy chunks that declare the names used or
+            # redeclared here, so that conflicts are reported now
+            if '#' in csource:
+                tokens = _r_fast_token.findall(
+                    _r_line_directive.sub('', csource))
+            else:
+                tokens = _r_fast_token.findall(csource)
+            keys = _lazy_keys_used(tokens)
+            keys += _lazy_keys_declared(tokens)
+            keys.extend(macros)
+            self._realize_lazy(keys)
+        decls = self._parse_decls(csource)
         # add the macros
         self._process_macros(macros)
-        # find the first "__dotdotdot__" and use that as a separator
-        # between the repeated typedefs and the real csource
-        iterator = iter(ast.ext)
-        for decl in iterator:
-            if decl.name == '__dotdotdot__':
-                break
+        self._process_decls(decls, csource)
+
+    def _add_lazy_chunks(self, csource):
+        # a chunk that completes or redeclares a name that is already
+        # declared must be parsed now, because this name may be in use;
+        # so must a name declared twice lazily, to report conflicts now
+        declared = set(self._int_constants)
+        for key in self._declarations:
+            kind, name = key.split(' ', 1)
+            if kind in ('function', 'variable', 'constant'):
+                declared.add(name)
+            else:
+                declared.add(key)
+        redeclared = []
+        index = self._lazy_index
+        for firstline, text in _split_lazy_chunks(csource):
+            number = self._lazy_count
+            self._lazy_count += 1
+            keys = set(_lazy_keys_declared(_r_fast_token.findall(text)))
+            self._lazy_chunks[number] = (firstline, text, csource,
+                                         self._options, keys)
+            for key in keys:
+                if key in index:
+                    index[key].append(number)
+                    redeclared.append(key)
+                else:
+                    index[key] = [number]
+                    if key in declared:
+                        redeclared.append(key)
+        self._realize_lazy(redeclared)
+
+    def _lazy_keys_used_by(self, csource):
+        return _lazy_keys_used(_r_fast_token.findall(csource))
+
+    def _realize_lazy(self, keys=None):
+        # Parse the lazy chunks that declare any of the 'keys', or all of
+        # them if 'keys' is None.  Returns True if anything was parsed.
+        if keys is None:
+            numbers = set(self._lazy_chunks)
         else:
-            assert 0
+            numbers = set()
+            pending = list(keys)
+            while pending:
+                for number in self._lazy_index.get(pending.pop(), ()):
+                    if number not in numbers:
+                        numbers.add(number)
+                        text = self._lazy_chunks[number][1]
+                        pending += _lazy_keys_used(
+                            _r_fast_token.findall(text))
+        if not numbers:
+            return False
+        old_declarations = set(self._declarations)
+        try:
+            for number in sorted(numbers):
+                firstline, text, fullcsource, options, keys = (
+                    self._lazy_chunks.pop(number))
+                for key in keys:
+                    numbers_of_key = self._lazy_index[key]
+                    numbers_of_key.remove(number)
+                    if not numbers_of_key:
+                        del self._lazy_index[key]
+                prev_options = self._options
+                try:
+                    self._options = options
+                    decls = self._parse_decls(text, firstline, fullcsource)
+                    self._process_decls(decls, fullcsource)
+                finally:
+                    self._options = prev_options
+        finally:
+            self._lazy_declared.extend(
+                set(self._declarations).difference(old_declarations))
+        return True
+
+    def _parse_decls(self, csource, firstline=1, fullcsource=None):
+        ctn = _common_type_names(csource)
+        if (_FAST_PATH and '#' not in csource and
+                getattr(_get_parser(), 'supports_typedef_names', False)):
+            return _FastParser(self, csource, ctn, firstline,
+                               fullcsource).parse()
+        return _user_declarations(self._parse_with_pycparser(
+            csource, ctn, None, firstline, fullcsource))
+
+    def _process_decls(self, decls, csource):
         current_decl = None
         #
         try:
             self._inside_extern_python = '__cffi_extern_python_stop'
-            for decl in iterator:
+            for decl in decls:
                 current_decl = decl
                 if isinstance(decl, pycparser.c_ast.Decl):
                     self._parse_decl(decl)
@@ -545,19 +1597,31 @@ class Parser(object):
                     if (quals & model.Q_CONST) and not tp.is_array_type:
                         self._declare('constant ' + decl.name, tp, quals=quals)
                     else:
-                        _warn_for_non_extern_non_static_global_variable(decl)
+                        _warn_for_non_extern_non_static_global_variable(
+                            decl, self._warnings_emitted)
                         self._declare('variable ' + decl.name, tp, quals=quals)
 
     def parse_type(self, cdecl):
         return self.parse_type_and_quals(cdecl)[0]
 
     def parse_type_and_quals(self, cdecl):
+        if self._lazy_chunks:
+            self._realize_lazy(self._lazy_keys_used_by(cdecl))
         ast, macros = self._parse('void __dummy(\n%s\n);' % cdecl)[:2]
         assert not macros
         exprnode = ast.ext[-1].type.args.params[0]
         if isinstance(exprnode, pycparser.c_ast.ID):
             raise CDefError("unknown identifier '%s'" % (exprnode.name,))
-        return self._get_type_and_quals(exprnode.type)
+        num_declarations = len(self._declarations)
+        anonymous_counter = self._anonymous_counter
+        try:
+            return self._get_type_and_quals(exprnode.type)
+        finally:
+            # a type like "struct foo *" can declare "struct foo": then
+            # the state no longer matches the keys of the cdef cache
+            if (len(self._declarations) != num_declarations or
+                    self._anonymous_counter != anonymous_counter):
+                self._cdef_cache_key = None
 
     def _declare(self, name, obj, included=False, quals=0):
         if name in self._declarations:
@@ -570,6 +1634,8 @@ class Parser(object):
                     "try cdef(xx, override=True))" % (name,))
         assert '__dotdotdot__' not in name.split()
         self._declarations[name] = (obj, quals)
+        if name.startswith('typedef '):
+            self._typedef_names[name[8:]] = True
         if included:
             self._included_declarations.add(obj)
 
@@ -971,6 +2037,7 @@ class Parser(object):
         return tp
 
     def include(self, other):
+        self._cdef_cache_key = None
         for name, (tp, quals) in other._declarations.items():
             if name.startswith('anonymous $enum_$'):
                 continue   # fix for test_anonymous_enum_include
@@ -127,14 +127,25 @@ class Recompiler:
     _num_externpy = 0
 
     def __init__(self, ffi, module_name, target_is_python=False):
+        with ffi._lock:
+            ffi._realize_lazy()
         self.ffi = ffi
         self.module_name = module_name
         self.target_is_python = target_is_python
         self._version = VERSION_BASE
+        self._uses_fastcall = False
 
     def needs_version(self, ver):
         self._version = max(self._version, ver)
 
+    def _cpython_version(self):
+        # functions with several arguments are emitted as METH_FASTCALL
+        # wrappers if the C compiler targets CPython >= 3.7; such modules
+        # need a higher version, which is only known at C compile time
+        if self._uses_fastcall:
+            return '_cffi_version_fastcall(0x%x)' % self._version
+        return '0x%x' % self._version
+
     def collect_type_table(self):
         self._typesdict = {}
         self._generate("collecttype")
@@ -324,6 +335,8 @@ class Recompiler:
             prnt('# define _CFFI_PYTHON_STARTUP_FUNC  init%s' % (
                 base_module_name,))
             prnt('#endif')
+            if self.ffi._embedding_eager:
+                prnt('#define _CFFI_EMBEDDING_EAGER_INIT')
             lines = self._rel_readlines('_embedding.h')
             i = lines.index('#include "_cffi_errors.h"\n')
             lines[i:i+1] = self._rel_readlines('_cffi_errors.h')
@@ -409,6 +422,8 @@ class Recompiler:
         flags = 0
         if self._num_externpy > 0 or self.ffi._embedding is not None:
             flags |= 1     # set to mean that we use extern "Python"
+        if self.ffi._embedding is not None:
+            flags |= 2     # _cffi_exports[] has room for cffi_thread_attach()
         prnt('  %d,  /* flags */' % flags)
         prnt('};')
         prnt()
@@ -448,15 +463,15 @@ class Recompiler:
         prnt('PyMODINIT_FUNC')
         prnt('PyInit_%s(void)' % (base_module_name,))
         prnt('{')
-        prnt('  return _cffi_init("%s", 0x%x, &_cffi_type_context);' % (
-            self.module_name, self._version))
+        prnt('  return _cffi_init("%s", %s, &_cffi_type_context);' % (
+            self.module_name, self._cpython_version()))
         prnt('}')
         prnt('#else')
         prnt('PyMODINIT_FUNC')
         prnt('init%s(void)' % (base_module_name,))
         prnt('{')
-        prnt('  _cffi_init("%s", 0x%x, &_cffi_type_context);' % (
-            self.module_name, self._version))
+        prnt('  _cffi_init("%s", %s, &_cffi_type_context);' % (
+            self.module_name, self._cpython_version()))
         prnt('}')
         prnt('#endif')
         prnt()
@@ -679,6 +694,8 @@ class Recompiler:
             argname = 'arg0'
         else:
             argname = 'args'
+        if numargs > 1:
+            self._uses_fastcall = True
         #
         # ------------------------------
         # the 'd' version of the function, only for addressof(lib, 'func')
@@ -707,7 +724,15 @@ class Recompiler:
         prnt('#ifndef PYPY_VERSION')        # ------------------------------
         #
         prnt('static PyObject *')
-        prnt('_cffi_f_%s(PyObject *self, PyObject *%s)' % (name, argname))
+        if numargs > 1:
+            prnt('#ifdef _CFFI_USE_FASTCALL')
+            prnt('_cffi_f_%s(PyObject *self, PyObject *const *args, '
+                 'Py_ssize_t nargs)' % (name,))
+            prnt('#else')
+            prnt('_cffi_f_%s(PyObject *self, PyObject *%s)' % (name, argname))
+            prnt('#endif')
+        else:
+            prnt('_cffi_f_%s(PyObject *self, PyObject *%s)' % (name, argname))
         prnt('{')
         #
         context = 'argument of %s' % name
@@ -737,10 +762,18 @@ class Recompiler:
             for i in rng:
                 prnt('  PyObject *arg%d;' % i)
             prnt()
+            prnt('#ifdef _CFFI_USE_FASTCALL')
+            prnt('  if (_cffi_check_nargs("%s", %d, nargs) < 0)' % (
+                name, len(rng)))
+            prnt('    return NULL;')
+            for i in rng:
+                prnt('  arg%d = args[%d];' % (i, i))
+            prnt('#else')
             prnt('  if (!PyArg_UnpackTuple(args, "%s", %d, %d, %s))' % (
                 name, len(rng), len(rng),
                 ', '.join(['&arg%d' % i for i in rng])))
             prnt('    return NULL;')
+            prnt('#endif')
         prnt()
         #
         for i, type in enumerate(tp.args):
@@ -831,16 +864,17 @@ class Recompiler:
         type_index = self._typesdict[tp.as_raw_function()]
         numargs = len(tp.args)
         if self.target_is_python:
-            meth_kind = OP_DLOPEN_FUNC
+            op = CffiOp(OP_DLOPEN_FUNC, type_index)
         elif numargs == 0:
-            meth_kind = OP_CPYTHON_BLTN_N   # 'METH_NOARGS'
+            op = CffiOp(OP_CPYTHON_BLTN_N, type_index)   # 'METH_NOARGS'
         elif numargs == 1:
-            meth_kind = OP_CPYTHON_BLTN_O   # 'METH_O'
+            op = CffiOp(OP_CPYTHON_BLTN_O, type_index)   # 'METH_O'
         else:
-            meth_kind = OP_CPYTHON_BLTN_V   # 'METH_VARARGS'
+            # 'METH_FASTCALL' or 'METH_VARARGS', depending on the C compiler
+            op = CffiOp(None, '_CFFI_OP(_CFFI_CPYTHON_BLTN_MANY, %d)' % (
+                type_index,))
         self._lsts["global"].append(
-            GlobalExpr(name, '_cffi_f_%s' % name,
-                       CffiOp(meth_kind, type_index),
+            GlobalExpr(name, '_cffi_f_%s' % name, op,
                        size='_cffi_d_%s' % name))
 
     # ----------
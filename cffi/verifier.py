@@ -32,6 +32,8 @@ class Verifier(object):
     def __init__(self, ffi, preamble, tmpdir=None, modulename=None,
                  ext_package=None, tag='', force_generic_engine=False,
                  source_extension='.c', flags=None, relative_to=None, **kwds):
+        with ffi._lock:
+            ffi._realize_lazy()
         if ffi._parser._uses_new_feature:
             raise VerificationError(
                 "feature not supported with ffi.verify(), but only "
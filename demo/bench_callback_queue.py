@@ -0,0 +1,102 @@
+"""Benchmark events sent from C threads to Python: a regular callback
+made with ffi.callback(), which takes the GIL for every event, against
+ffi.callback_queue(), whose callback only records the arguments and is
+drained in batches by the main thread.  The queue is big enough to
+hold all the events, so that none of them is dropped.
+
+The C code starts NTHREADS pthreads, each firing N events with two
+arguments (an int and a double).
+"""
+import sys, tempfile, threading, time, importlib
+import cffi
+
+N = 250000
+NTHREADS = 4
+QUEUE_SIZE = N * NTHREADS
+
+CDEF = """
+    void fire(void (*cb)(int, double), int n, int nthreads);
+"""
+SOURCE = """
+    #include <pthread.h>
+
+    struct job { void (*cb)(int, double); int n; int start; };
+
+    static void *run(void *arg)
+    {
+        struct job *job = arg;
+        int i;
+        for (i = 0; i < job->n; i++)
+            job->cb(job->start + i, i * 0.5);
+        return NULL;
+    }
+
+    void fire(void (*cb)(int, double), int n, int nthreads)
+    {
+        pthread_t th[64];
+        struct job jobs[64];
+        int i;
+        for (i = 0; i < nthreads; i++) {
+            jobs[i].cb = cb;
+            jobs[i].n = n;
+            jobs[i].start = i * n;
+            pthread_create(&th[i], NULL, run, &jobs[i]);
+        }
+        for (i = 0; i < nthreads; i++)
+            pthread_join(th[i], NULL);
+    }
+"""
+
+
+def build():
+    tmpdir = tempfile.mkdtemp()
+    sys.path.insert(0, tmpdir)
+    ffi = cffi.FFI()
+    ffi.cdef(CDEF)
+    ffi.set_source("_bench_callback_queue", SOURCE,
+                   extra_compile_args=['-pthread'],
+                   extra_link_args=['-pthread'])
+    ffi.compile(tmpdir=tmpdir)
+    mod = importlib.import_module("_bench_callback_queue")
+    return mod.ffi, mod.lib
+
+
+def bench_callback(ffi, lib):
+    total = [0]
+    @ffi.callback("void(*)(int, double)")
+    def cb(i, x):
+        total[0] += 1
+    t0 = time.time()
+    lib.fire(cb, N, NTHREADS)
+    t1 = time.time()
+    assert total[0] == N * NTHREADS
+    return t1 - t0
+
+
+def bench_queue(ffi, lib):
+    q = ffi.callback_queue("void(*)(int, double)", QUEUE_SIZE)
+    th = threading.Thread(target=lib.fire, args=(q.callback, N, NTHREADS))
+    total = 0
+    t0 = time.time()
+    th.start()
+    while th.is_alive() or q.pending:
+        if q.wait(0.01):
+            for i, x in q.drain():
+                total += 1
+    t1 = time.time()
+    th.join()
+    assert total == N * NTHREADS and q.dropped == 0
+    return t1 - t0
+
+
+def main():
+    ffi, lib = build()
+    n = N * NTHREADS
+    for name, func in [("ffi.callback()", bench_callback),
+                       ("ffi.callback_queue()", bench_queue)]:
+        t = min([func(ffi, lib) for i in range(3)])
+        print("%-22s %6.2f M events/s" % (name, n / t / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Benchmark the cost of creating callbacks with ffi.callback().
+
+All the callbacks created in one measurement have the same C type, which
+is the common case (e.g. a comparison function given to qsort(), or a
+handler registered with some C library).  The cdecl is given either as a
+string or as a ctype object; and the ffi object is either the pure Python
+one from 'cffi.FFI()', or the one from '_cffi_backend.FFI()' that
+out-of-line modules use.
+"""
+import timeit
+import cffi
+import _cffi_backend
+
+NUMBER = 100000
+REPEAT = 7
+
+SIGNATURES = [
+    "void(*)(void)",
+    "int(*)(int, int)",
+    "int(*)(const void *, const void *)",
+    "double(*)(double, double, double, double)",
+]
+
+
+def measure(ffi, cdecl):
+    def make(ffi=ffi, cdecl=cdecl):
+        ffi.callback(cdecl, callable_)
+    t = min(timeit.repeat(make, number=NUMBER, repeat=REPEAT))
+    return t / NUMBER * 1e9
+
+
+def callable_(*args):
+    return 0
+
+
+def main():
+    ffi_py = cffi.FFI()
+    ffi_c = _cffi_backend.FFI()
+    print("%-45s %9s %9s %9s   (ns per callback)" % (
+        "signature", "str", "ctype", "C ffi"))
+    for sig in SIGNATURES:
+        print("%-45s %9.1f %9.1f %9.1f" % (
+            sig,
+            measure(ffi_py, sig),
+            measure(ffi_py, ffi_py.typeof(sig)),
+            measure(ffi_c, ffi_c.typeof(sig))))
+
+
+if __name__ == '__main__':
+    main()
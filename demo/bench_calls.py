@@ -0,0 +1,73 @@
+"""Benchmark the cost of calling small C functions taking 0 to 6 arguments.
+
+In API mode, the same C source is compiled twice: once with the
+METH_VARARGS wrappers that cffi used to emit, and once with the
+METH_FASTCALL wrappers emitted now on CPython >= 3.7.  In ABI mode, the
+functions are called through function pointer cdata objects, which use
+vectorcall on CPython >= 3.8.
+"""
+import sys, os, tempfile, timeit, importlib
+import cffi
+
+NUMBER = 200000
+REPEAT = 7
+
+SOURCE = "\n".join(
+    ["int f%d(%s) { return %s; }" % (
+        n,
+        ", ".join(["int a%d" % i for i in range(n)]) or "void",
+        " + ".join(["a%d" % i for i in range(n)]) or "0")
+     for n in range(7)])
+CDEF = "\n".join(
+    ["int f%d(%s);" % (n, ", ".join(["int"] * n) or "void")
+     for n in range(7)])
+
+# undoes in the generated C the choice made by _cffi_include.h
+FORCE_VARARGS = """
+#undef _CFFI_USE_FASTCALL
+#undef _CFFI_CPYTHON_BLTN_MANY
+#define _CFFI_CPYTHON_BLTN_MANY  _CFFI_OP_CPYTHON_BLTN_V
+"""
+
+
+def build(tmpdir, module_name, use_fastcall):
+    ffi = cffi.FFI()
+    ffi.cdef(CDEF)
+    if use_fastcall:
+        ffi.set_source(module_name, SOURCE)
+    else:
+        ffi.set_source(module_name, FORCE_VARARGS + SOURCE)
+    ffi.compile(tmpdir=tmpdir)
+    return importlib.import_module(module_name).lib
+
+
+def measure(func, nargs):
+    args = tuple(range(nargs))
+    stmt = "f(%s)" % ", ".join(["a[%d]" % i for i in range(nargs)])
+    t = min(timeit.repeat(stmt, globals={'f': func, 'a': args},
+                          number=NUMBER, repeat=REPEAT))
+    return t / NUMBER * 1e9
+
+
+def main():
+    tmpdir = tempfile.mkdtemp()
+    sys.path.insert(0, tmpdir)
+    lib_old = build(tmpdir, "_bench_calls_varargs", False)
+    lib_new = build(tmpdir, "_bench_calls_fastcall", True)
+    #
+    ffi = cffi.FFI()
+    ffi.cdef(CDEF)
+    lib_abi = ffi.dlopen(sys.modules["_bench_calls_fastcall"].__file__)
+    #
+    print("nargs   API varargs   API fastcall   ABI cdata   (ns per call)")
+    for n in range(7):
+        name = "f%d" % n
+        print("%5d %13.1f %14.1f %11.1f" % (
+            n,
+            measure(getattr(lib_old, name), n),
+            measure(getattr(lib_new, name), n),
+            measure(getattr(lib_abi, name), n)))
+
+
+if __name__ == '__main__':
+    main()
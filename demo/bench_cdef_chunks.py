@@ -0,0 +1,46 @@
+"""Benchmark ffi.cdef() called many times with small chunks, like a
+large API declared one header at a time.  Each chunk declares two
+typedefs, a struct, two functions and a #define; the time per chunk
+should not depend on the number of chunks given before.  For
+comparison, the same declarations are also given in a single cdef().
+"""
+import time
+import cffi
+
+CHUNK = """
+    typedef struct item%(i)d_s item%(i)d_t;
+    typedef int handle%(i)d_t;
+    struct item%(i)d_s { handle%(i)d_t h; item%(i)d_t *next; double v[4]; };
+    item%(i)d_t *item%(i)d_new(handle%(i)d_t, const char *);
+    void item%(i)d_free(item%(i)d_t *);
+    #define ITEM%(i)d_MAX 64
+"""
+
+
+def bench_chunks(n):
+    ffi = cffi.FFI()
+    t0 = time.time()
+    for i in range(n):
+        ffi.cdef(CHUNK % {'i': i})
+    return time.time() - t0
+
+
+def bench_single(n):
+    ffi = cffi.FFI()
+    source = ''.join([CHUNK % {'i': i} for i in range(n)])
+    t0 = time.time()
+    ffi.cdef(source)
+    return time.time() - t0
+
+
+def main():
+    print("chunks   chunked cdefs   ms/chunk   single cdef")
+    for n in [125, 250, 500, 1000]:
+        t_chunks = bench_chunks(n)
+        t_single = bench_single(n)
+        print("%6d %13.2fs %10.2f %12.2fs" % (
+            n, t_chunks, t_chunks / n * 1e3, t_single))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Benchmark the start-up of a program that declares a large header with
+ffi.cdef() in ABI mode, but uses only a few of its declarations: some
+types, enum values and functions of the C library.  Compare the normal
+cdef() with cdef(..., lazy=True), which only parses the declarations
+that are used.
+"""
+import time
+import cffi
+from bench_cdef_parse import make_header
+
+N = 2000
+USED = 20
+
+LIBC = """
+    size_t strlen(const char *);
+    int abs(int);
+    double fabs(double);
+"""
+
+
+def startup(source, lazy):
+    ffi = cffi.FFI()
+    ffi.cdef(source, lazy=lazy)
+    lib = ffi.dlopen(None)
+    total = 0
+    for i in range(0, N, N // USED):
+        total += ffi.sizeof("lib_obj%d_t" % i)
+        total += getattr(lib, "LIB_E%d_C" % i)
+        p = ffi.new("lib_obj%d_t *" % i)
+        p.kind = getattr(lib, "LIB_E%d_B" % i)
+    total += lib.strlen(b"hello") + lib.abs(-4) + int(lib.fabs(-2.0))
+    return total
+
+
+def bench(source, lazy):
+    times = []
+    for i in range(3):
+        t0 = time.time()
+        startup(source, lazy)
+        times.append(time.time() - t0)
+    return min(times)
+
+
+def main():
+    source = make_header(N) + LIBC
+    nlines = source.count("\n")
+    t_eager = bench(source, False)
+    t_lazy = bench(source, True)
+    print("%d lines of cdef, %d struct types used" % (nlines, USED))
+    print("cdef():           %6.3fs" % (t_eager,))
+    print("cdef(lazy=True):  %6.3fs  (%.1fx faster)" % (t_lazy,
+                                                         t_eager / t_lazy))
+
+
+if __name__ == '__main__':
+    main()
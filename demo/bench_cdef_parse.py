@@ -0,0 +1,68 @@
+"""Benchmark ffi.cdef() on a large machine-generated header made of the
+usual simple declarations: #defines, enums, typedefs, structs and
+function prototypes.  Most of them are handled by the fast path of
+cffi/cparser.py; a few use bitfields, which are given to pycparser.
+"""
+import time
+import cffi
+from cffi import cparser
+
+N = 400
+
+
+def make_header(n):
+    lines = []
+    for i in range(n):
+        lines.append("#define LIB_FLAG_%d 0x%x" % (i, 1 << (i % 16)))
+        lines.append("typedef struct lib_obj%d_s lib_obj%d_t;" % (i, i))
+        lines.append("typedef enum { LIB_E%d_A, LIB_E%d_B = 4, LIB_E%d_C }"
+                     " lib_e%d_t;" % (i, i, i, i))
+        lines.append("typedef int (*lib_cb%d_t)(lib_obj%d_t *, void *);"
+                     % (i, i))
+        lines.append("struct lib_obj%d_s {" % i)
+        lines.append("    const char *name;")
+        lines.append("    unsigned int flags;")
+        lines.append("    lib_e%d_t kind;" % i)
+        lines.append("    lib_cb%d_t callback;" % i)
+        lines.append("    struct lib_obj%d_s *next;" % i)
+        lines.append("    double values[4];")
+        if i % 10 == 0:
+            lines.append("    unsigned int bits: 3;")
+        lines.append("};")
+        lines.append("lib_obj%d_t *lib_obj%d_new(const char *, size_t);"
+                     % (i, i))
+        lines.append("int lib_obj%d_get(const lib_obj%d_t *, int, double *);"
+                     % (i, i))
+        lines.append("void lib_obj%d_set_callback(lib_obj%d_t *, lib_cb%d_t,"
+                     " void *);" % (i, i, i))
+        lines.append("void lib_obj%d_free(lib_obj%d_t *);" % (i, i))
+    return "\n".join(lines) + "\n"
+
+
+def bench(source, fast_path):
+    saved = cparser._FAST_PATH
+    cparser._FAST_PATH = fast_path
+    try:
+        times = []
+        for i in range(3):
+            ffi = cffi.FFI()
+            t0 = time.time()
+            ffi.cdef(source)
+            times.append(time.time() - t0)
+    finally:
+        cparser._FAST_PATH = saved
+    return min(times)
+
+
+def main():
+    source = make_header(N)
+    nlines = source.count("\n")
+    t_slow = bench(source, False)
+    t_fast = bench(source, True)
+    print("%d lines of cdef" % (nlines,))
+    print("pycparser only: %6.3fs" % (t_slow,))
+    print("fast path:      %6.3fs  (%.1fx faster)" % (t_fast, t_slow / t_fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark callbacks from C to Python: qsort() of 1M ints with a
+comparison function written in Python.
+
+Each comparison is one C-to-Python callback taking two 'const void *'
+arguments.  The same sort is also done with a comparator that does
+nothing, which gives the cost of invoking the callback itself.
+"""
+import time, random
+import cffi
+
+N = 1000000
+REPEAT = 3
+
+ffi = cffi.FFI()
+ffi.cdef("""
+    void qsort(void *base, size_t nmemb, size_t size,
+               int (*compar)(const void *, const void *));
+""")
+libc = ffi.dlopen(None)
+
+
+@ffi.callback("int(*)(const void *, const void *)")
+def compare(p1, p2):
+    a = ffi.cast("int *", p1)[0]
+    b = ffi.cast("int *", p2)[0]
+    return (a > b) - (a < b)
+
+
+@ffi.callback("int(*)(const void *, const void *)")
+def compare_nothing(p1, p2):
+    return 0
+
+
+def count_comparisons(values):
+    counter = [0]
+    @ffi.callback("int(*)(const void *, const void *)")
+    def counting_compare(p1, p2):
+        counter[0] += 1
+        a = ffi.cast("int *", p1)[0]
+        b = ffi.cast("int *", p2)[0]
+        return (a > b) - (a < b)
+    array = ffi.new("int[]", values)
+    libc.qsort(array, N, ffi.sizeof("int"), counting_compare)
+    return counter[0]
+
+
+def bench(values, compar):
+    best = None
+    for i in range(REPEAT):
+        array = ffi.new("int[]", values)
+        t0 = time.perf_counter()
+        libc.qsort(array, N, ffi.sizeof("int"), compar)
+        t1 = time.perf_counter()
+        if best is None or t1 - t0 < best:
+            best = t1 - t0
+    return best
+
+
+def main():
+    random.seed(42)
+    values = [random.randrange(-2**31, 2**31) for i in range(N)]
+    ncalls = count_comparisons(values)
+    print("qsort() of %d ints, %d comparisons" % (N, ncalls))
+    for name, compar in [("comparator", compare),
+                         ("empty comparator", compare_nothing)]:
+        t = bench(values, compar)
+        print("  %-18s %7.3f s   %7.1f ns per callback" % (
+            name, t, t / ncalls * 1e9))
+
+
+if __name__ == '__main__':
+    main()
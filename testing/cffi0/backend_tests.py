@@ -2025,3 +2025,13 @@ class BackendTests:
     def test_too_many_initializers(self):
         ffi = FFI(backend=self.Backend())
         py.test.raises(IndexError, ffi.new, "int[4]", [10, 20, 30, 40, 50])
+
+    def test_arena(self):
+        ffi = FFI(backend=self.Backend())
+        with ffi.arena(64) as arena:
+            p = arena.new("int[2]", [5, 6])
+            q = arena.new(ffi.typeof("double *"), 2.5)
+            assert list(p) == [5, 6] and q[0] == 2.5
+            assert arena.used == 16
+        py.test.raises(ValueError, arena.new, "int *")
+        assert ffi.arena(8).size == 8
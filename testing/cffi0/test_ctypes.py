@@ -1,5 +1,6 @@
 import py, sys
 from testing.cffi0 import backend_tests
+from cffi import FFI
 from cffi.backend_ctypes import CTypesBackend
 
 
@@ -41,3 +42,8 @@ class TestCTypes(backend_tests.BackendTests):
         if sys.version_info >= (3,):
             py.test.skip("ctypes backend: not supported in Python 3: CType")
         backend_tests.BackendTests.test_CData_CType_2(self)
+
+    def test_arena(self):
+        ffi = FFI(backend=self.Backend())
+        e = py.test.raises(NotImplementedError, ffi.arena, 64)
+        assert str(e.value) == "arena() with ctypes backend"
@@ -129,6 +129,101 @@ class TestFFI(backend_tests.BackendTests,
         alloc5 = ffi.new_allocator(myalloc5)
         py.test.raises(MemoryError, alloc5, "int[5]")
 
+    @pytest.mark.skipif("sys.platform == 'win32'")
+    def test_ffi_new_allocator_c_functions(self):
+        ffi = FFI(backend=self.Backend())
+        ffi.cdef("""void *malloc(size_t); void free(void *);
+                    struct foo_s { int a, b; };""")
+        libc = ffi.dlopen(None)
+        seen = []
+        @ffi.callback("void *(size_t)")
+        def myalloc(size):
+            seen.append(size)
+            return libc.malloc(size)
+        @ffi.callback("void(void *)")
+        def myfree(ptr):
+            seen.append(ptr)
+            libc.free(ptr)
+        alloc1 = ffi.new_allocator(myalloc, myfree)
+        p1 = alloc1("int[10]")
+        assert seen == [40]
+        assert ffi.typeof(p1) == ffi.typeof("int[10]")
+        assert ffi.sizeof(p1) == 40
+        assert list(p1) == [0] * 10
+        raw1 = ffi.cast("void *", p1)
+        del p1
+        assert seen == [40, raw1]      # freed immediately, without the GC
+        #
+        p2 = alloc1("struct foo_s *", [5, 6])
+        assert (p2.a, p2.b) == (5, 6)
+        raw2 = ffi.cast("void *", p2)
+        ffi.release(p2)
+        assert seen == [40, raw1, ffi.sizeof("struct foo_s"), raw2]
+        del p2
+        assert len(seen) == 4
+        #
+        alloc2 = ffi.new_allocator(libc.malloc, libc.free,
+                                   should_clear_after_alloc=False)
+        p3 = alloc2("int[]", 1000)
+        assert type(p3).__name__ == '__CDataCFree'     # called directly
+        p3[999] = 42
+        assert p3[999] == 42
+        assert len(p3) == 1000
+        with p3:
+            pass
+        #
+        alloc3 = ffi.new_allocator(libc.malloc)      # no 'free'
+        p4 = alloc3("int *", 42)
+        assert p4[0] == 42
+        libc.free(p4)
+
+    @pytest.mark.skipif("sys.platform == 'win32'")
+    def test_ffi_new_allocator_callbacks_outlive_allocator(self):
+        import gc
+        ffi = FFI(backend=self.Backend())
+        ffi.cdef("void *malloc(size_t); void free(void *);")
+        libc = ffi.dlopen(None)
+        freed = []
+        @ffi.callback("void *(size_t)")
+        def myalloc(size):
+            return libc.malloc(size)
+        @ffi.callback("void(void *)")
+        def myfree(ptr):
+            freed.append(ptr)
+            libc.free(ptr)
+        alloc1 = ffi.new_allocator(myalloc, myfree)
+        objs = [alloc1("int[10]") for i in range(3)]
+        del alloc1, myalloc, myfree
+        gc.collect()
+        # the closures of the callbacks must not be freed and reused
+        others = [ffi.callback("int(int)", lambda x: x) for i in range(2000)]
+        del objs
+        assert len(freed) == 3
+
+    def test_ffi_arena(self):
+        ffi = FFI(backend=self.Backend())
+        ffi.cdef("struct foo_s { int a; double b; };")
+        with ffi.arena(1000) as arena:
+            p = arena.new("struct foo_s *", [5, 6.5])
+            assert (p.a, p.b) == (5, 6.5)
+            q = arena.new(ffi.typeof("struct foo_s[]"), 3)
+            assert len(q) == 3
+            q[2].a = 42
+            assert q[2].a == 42
+            assert arena.used == 4 * ffi.sizeof("struct foo_s")
+        assert arena.used == 0
+        py.test.raises(ValueError, arena.new, "struct foo_s *")
+
+    def test_ffi_callback_queue(self):
+        ffi = FFI(backend=self.Backend())
+        ffi.cdef("struct foo_s { int a; double b; };")
+        q = ffi.callback_queue("void(*)(struct foo_s *, long)", size=16)
+        p = ffi.new("struct foo_s *", [5, 6.5])
+        q.callback(p, 42)
+        [(p1, n)] = q.drain()
+        assert p1 == p and n == 42
+        assert ffi.typeof(p1) is ffi.typeof("struct foo_s *")
+
     def test_new_struct_containing_struct_containing_array_varsize(self):
         ffi = FFI(backend=self.Backend())
         ffi.cdef("""
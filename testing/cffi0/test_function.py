@@ -94,6 +94,45 @@ class TestFunction(object):
         with pytest.raises(NotImplementedError):
             m.baz
 
+    def test_dlopen_release_gil(self):
+        ffi = FFI(backend=self.Backend())
+        ffi.cdef("""
+            double sin(double x);
+            double cos(double x);
+        """)
+        if self.Backend is CTypesBackend:
+            e = py.test.raises(NotImplementedError, ffi.dlopen, lib_m,
+                               release_gil={'cos': False})
+            assert str(e.value) == ("dlopen(): release_gil=False is not "
+                                    "supported by the ctypes backend")
+            m = ffi.dlopen(lib_m, release_gil={'cos': True})
+            assert m.cos(1.23) == math.cos(1.23)
+            return
+        m = ffi.dlopen(lib_m, release_gil={'cos': False})
+        assert m.sin(1.23) == math.sin(1.23)
+        assert m.cos(1.23) == math.cos(1.23)
+        # the choice is on the function object: the ctype is the same
+        assert ffi.typeof(m.sin) is ffi.typeof("double(*)(double)")
+        assert ffi.typeof(m.cos) is ffi.typeof("double(*)(double)")
+        assert repr(m.cos).startswith("<cdata 'double(*)(double)' 0x")
+        assert isinstance(m.cos, ffi.CData)
+        p = ffi.new("double(**)(double)", m.cos)
+        assert p[0] == m.cos
+        assert p[0](1.23) == math.cos(1.23)
+        m = ffi.dlopen(lib_m, release_gil=False)
+        assert ffi.typeof(m.sin) is ffi.typeof(m.cos)
+        assert m.sin(1.23) == math.sin(1.23)
+        py.test.raises(TypeError, ffi.dlopen, lib_m, release_gil=['cos'])
+        e = py.test.raises(ValueError, ffi.dlopen, lib_m,
+                           release_gil={'cos': False, 'tan': False,
+                                        'atan': True})
+        assert str(e.value) == ("dlopen(): release_gil names unknown "
+                                "functions: atan, tan")
+        # also works with lazy cdefs
+        ffi.cdef("double tan(double x);", lazy=True)
+        m = ffi.dlopen(lib_m, release_gil={'tan': False})
+        assert m.tan(1.23) == math.tan(1.23)
+
     def test_tlsalloc(self):
         if sys.platform != 'win32':
             py.test.skip("win32 only")
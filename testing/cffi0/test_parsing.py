@@ -608,3 +608,376 @@ def test_unsigned_int_suffix_for_constant():
     for base, expected_result in (('bin', 2), ('oct', 8), ('dec', 10), ('hex', 16)):
         for index in range(7):
             assert getattr(C, '{base}_{index}'.format(base=base, index=index)) == expected_result
+
+def _count_pycparser_calls(monkeypatch):
+    from cffi import cparser
+    calls = []
+    get_parser = cparser._get_parser
+    def counting_get_parser():
+        calls.append(1)
+        return get_parser()
+    monkeypatch.setattr(cparser, '_get_parser', counting_get_parser)
+    return calls
+
+def test_cdef_cache(monkeypatch):
+    import os
+    from testing.udir import udir
+    cache_dir = str(udir.join('cdef_cache_1'))
+    src = """
+        typedef struct { int a; } foo_t;
+        struct bar { foo_t *p; union { int x; } u; };
+        int f(struct bar *, FILE *);
+        enum e { A, B=5 };
+        #define N 42
+    """
+    calls = _count_pycparser_calls(monkeypatch)
+    ffi1 = FFI(backend=FakeBackend())
+    ffi1.set_cdef_cache_dir(cache_dir)
+    ffi1.cdef(src)
+    assert len(calls) == 1
+    assert len(os.listdir(cache_dir)) == 1
+    ffi2 = FFI(backend=FakeBackend())
+    ffi2.set_cdef_cache_dir(cache_dir)
+    ffi2.cdef(src)
+    assert len(calls) == 1      # not parsed again
+    decl1 = ffi1._parser._declarations
+    decl2 = ffi2._parser._declarations
+    assert sorted(decl1) == sorted(decl2)
+    for name in decl1:
+        assert repr(decl1[name]) == repr(decl2[name])
+    assert ffi2._parser._int_constants == {'A': 0, 'B': 5, 'N': 42}
+    # some types are kept by identity
+    functype = decl2['function f'][0]
+    assert functype.args[0].totype is decl2['struct bar'][0]
+    assert functype.args[1].totype is decl1['function f'][0].args[1].totype
+    # different options or versions use different entries
+    ffi3 = FFI(backend=FakeBackend())
+    ffi3.set_cdef_cache_dir(cache_dir)
+    ffi3.cdef(src, packed=True)
+    assert len(calls) == 2
+    from cffi import cparser
+    monkeypatch.setattr(cparser.pycparser, '__version__', '0.0.fake')
+    ffi4 = FFI(backend=FakeBackend())
+    ffi4.set_cdef_cache_dir(cache_dir)
+    ffi4.cdef(src)
+    assert len(calls) == 3
+    assert len(os.listdir(cache_dir)) == 3
+
+def test_cdef_cache_chained(monkeypatch):
+    from testing.udir import udir
+    cache_dir = str(udir.join('cdef_cache_2'))
+    calls = _count_pycparser_calls(monkeypatch)
+    ffis = []
+    for i in range(2):
+        ffi = FFI(backend=FakeBackend())
+        ffi.set_cdef_cache_dir(cache_dir)
+        ffi.cdef("struct s; typedef struct s s_t;")
+        ffi.cdef("struct s { int a; }; s_t *get(void);")
+        ffis.append(ffi)
+    assert len(calls) == 2
+    decl = ffis[1]._parser._declarations
+    tp = decl['struct s'][0]
+    assert tp.fldnames == ('a',)
+    assert decl['typedef s_t'][0] is tp
+    assert decl['function get'][0].result.totype is tp
+    # a different previous state doesn't use the cache entry
+    ffi = FFI(backend=FakeBackend())
+    ffi.set_cdef_cache_dir(cache_dir)
+    ffi.cdef("struct s; typedef struct s s_t; struct t;")
+    ffi.cdef("struct s { int a; }; s_t *get(void);")
+    assert len(calls) == 4
+
+def test_cdef_cache_bad_entry(monkeypatch):
+    import os
+    from testing.udir import udir
+    cache_dir = str(udir.join('cdef_cache_3'))
+    ffi = FFI(backend=FakeBackend())
+    ffi.set_cdef_cache_dir(cache_dir)
+    ffi.cdef("int f(int);")
+    [filename] = os.listdir(cache_dir)
+    with open(os.path.join(cache_dir, filename), 'wb') as f:
+        f.write(b'garbage')
+    calls = _count_pycparser_calls(monkeypatch)
+    ffi = FFI(backend=FakeBackend())
+    ffi.set_cdef_cache_dir(cache_dir)
+    ffi.cdef("int f(int);")
+    assert len(calls) == 1
+    assert sorted(ffi._parser._declarations) == ['function f']
+    ffi = FFI(backend=FakeBackend())
+    ffi.set_cdef_cache_dir(cache_dir)
+    ffi.cdef("int f(int);")
+    assert len(calls) == 1      # the entry was written again
+
+def test_cdef_cache_store_in_threads(monkeypatch):
+    import os, threading
+    from testing.udir import udir
+    from cffi import cparser
+    cache_dir = str(udir.join('cdef_cache_5'))
+    ffi = FFI(backend=FakeBackend())
+    ffi.cdef("typedef int foo_t; foo_t f(foo_t);")
+    entry = ffi._parser._make_cache_entry({}, {}, {})
+    # all the threads are writing the same key at the same time
+    nthreads = 4
+    inodes = []
+    cond = threading.Condition()
+    original_dump = cparser._dump_cache_entry
+    def dump(f, *args):
+        original_dump(f, *args)
+        with cond:
+            inodes.append(os.fstat(f.fileno()).st_ino)
+            cond.notify_all()
+            while len(inodes) < nthreads:
+                cond.wait(5.0)
+    monkeypatch.setattr(cparser, '_dump_cache_entry', dump)
+    threads = [threading.Thread(target=cparser._cdef_cache_store,
+                                args=(cache_dir, 'k', entry, {}))
+               for i in range(nthreads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(inodes)) == nthreads    # different temporary files
+    assert os.listdir(cache_dir) == [os.path.basename(
+        cparser._cdef_cache_path(cache_dir, 'k'))]
+    parser = cparser.Parser()
+    loaded = cparser._cdef_cache_load(cache_dir, 'k', parser._declarations)
+    assert sorted(loaded['declarations']) == ['function f', 'typedef foo_t']
+
+def test_cdef_cache_warnings(monkeypatch):
+    import warnings
+    from testing.udir import udir
+    cache_dir = str(udir.join('cdef_cache_4'))
+    for i in range(2):
+        ffi = FFI(backend=FakeBackend())
+        ffi.set_cdef_cache_dir(cache_dir)
+        with warnings.catch_warnings(record=True) as log:
+            warnings.simplefilter("always")
+            ffi.cdef("int glob;")
+        assert len(log) == 1
+        assert "Global variable 'glob'" in str(log[0].message)
+
+def test_parse_in_threads():
+    import threading
+    from cffi import cparser
+    errors = []
+    parsers = set()
+    def run(i):
+        try:
+            parsers.add(id(cparser._get_parser()))
+            for j in range(20):
+                ffi = FFI(backend=FakeBackend())
+                ffi.cdef("typedef struct { int x%d; } t%d_t;"
+                         "int f%d(t%d_t *, int[%d]);" % (j, i, i, i, j + 1))
+                tp, = ffi._parser._declarations['function f%d' % i][0].args[:1]
+                assert tp.totype.fldnames == ('x%d' % j,)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(parsers) == 4
+
+def test_parse_many():
+    import warnings
+    from cffi import parse_many
+    sources = ["typedef struct { int a; } foo_t; int f(foo_t *);",
+               ["struct s { int x; };", "struct s *g(int);\n#define N 42"],
+               "int glob;"]
+    for processes in [0, 2]:
+        with warnings.catch_warnings(record=True) as log:
+            warnings.simplefilter("always")
+            ffi1, ffi2, ffi3 = parse_many(sources, processes=processes,
+                                          backend=FakeBackend())
+        assert len(log) == 1
+        assert "Global variable 'glob'" in str(log[0].message)
+        assert ffi1._parser._declarations['typedef foo_t'][0].fldnames == (
+            'a',)
+        assert ffi1._cdefsources == [sources[0]]
+        assert ffi2._cdefsources == sources[1]
+        assert ffi2._parser._int_constants == {'N': 42}
+        assert sorted(ffi2._parser._declarations) == [
+            'function g', 'macro N', 'struct s']
+        assert ffi3._parser._declarations['variable glob'][0].name == 'int'
+        # the results are independent FFIs; they can still be cdef()'ed
+        ffi2.cdef("struct s *h(struct s *);")
+        tp = ffi2._parser._declarations['function h'][0]
+        assert tp.result.totype is ffi2._parser._declarations['struct s'][0]
+
+def test_parse_many_error():
+    from cffi import parse_many
+    for processes in [0, 2]:
+        e = py.test.raises(CDefError, parse_many, ["int f(;", "int g();"],
+                           processes=processes)
+        assert str(e.value).startswith('cannot parse "int f(;"')
+
+def test_typedef_names_not_repeated(monkeypatch):
+    from cffi import cparser
+    texts = []
+    parser = cparser._get_parser()
+    original_parse = parser.parse
+    def recording_parse(text, *args):
+        texts.append(text)
+        return original_parse(text, *args)
+    monkeypatch.setattr(parser, 'parse', recording_parse)
+    ffi = FFI(backend=FakeBackend())
+    ffi.cdef("typedef struct foo_s foo_t; typedef int bar_t;")
+    # the bitfield is not handled by the fast path, so this calls pycparser
+    ffi.cdef("foo_t *f(bar_t); struct s { bar_t b: 3; };")
+    assert "foo_t" not in texts[-1].split("<cdef source string>")[0]
+    tp = ffi._parser._declarations['function f'][0]
+    assert tp.result.totype is ffi._parser._declarations['typedef foo_t'][0]
+    e = py.test.raises(CDefError, ffi.cdef, "int foo_t;")
+    assert "previously declared as typedef" in str(e.value)
+    ffi.cdef("typedef int bar_t;")     # redeclaring a typedef is fine
+
+def test_typedef_names_without_support(monkeypatch):
+    from cffi import cparser
+    monkeypatch.setattr(cparser._get_parser(), 'supports_typedef_names',
+                        False)
+    ffi = FFI(backend=FakeBackend())
+    ffi.cdef("typedef struct foo_s foo_t; typedef int bar_t;")
+    ffi.cdef("foo_t *f(bar_t);")
+    tp = ffi._parser._declarations['function f'][0]
+    assert tp.result.totype is ffi._parser._declarations['typedef foo_t'][0]
+
+def _declarations_with_fast_path(monkeypatch, fast_path, csource):
+    from cffi import cparser
+    monkeypatch.setattr(cparser, '_FAST_PATH', fast_path)
+    ffi = FFI(backend=FakeBackend())
+    ffi.cdef(csource)
+    return dict([(key, (str(tp), quals)) for key, (tp, quals)
+                 in ffi._parser._declarations.items()])
+
+def test_fast_path_same_declarations(monkeypatch):
+    from cffi import cparser
+    if not cparser._FAST_PATH:
+        py.test.skip("no fast path with this version of pycparser")
+    csource = """
+        typedef unsigned long long u64;
+        typedef struct { int a, *b; const char *c[5]; } foo_t;
+        struct bar { u64 x; struct bar *next; foo_t f[]; };
+        union u { short s; double d; };
+        enum e { E0, E1 = 5, E2, E3 = -0x10, E4 = 1 << 3 };
+        struct flags { unsigned int a: 1, b: 3; };   /* not a simple one */
+        typedef struct flags flags_t;
+        int f(void), g(int, ...);
+        void *(*h(flags_t *))(const foo_t *restrict p, long double);
+        extern int (*callbacks[4])(int);
+        static const int K;
+        typedef int (*fn_t)(enum e, union u *);
+        struct opaque;
+        typedef int vararg_t(char *, ...);
+        extern struct bar *bar_list[10];
+    """
+    slow = _declarations_with_fast_path(monkeypatch, False, csource)
+    fast = _declarations_with_fast_path(monkeypatch, True, csource)
+    assert fast == slow
+    assert 'typedef flags_t' in fast
+
+def test_fast_path_error_line(monkeypatch):
+    from cffi import cparser
+    for fast_path in [False, True]:
+        monkeypatch.setattr(cparser, '_FAST_PATH', fast_path)
+        ffi = FFI(backend=FakeBackend())
+        e = py.test.raises(CDefError, ffi.cdef,
+                           "int a;\nstruct s { int x: 1; };\n"
+                           "int b;\nint f(int x y);\n")
+        assert str(e.value).startswith(
+            'cannot parse "int f(int x y);"\n<cdef source string>:4:13:')
+        e = py.test.raises(CDefError, ffi.cdef,
+                           "int a;\nint b;\n\nunknown_t c;\n")
+        assert str(e.value).startswith(
+            'cannot parse "unknown_t c;"\n<cdef source string>:4:')
+
+def test_lazy_cdef_parses_on_use():
+    ffi = FFI()
+    ffi.cdef("""
+        typedef int my_int_t;
+        struct point { my_int_t x, y; };
+        typedef struct point point_t;
+        struct unused { undeclared_t u; };
+        enum color { RED, GREEN = 5, BLUE };
+        #define SIZE 42
+    """, lazy=True)
+    declarations = ffi._parser._declarations
+    assert 'struct point' not in declarations
+    assert 'macro SIZE' in declarations      # macros are not deferred
+    assert ffi.sizeof("point_t") == 2 * ffi.sizeof("int")
+    assert 'typedef my_int_t' in declarations
+    assert 'struct unused' not in declarations
+    assert ffi.typeof("enum color").relements == {
+        'RED': 0, 'GREEN': 5, 'BLUE': 6}
+    # the error in the unused declaration is reported only when needed
+    py.test.raises(CDefError, ffi.typeof, "struct unused")
+
+def test_lazy_cdef_completed_later():
+    ffi = FFI()
+    ffi.cdef("struct s; typedef struct s s_t;", lazy=True)
+    ffi.cdef("struct s { int a, b; };", lazy=True)
+    assert ffi.sizeof("s_t") == 2 * ffi.sizeof("int")
+    ffi = FFI()
+    ffi.cdef("struct s; typedef struct s s_t;")
+    assert ffi.typeof("s_t *")     # opaque for now
+    ffi.cdef("struct s { int a, b; };", lazy=True)
+    assert ffi.sizeof("s_t") == 2 * ffi.sizeof("int")
+
+def test_lazy_cdef_error_line():
+    ffi = FFI()
+    ffi.cdef("int a;\nint b;\n\nunknown_t c;\n", lazy=True)
+    e = py.test.raises(CDefError, ffi.typeof, "int(*)(unknown_t)")
+    assert str(e.value).startswith(
+        'cannot parse "unknown_t c;"\n<cdef source string>:4:')
+
+def test_lazy_cdef_override():
+    ffi = FFI()
+    ffi.cdef("typedef int foo_t;", lazy=True)
+    e = py.test.raises(FFIError, ffi.cdef, "typedef long foo_t;", lazy=True)
+    assert "multiple declarations of typedef foo_t" in str(e.value)
+    ffi.cdef("typedef long foo_t;", override=True, lazy=True)
+    assert ffi.typeof("foo_t") is ffi.typeof("long")
+
+def test_lazy_cdef_then_eager_conflict():
+    ffi = FFI()
+    ffi.cdef("int abs(int); enum { FOO = 2 };", lazy=True)
+    e = py.test.raises(FFIError, ffi.cdef, "long abs(long);")
+    assert "multiple declarations of function abs" in str(e.value)
+    e = py.test.raises(FFIError, ffi.cdef, "#define FOO 3")
+    assert "multiple declarations of constant: FOO" in str(e.value)
+
+def test_lazy_cdef_then_eager_override():
+    needs_dlopen_none()
+    ffi = FFI()
+    ffi.cdef("int abs(int);", lazy=True)
+    ffi.cdef("long abs(long);", override=True)
+    lib = ffi.dlopen(None)
+    assert ffi.typeof(lib.abs) is ffi.typeof("long(*)(long)")
+    assert lib.abs(-5) == 5
+
+def test_lazy_cdef_list_types():
+    ffi = FFI()
+    ffi.cdef("typedef int a_t; struct s { int x; }; union u { int y; };",
+             lazy=True)
+    assert ffi.list_types() == (['a_t'], ['s'], ['u'])
+    assert not ffi._parser._lazy_chunks
+
+def test_lazy_cdef_lib():
+    needs_dlopen_none()
+    ffi = FFI()
+    ffi.cdef("""
+        typedef unsigned long my_size_t;
+        my_size_t strlen(const char *);
+        enum { LAZY_A = 2, LAZY_B };
+        int not_a_real_function_at_all(int);
+    """, lazy=True)
+    lib = ffi.dlopen(None)
+    assert lib.LAZY_B == 3
+    assert 'function strlen' not in ffi._parser._declarations
+    assert lib.strlen(b"hello") == 5
+    assert 'function not_a_real_function_at_all' not in (
+        ffi._parser._declarations)
+    assert 'not_a_real_function_at_all' in dir(lib)
+    assert not ffi._parser._lazy_chunks
+    py.test.raises(AttributeError, getattr, lib, "nonexistent")
@@ -129,6 +129,17 @@ def test_ffi_callback():
     assert ffi.callback("int(int)", lambda x: x + "", -66)(10) == -66
     assert ffi.callback("int(int)", lambda x: x + "", error=-66)(10) == -66
 
+def test_ffi_callback_queue():
+    ffi = _cffi1_backend.FFI()
+    q = ffi.callback_queue("void(int, char *)", size=4)
+    assert ffi.typeof(q.callback) is ffi.typeof("void(*)(int, char *)")
+    q.callback(10, ffi.NULL)
+    q.callback(11, ffi.NULL)
+    assert q.pending == 2
+    assert q.drain() == [(10, ffi.NULL), (11, ffi.NULL)]
+    q = ffi.callback_queue(ffi.typeof("void(*)(int)"))
+    assert q.size == 1024
+
 def test_ffi_callback_decorator():
     ffi = _cffi1_backend.FFI()
     assert ffi.callback(ffi.typeof("int(*)(int)"))(lambda x: x + 42)(10) == 52
@@ -165,6 +176,16 @@ def test_ffi_callback_onerror():
     py.test.raises(TypeError, ffi.callback, "int(int)",
                    lambda x: x, onerror=42)   # <- not callable
 
+def test_ffi_call_many():
+    ffi = _cffi1_backend.FFI()
+    f = ffi.callback("long(int, long)", lambda a, b: a * b)
+    assert ffi.call_many(f, [1, 2, 3], [4, 5, 6]) == [4, 10, 18]
+    a = ffi.new("int[]", [1, 2, 3])
+    out = ffi.new("long[3]")
+    assert ffi.call_many(f, a, ffi.new("long[]", [4, 5, 6]), out=out) is out
+    assert list(out) == [4, 10, 18]
+    pytest.raises(ValueError, ffi.call_many, f, [1, 2], [3])
+
 def test_ffi_getctype():
     ffi = _cffi1_backend.FFI()
     assert ffi.getctype("int") == "int"
@@ -431,6 +452,61 @@ def test_ffi_new_allocator_4():
     alloc5 = ffi.new_allocator(myalloc5)
     py.test.raises(MemoryError, alloc5, "int[5]")
 
+def test_ffi_arena():
+    ffi = _cffi1_backend.FFI()
+    with ffi.arena(100) as arena:
+        assert arena.size == 100
+        assert arena.used == 0
+        p = arena.new("int *", 42)
+        assert p[0] == 42
+        assert ffi.typeof(p) is ffi.typeof("int *")
+        q = arena.new("double[3]", [1.5, 2.5])
+        assert list(q) == [1.5, 2.5, 0.0]
+        assert int(ffi.cast("intptr_t", q)) % ffi.alignof("double") == 0
+        assert arena.used == 8 + 3 * 8
+        s = arena.new("short[]", 5)
+        assert len(s) == 5
+        assert list(s) == [0] * 5
+        c = arena.new("char[]", b"hi")
+        assert ffi.string(c) == b"hi"
+        used = arena.used
+        e = py.test.raises(MemoryError, arena.new, "int[100]")
+        assert str(e.value) == (
+            "arena of 100 bytes is full (%d bytes used, 400 requested)" % used)
+        py.test.raises(TypeError, arena.new, "int")
+        assert arena.used == used
+    assert arena.used == 0
+    e = py.test.raises(ValueError, arena.new, "int *")
+    assert str(e.value) == "this arena was released"
+    py.test.raises(ValueError, ffi.arena, -1)
+    #
+    arena = ffi.arena(16)
+    p = arena.new("int[2]", [5, 6])
+    assert list(p) == [5, 6]
+    arena.release()
+    arena.release()     # no effect
+
+def test_ffi_arena_kept_alive_by_cdata():
+    import gc
+    ffi = _cffi1_backend.FFI()
+    p = ffi.arena(64).new("int[4]", [1, 2, 3, 4])
+    q = ffi.arena(64).new("short[]", [5, 6, 7])
+    gc.collect()
+    junk = [ffi.new("int[4]", [-1] * 4) for i in range(100)]
+    assert list(p) == [1, 2, 3, 4]
+    assert list(q) == [5, 6, 7]
+    assert len(q) == 3
+    del junk
+
+def test_ffi_reserve_callbacks():
+    ffi = _cffi1_backend.FFI()
+    try:
+        ffi.reserve_callbacks(100)
+        assert _cffi1_backend.get_callback_pool_info()['reserved'] == 100
+    finally:
+        ffi.reserve_callbacks(0)
+    py.test.raises(ValueError, ffi.reserve_callbacks, -1)
+
 def test_bool_issue228():
     ffi = _cffi1_backend.FFI()
     fntype = ffi.typeof("int(*callback)(bool is_valid)")
@@ -903,6 +903,49 @@ def test_unpack_args():
     assert st1(e7.value) in ["foo2 expected 2 arguments, got 3",
                              "foo2() takes exactly 2 arguments (3 given)"]
 
+def test_many_args_and_keywords():
+    ffi = FFI()
+    ffi.cdef("int foo6(int, int, int, int, int, char *);")
+    lib = verify(ffi, "test_many_args_and_keywords", """
+        int foo6(int a, int b, int c, int d, int e, char *f) {
+            return a + b + c + d + e + f[0];
+        }
+    """)
+    assert lib.foo6(1, 2, 3, 4, 5, b"A") == 15 + 65
+    args = (10, 20, 30, 40, 50, b"\x00")
+    assert lib.foo6(*args) == 150
+    py.test.raises(TypeError, lib.foo6, 1, 2, 3, 4, 5, f=b"A")
+    py.test.raises(TypeError, lib.foo6, 1, 2, 3, 4, 5, 6)
+
+def test_fastcall_selected_by_c_compiler():
+    # the generated C source must not depend on the Python running cffi:
+    # METH_FASTCALL or METH_VARARGS is chosen when compiling it
+    ffi = FFI()
+    ffi.cdef("int foo0(void); int foo1(int);")
+    ffi.set_source("test_fastcall_selected_0", "")
+    c_file = str(udir.join('test_fastcall_selected_0.c'))
+    ffi.emit_c_code(c_file)
+    with open(c_file) as f:
+        content = f.read()
+    assert '#ifdef _CFFI_USE_FASTCALL' not in content
+    assert '_CFFI_CPYTHON_BLTN_MANY, ' not in content
+    assert '_cffi_init("test_fastcall_selected_0", 0x2601,' in content
+    #
+    ffi = FFI()
+    ffi.cdef("int foo2(int, int);")
+    ffi.set_source("test_fastcall_selected_2", "")
+    c_file = str(udir.join('test_fastcall_selected_2.c'))
+    ffi.emit_c_code(c_file)
+    with open(c_file) as f:
+        content = f.read()
+    assert content.count('#ifdef _CFFI_USE_FASTCALL') == 2
+    assert 'PyArg_UnpackTuple(args, "foo2", 2, 2, &arg0, &arg1)' in content
+    assert '_cffi_check_nargs("foo2", 2, nargs)' in content
+    assert '_CFFI_OP(_CFFI_CPYTHON_BLTN_MANY, ' in content
+    assert ('_cffi_init("test_fastcall_selected_2", '
+            '_cffi_version_fastcall(0x2601),') in content
+    assert 'p[0] = (const void *)0x2601;' in content
+
 def test_address_of_function():
     ffi = FFI()
     ffi.cdef("long myfunc(long x);")
@@ -1852,6 +1895,66 @@ def test_extern_python_plus_c():
     assert lib.bar(100) == 6300
     assert lib.call_me(100) == -2100
 
+def test_extern_python_subinterpreters():
+    interpreters = pytest.importorskip("_xxsubinterpreters")
+    import _cffi_backend
+    ffi = FFI()
+    ffi.cdef("""
+        extern "Python" int bar(int);
+        int call_bar(int);
+    """)
+    lib = verify(ffi, 'test_extern_python_subinterpreters', """
+        static int bar(int);
+        static int call_bar(int x) { return bar(x); }
+    """)
+    @ffi.def_extern()
+    def bar(x):
+        return x + 1
+    assert lib.call_bar(1) == 2
+    #
+    modname = '_CFFI_test_extern_python_subinterpreters'
+    setup = """if 1:
+        import sys, os, threading
+        sys.path.insert(0, %r)
+        from %s import ffi, lib
+        @ffi.def_extern()
+        def bar(x):
+            return x + %%d
+        def call_in_thread():
+            # a thread started here has its first thread state in this
+            # subinterpreter, so callbacks from C are dispatched here
+            result = []
+            t = threading.Thread(
+                target=lambda: result.append(lib.call_bar(1)))
+            t.start()
+            t.join()
+            return result[0]
+        assert call_in_thread() == 1 + %%d
+    """ % (os.path.dirname(sys.modules[modname].__file__), modname)
+    subs = []
+    try:
+        for delta in [100, 200]:
+            try:
+                interp = interpreters.create(isolated=False)
+            except TypeError:
+                pytest.skip("needs _xxsubinterpreters.create(isolated=...)")
+            subs.append(interp)
+            interpreters.run_string(interp, setup % (delta, delta))
+        # alternating between the three interpreters doesn't need to look
+        # up the interpstate dicts again
+        info0 = _cffi_backend.get_extern_python_cache_info()
+        for i in range(5):
+            assert lib.call_bar(1) == 2
+            interpreters.run_string(subs[0], "assert call_in_thread() == 101")
+            interpreters.run_string(subs[1], "assert call_in_thread() == 201")
+        info1 = _cffi_backend.get_extern_python_cache_info()
+        assert info1['refreshes'] == info0['refreshes']
+        assert info1['switches'] == info0['switches'] + 15
+    finally:
+        for interp in subs:
+            interpreters.destroy(interp)
+    assert lib.call_bar(1) == 2
+
 def test_introspect_function():
     ffi = FFI()
     ffi.cdef("float f1(double);")
@@ -0,0 +1,109 @@
+#include <stdio.h>
+#include <assert.h>
+#include "thread-test.h"
+
+#define NTHREADS 10
+
+
+extern int add1(int, int);
+extern int attach_thread(void);
+extern void detach_thread(void);
+
+static sem_t done;
+
+
+static void check_calls(int expected)
+{
+    int i, x;
+    for (i=0; i<10; i++) {
+        x = add1(50, i);
+        assert(x == expected + 8 + i);
+    }
+}
+
+static int attach_and_call(void)
+{
+    int expected, status;
+
+    status = attach_thread();
+    assert(status == 0);
+    expected = add1(40, 2);
+    assert((expected % 1000) == 42);
+    check_calls(expected);
+    return expected;
+}
+
+static void *start_routine_detach(void *arg)
+{
+    int status, expected = attach_and_call();
+
+    detach_thread();
+    check_calls(expected);
+
+    status = sem_post(&done);
+    assert(status == 0);
+    return arg;
+}
+
+static void *start_routine_stay_attached(void *arg)
+{
+    int status;
+
+    /* this thread finishes while still attached */
+    attach_and_call();
+
+    status = sem_post(&done);
+    assert(status == 0);
+    return arg;
+}
+
+static void start_threads(void)
+{
+    pthread_t th;
+    int i, status;
+
+    for (i = 0; i < NTHREADS; i++) {
+        status = pthread_create(&th, NULL, (i & 1) ? start_routine_detach
+                                          : start_routine_stay_attached,
+                                NULL);
+        assert(status == 0);
+    }
+    for (i = 0; i < NTHREADS; i++) {
+        status = sem_wait(&done);
+        assert(status == 0);
+    }
+}
+
+int main(void)
+{
+    int expected, status = sem_init(&done, 0, 0);
+    assert(status == 0);
+
+    /* nested attach and detach in the main thread */
+    status = attach_thread();
+    assert(status == 0);
+    expected = add1(40, 2);
+    assert((expected % 1000) == 42);
+    status = attach_thread();
+    assert(status == 0);
+    check_calls(expected);
+    detach_thread();
+    check_calls(expected);
+    detach_thread();
+
+    /* calls after detach, and an extra detach, are fine too */
+    check_calls(expected);
+    detach_thread();
+    check_calls(expected);
+
+    /* the second round frees the thread states of the first one */
+    start_threads();
+    start_threads();
+
+    status = attach_thread();
+    assert(status == 0);
+    check_calls(expected);
+    detach_thread();
+    printf("done\n");
+    return 0;
+}
@@ -1,4 +1,5 @@
 #include <stdio.h>
+#include <stdlib.h>
 #include <assert.h>
 #include <sys/time.h>
 #ifdef PTEST_USE_THREAD
@@ -10,6 +11,8 @@ static int remaining;
 
 
 extern int add1(int, int);
+extern int perf_thread_attach(void);
+extern void perf_thread_detach(void);
 
 
 static double time_delta(struct timeval *stop, struct timeval *start)
@@ -51,7 +54,17 @@ static double measure(void)
 
 static void *start_routine(void *arg)
 {
-    double t = measure();
+    double t;
+#ifdef PTEST_ATTACH
+    if (perf_thread_attach() != 0) {
+        fprintf(stderr, "perf_thread_attach() failed\n");
+        exit(1);
+    }
+#endif
+    t = measure();
+#ifdef PTEST_ATTACH
+    perf_thread_detach();
+#endif
     printf("time per call: %.3g\n", t);
 
 #ifdef PTEST_USE_THREAD
@@ -15,6 +15,8 @@ ffi.embedding_init_code(r"""
 """)
 
 ffi.set_source("_perf_cffi", """
+    CFFI_DLLEXPORT int perf_thread_attach(void) { return cffi_thread_attach(); }
+    CFFI_DLLEXPORT void perf_thread_detach(void) { cffi_thread_detach(); }
 """)
 
 fn = ffi.compile(verbose=True)
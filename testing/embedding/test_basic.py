@@ -193,6 +193,18 @@ class TestBasic(EmbeddingTests):
                           "adding 100 and -5\n"
                           "got: 42 95\n")
 
+    def test_eager_init(self):
+        if sys.platform == 'win32':
+            py.test.skip("eager initialization needs a GCC-like compiler")
+        eager_cffi = self.prepare_module('eager')
+        self.compile('eager-test', [eager_cffi])
+        output = self.execute('eager-test')
+        assert output == ("initialized\n"
+                          "main\n"
+                          "adding 40 and 2\n"
+                          "adding 100 and -5\n"
+                          "got: 42 95\n")
+
     def test_two_modules(self):
         add1_cffi = self.prepare_module('add1')
         add2_cffi = self.prepare_module('add2')
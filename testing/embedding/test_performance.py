@@ -50,3 +50,30 @@ class TestPerformance(EmbeddingTests):
         print('='*79)
         print(output.rstrip())
         print('='*79)
+
+    def test_perf_attached_single_threaded(self):
+        perf_cffi = self.prepare_module('perf')
+        self.compile('perf-test', [perf_cffi], opt=True,
+                     defines={'PTEST_ATTACH': '1'})
+        output = self.execute('perf-test')
+        print('='*79)
+        print(output.rstrip())
+        print('='*79)
+
+    def test_perf_attached_in_1_thread(self):
+        perf_cffi = self.prepare_module('perf')
+        self.compile('perf-test', [perf_cffi], opt=True, threads=True,
+                     defines={'PTEST_USE_THREAD': '1', 'PTEST_ATTACH': '1'})
+        output = self.execute('perf-test')
+        print('='*79)
+        print(output.rstrip())
+        print('='*79)
+
+    def test_perf_attached_in_4_threads(self):
+        perf_cffi = self.prepare_module('perf')
+        self.compile('perf-test', [perf_cffi], opt=True, threads=True,
+                     defines={'PTEST_USE_THREAD': '4', 'PTEST_ATTACH': '1'})
+        output = self.execute('perf-test')
+        print('='*79)
+        print(output.rstrip())
+        print('='*79)
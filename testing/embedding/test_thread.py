@@ -63,3 +63,10 @@ class TestThread(EmbeddingTests):
             assert output == ("starting\n"
                               "prepADD2\n"
                               "done\n")
+
+    def test_thread_attach_detach(self):
+        attach_cffi = self.prepare_module('attach')
+        self.compile('attach-test', [attach_cffi], threads=True)
+        for i in range(10):
+            output = self.execute('attach-test')
+            assert output == "done\n"